@@ -0,0 +1,331 @@
+"""
+Offline replay benchmark for the detection pipeline.
+
+Replays recorded videos, image folders or single images through the same
+stages the camera server runs (YOLO predict, fused ROI preprocessing, OCR in
+the most likely orientation first, get_nearest_plate) without a live camera, and reports
+per-stage latency percentiles, throughput, peak memory and match accuracy.
+
+    python bench_pipeline.py recordings/route_07.mp4 audit_images/ \\
+        --ground-truth labels.csv --label v1.4 --out bench_results/v1.4.json
+    python bench_pipeline.py audit_images/ --ground-truth labels.csv \\
+        --compare bench_results/v1.4.json
+
+labels.csv has the columns `file,plate` (a JSON object {file: plate} works too). `file` is an image file name or
+`<video name>#<frame index>`; an empty plate means no bin should be matched.
+Use --rois when the inputs are already-cropped plates (e.g. plate_*.jpg) to
+benchmark everything after YOLO. Every plate YOLO finds in a frame is read;
+the frame counts as a match of the best-scoring one.
+
+The model, plates and match threshold default to the constants in
+camera_server.py, which are read from the source rather than imported (importing
+the server opens the cameras, the history database and the upload spool).
+"""
+import argparse
+import ast
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import cv2
+
+from camera_registry import IMAGE_EXTENSIONS
+import numpy as np
+
+from plate_index import LivePlateIndex
+from plate_stages import RoiPreprocessor, OrientationRanker, orient, clean_text, detect, new_job
+from ocr_engine import get_engine
+
+SERVER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_server.py")
+
+STAGES = ["predict", "roi", "ocr", "match"]
+
+
+def iter_frames(path, max_frames=None, stride=1):
+    """Yield (key, frame) for an image, a directory of images or a video file."""
+    name = os.path.basename(os.path.normpath(path))
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for f in files[::stride][:max_frames]:
+            frame = cv2.imread(os.path.join(path, f))
+            if frame is not None:
+                yield f, frame
+    elif path.lower().endswith(IMAGE_EXTENSIONS):
+        frame = cv2.imread(path)
+        if frame is not None:
+            yield name, frame
+    else:
+        cap = cv2.VideoCapture(path)
+        index = emitted = 0
+        while max_frames is None or emitted < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % stride == 0:
+                yield f"{name}#{index}", frame
+                emitted += 1
+            index += 1
+        cap.release()
+
+
+def load_ground_truth(path):
+    """{file key: expected plate or None} from a CSV (file,plate) or a JSON object."""
+    if not path:
+        return {}
+    if path.lower().endswith(".json"):
+        with open(path) as f:
+            return {k: (v or "").strip() or None for k, v in json.load(f).items()}
+    with open(path, newline='') as f:
+        return {row["file"].strip(): (row.get("plate") or "").strip() or None for row in csv.DictReader(f)}
+
+
+def server_config(*names, path=SERVER_CONFIG):
+    """Literal values of top-level constants of camera_server.py, without running it."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in names:
+                try:
+                    values[name] = ast.literal_eval(node.value)
+                except ValueError:
+                    pass
+    return values
+
+
+def peak_memory_mb():
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1e6, 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+    except ImportError:
+        return None
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))], 3)
+
+    return {"count": len(values), "mean": round(statistics.mean(values), 3),
+            "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": round(values[-1], 3)}
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Timer:
+    def __init__(self, samples, stage):
+        self.samples, self.stage = samples, stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.samples[self.stage].append((time.perf_counter() - self.started) * 1000)
+
+
+def run(args):
+    config = server_config("MODEL_PATH", "KNOWN_PLATES", "MATCH_THRESHOLD", "PLATES_SOURCE")
+    plate_index = LivePlateIndex(args.plates or config.get("PLATES_SOURCE"), config.get("KNOWN_PLATES", ()))
+    if plate_index.source:
+        plate_index.refresh()
+    threshold = args.threshold if args.threshold is not None else config.get("MATCH_THRESHOLD", 0.7)
+    ocr = get_engine()
+
+    find_plates = None
+    if not args.rois:
+        from ultralytics import YOLO
+        find_plates = detect(YOLO(args.model or config["MODEL_PATH"]), conf=args.conf)
+
+    truth = load_ground_truth(args.ground_truth)
+    prepare_roi = RoiPreprocessor()
+    ranker = OrientationRanker()
+    samples = defaultdict(list)
+    results = []
+    counts = defaultdict(int)
+    wall = 0.0
+    frame_no = 0
+
+    for path in args.inputs:
+        for key, frame in iter_frames(path, args.max_frames, args.stride):
+            frame_no += 1
+            warmup = frame_no <= args.warmup
+            timings = defaultdict(list) if warmup else samples
+            started = time.perf_counter()
+
+            if find_plates is not None:
+                with Timer(timings, "predict"):
+                    boxes = [p["box"] for p in find_plates(new_job(frame))["plates"]]
+                rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+            else:
+                rois = [frame]
+
+            matched, ocr_text, ratio = None, None, 0.0
+            reads = []
+            for roi in rois:
+                with Timer(timings, "roi"):
+                    roi, prep = prepare_roi(roi)
+                best = (None, None, 0.0)
+                # stop at the first orientation that matches a known plate
+                for orientation in ranker.order():
+                    with Timer(timings, "ocr"):
+                        text = clean_text(ocr.read(np.ascontiguousarray(orient(prep, orientation))))
+                    with Timer(timings, "match"):
+                        plate, score = plate_index.best(text, threshold)
+                    counts["ocr_calls"] += 1
+                    if best[1] is None or score > best[2]:
+                        best = (plate, text, score)
+                    if plate:
+                        ranker.record(orientation)
+                        break
+                reads.append({"ocr": best[1], "plate": best[0], "ratio": round(best[2], 3)})
+                if ocr_text is None or best[2] > ratio:
+                    matched, ocr_text, ratio = best
+
+            elapsed = time.perf_counter() - started
+            if warmup:
+                continue
+            wall += elapsed
+            samples["frame"].append(elapsed * 1000)
+            counts["frames"] += 1
+            counts["boxes"] += len(rois) if find_plates is not None else 0
+            counts["matches"] += matched is not None
+
+            row = {"file": key, "ocr": ocr_text, "plate": matched, "ratio": round(ratio, 3), "reads": reads}
+            if key in truth:
+                expected = truth[key]
+                row["expected"] = expected
+                row["correct"] = matched == expected
+                counts["labelled"] += 1
+                counts["correct"] += row["correct"]
+                if matched is not None and matched != expected:
+                    counts["wrong_plate" if expected else "false_positive"] += 1
+                elif matched is None and expected:
+                    counts["missed"] += 1
+            results.append(row)
+
+    report = {
+        "label": args.label or git_version(),
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(),
+                 "cpus": os.cpu_count(), "ocr_backend": ocr.backend},
+        "config": {"inputs": args.inputs, "rois": args.rois, "conf": args.conf,
+                   "stride": args.stride, "warmup": args.warmup, "plates": plate_index.source,
+                   "threshold": threshold},
+        "frames": counts["frames"],
+        "boxes": counts["boxes"],
+        "throughput_fps": round(counts["frames"] / wall, 2) if wall else 0.0,
+        "peak_memory_mb": peak_memory_mb(),
+        "stages_ms": {stage: percentiles(samples[stage]) for stage in STAGES + ["frame"] if samples[stage]},
+        "matches": counts["matches"],
+        "ocr_calls": counts["ocr_calls"],
+        "accuracy": {
+            "labelled": counts["labelled"],
+            "correct": counts["correct"],
+            "accuracy": round(counts["correct"] / counts["labelled"], 4) if counts["labelled"] else None,
+            "wrong_plate": counts["wrong_plate"],
+            "false_positive": counts["false_positive"],
+            "missed": counts["missed"],
+        },
+    }
+    if args.details:
+        report["results"] = results
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['label']}: {report['frames']} frames | {report['throughput_fps']} fps | "
+          f"peak memory {report['peak_memory_mb']} MB")
+    print(f"{'stage':<12}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}   (ms)")
+    for stage, p in report["stages_ms"].items():
+        print(f"{stage:<12}{p['mean']:>10.2f}{p['p50']:>10.2f}{p['p90']:>10.2f}{p['p99']:>10.2f}{p['max']:>10.2f}")
+    acc = report["accuracy"]
+    if acc["labelled"]:
+        print(f"accuracy {acc['accuracy']:.1%} on {acc['labelled']} labelled frames "
+              f"(wrong plate {acc['wrong_plate']}, false positive {acc['false_positive']}, missed {acc['missed']})")
+
+
+def compare(report, baseline, tolerance):
+    """Print metric changes against a previous run; returns True if anything regressed."""
+    print(f"\nCompared with {baseline['label']} ({baseline['timestamp']}):")
+    regressed = False
+
+    def line(name, new, old, higher_is_better):
+        nonlocal regressed
+        if new is None or old in (None, 0):
+            return
+        change = (new - old) / old
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        regressed |= worse
+        print(f"  {name:<22}{old:>10.3f} -> {new:<10.3f} {change:+.1%}{'  ⚠️ REGRESSION' if worse else ''}")
+
+    line("throughput_fps", report["throughput_fps"], baseline["throughput_fps"], True)
+    for stage, p in report["stages_ms"].items():
+        old = baseline["stages_ms"].get(stage)
+        if old:
+            line(f"{stage} p90 ms", p["p90"], old["p90"], False)
+    line("accuracy", report["accuracy"]["accuracy"], baseline["accuracy"]["accuracy"], True)
+    line("peak_memory_mb", report["peak_memory_mb"], baseline["peak_memory_mb"], False)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files, image folders or images")
+    parser.add_argument("--ground-truth", help="CSV with columns file,plate or JSON {file: plate}")
+    parser.add_argument("--model", help="YOLO weights (defaults to MODEL_PATH of camera_server.py)")
+    parser.add_argument("--rois", action="store_true", help="inputs are cropped plates; skip YOLO")
+    parser.add_argument("--plates", help="plate source as in PLATES_SOURCE (file or \"supabase\"); "
+                                         "defaults to PLATES_SOURCE / KNOWN_PLATES of camera_server.py")
+    parser.add_argument("--threshold", type=float, help="match threshold (defaults to MATCH_THRESHOLD)")
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--max-frames", type=int, help="per input")
+    parser.add_argument("--stride", type=int, default=1, help="use every n-th frame")
+    parser.add_argument("--warmup", type=int, default=3, help="frames excluded from the statistics")
+    parser.add_argument("--label", help="name of this run (defaults to git describe)")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--details", action="store_true", help="include per-frame results in the report")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Saved report to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark PlateIndex against the original linear difflib scan.
+
+    python bench_plate_index.py --sizes 10 1000 10000 100000 --queries 200
+
+Generates synthetic Malaysian-style plates, corrupts them with typical OCR
+errors (0/O, 1/I, 8/B, 5/S swaps, dropped or extra characters) and reports
+mean / p95 lookup latency and top-1 accuracy for both matchers.
+"""
+import argparse
+import difflib
+import random
+import statistics
+import string
+import time
+
+from plate_index import PlateIndex, CONFUSION_GROUPS
+
+LETTERS = string.ascii_uppercase
+
+
+def make_plates(n, rng):
+    plates = set()
+    while len(plates) < n:
+        prefix = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(1, 3)))
+        plates.add(f"{prefix} {rng.randint(1, 9999)}")
+    return sorted(plates)  # not set order: the same seed must give the same queries
+
+
+def corrupt(plate, rng):
+    chars = list(plate)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        group = next((g for g in CONFUSION_GROUPS if chars[i] in g), None)
+        roll = rng.random()
+        if group and roll < 0.6:
+            chars[i] = rng.choice(group)
+        elif roll < 0.8 and len(chars) > 4:
+            del chars[i]
+        else:
+            chars.insert(i, rng.choice(LETTERS + string.digits))
+    return ''.join(chars)
+
+
+def linear_difflib(plates, text):
+    best_match, best_ratio = None, 0.0
+    for candidate in plates:
+        ratio = difflib.SequenceMatcher(None, text, candidate).ratio()
+        if ratio > best_ratio:
+            best_ratio, best_match = ratio, candidate
+    return best_match
+
+
+def run(name, fn, queries):
+    latencies, correct = [], 0
+    for truth, text in queries:
+        started = time.perf_counter()
+        result = fn(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += result == truth
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(f"  {name:<10} mean {statistics.mean(latencies):8.3f} ms | p95 {p95:8.3f} ms | "
+          f"top-1 accuracy {correct / len(queries):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--linear-max-queries", type=int, default=100,
+                        help="cap on queries for the linear scan at large sizes")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        plates = make_plates(size, rng)
+        started = time.perf_counter()
+        index = PlateIndex(plates)
+        build_ms = (time.perf_counter() - started) * 1000
+        queries = [(p, corrupt(p, rng)) for p in rng.choices(plates, k=args.queries)]
+        print(f"{size} plates (index built in {build_ms:.0f} ms)")
+        run("index", lambda text: index.best(text, 0.0)[0], queries)
+        linear_queries = queries if size <= 1000 else queries[:args.linear_max_queries]
+        if len(linear_queries) < len(queries):
+            # accuracies are only comparable on the same queries
+            run(f"index@{len(linear_queries)}", lambda text: index.best(text, 0.0)[0], linear_queries)
+        run("difflib", lambda text: linear_difflib(plates, text), linear_queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+// kMeansClustering() and getDistance() from src/components/maps/SchedulingMap.tsx,
+// with the TypeScript types removed; used by bench_scheduling.py as the baseline.
+//
+//   node bench_scheduling.js input.json  ->  {"labels": [...], "ms": ..., "iterations": ...}
+//
+// input.json: {"bins": [{"bin_id", "latitude", "longitude"}], "k", "centerLat", "centerLng"}
+const fs = require('fs');
+
+const input = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+const centerLat = input.centerLat;
+const centerLng = input.centerLng;
+let iterationsRun = 0;
+
+const getDistance = (lat1, lon1, lat2, lon2) => {
+  const R = 6371; // Earth's radius in kilometers
+  const dLat = (lat2 - lat1) * Math.PI / 180;
+  const dLon = (lon2 - lon1) * Math.PI / 180;
+  const a =
+    Math.sin(dLat/2) * Math.sin(dLat/2) +
+    Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
+    Math.sin(dLon/2) * Math.sin(dLon/2);
+  const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
+  return R * c;
+};
+
+const kMeansClustering = (bins, k, maxIterations = 100) => {
+  if (bins.length === 0 || k === 0) return [];
+
+  // Initialize centroids randomly
+  let centroids = bins.slice(0, k).map(bin => ({
+    lat: bin.latitude,
+    lng: bin.longitude
+  }));
+
+  // If we have fewer bins than trucks, pad with the first bin
+  while (centroids.length < k) {
+    centroids.push({
+      lat: bins[0].latitude,
+      lng: bins[0].longitude
+    });
+  }
+
+  let clusters = Array(k).fill(null).map(() => []);
+  let iterations = 0;
+
+  while (iterations < maxIterations) {
+    // Reset clusters
+    clusters = Array(k).fill(null).map(() => []);
+
+    // Assign each bin to nearest centroid
+    bins.forEach(bin => {
+      let minDistance = Infinity;
+      let bestCluster = 0;
+
+      centroids.forEach((centroid, index) => {
+        const distance = getDistance(bin.latitude, bin.longitude, centroid.lat, centroid.lng);
+        if (distance < minDistance) {
+          minDistance = distance;
+          bestCluster = index;
+        }
+      });
+
+      clusters[bestCluster].push(bin);
+    });
+
+    // Update centroids
+    const newCentroids = clusters.map(cluster => {
+      if (cluster.length === 0) {
+        return { lat: centerLat, lng: centerLng }; // Default to center if cluster is empty
+      }
+
+      const avgLat = cluster.reduce((sum, bin) => sum + bin.latitude, 0) / cluster.length;
+      const avgLng = cluster.reduce((sum, bin) => sum + bin.longitude, 0) / cluster.length;
+
+      return { lat: avgLat, lng: avgLng };
+    });
+
+    // Check for convergence
+    const centroidsChanged = newCentroids.some((newCentroid, index) => {
+      const oldCentroid = centroids[index];
+      return getDistance(newCentroid.lat, newCentroid.lng, oldCentroid.lat, oldCentroid.lng) > 0.001;
+    });
+
+    if (!centroidsChanged) break;
+
+    centroids = newCentroids;
+    iterations++;
+  }
+
+  iterationsRun = iterations;
+  return clusters;
+};
+
+const started = process.hrtime.bigint();
+const clusters = kMeansClustering(input.bins, input.k);
+const ms = Number(process.hrtime.bigint() - started) / 1e6;
+
+const labelOf = new Map();
+clusters.forEach((cluster, index) => cluster.forEach(bin => labelOf.set(bin.bin_id, index)));
+process.stdout.write(JSON.stringify({
+  labels: input.bins.map(bin => labelOf.get(bin.bin_id)),
+  ms,
+  iterations: iterationsRun
+}));
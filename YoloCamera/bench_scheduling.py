@@ -0,0 +1,93 @@
+"""
+Benchmark the NumPy bin clustering against the browser's kMeansClustering().
+
+    python bench_scheduling.py --sizes 100 1000 10000 50000 --trucks 8
+
+Generates synthetic bins in neighbourhood-sized blobs around the collection
+centre, then runs the original JS clustering (bench_scheduling.js under
+node, if installed) and scheduling.cluster_bins() in full and mini-batch
+mode, with and without a per-truck capacity. Reports run time, iterations,
+the mean distance of a bin to its cluster's centroid (km, lower is tighter
+routes) and the smallest / largest cluster.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+from scheduling import cluster_bins, cluster_report
+
+# Collection centre used by SchedulingMap.tsx
+CENTER_LAT, CENTER_LNG = 1.5341, 103.6217
+JS_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_scheduling.js")
+
+
+def make_bins(n, rng, blobs=12, spread_deg=0.08, blob_deg=0.012):
+    centers = rng.normal([CENTER_LAT, CENTER_LNG], spread_deg, (blobs, 2))
+    points = centers[rng.integers(0, blobs, n)] + rng.normal(0, blob_deg, (n, 2))
+    return points[:, 0], points[:, 1]
+
+
+def run_js(lat, lng, k, timeout):
+    """Labels and timing of the JS baseline, or None without node."""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    bins = [{"bin_id": i, "latitude": float(a), "longitude": float(b)} for i, (a, b) in enumerate(zip(lat, lng))]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"bins": bins, "k": k, "centerLat": CENTER_LAT, "centerLng": CENTER_LNG}, f)
+    try:
+        out = subprocess.run([node, JS_BASELINE, f.name], capture_output=True, text=True,
+                             timeout=timeout, check=True)
+    except subprocess.TimeoutExpired:
+        return {"timeout": True}
+    finally:
+        os.remove(f.name)
+    return json.loads(out.stdout)
+
+
+def line(name, ms, iterations, report):
+    sizes = [c["size"] for c in report["clusters"]]
+    extra = f" | unassigned {report['unassigned']}" if report["unassigned"] else ""
+    print(f"  {name:<22} {ms:10.1f} ms | {iterations:3d} it | mean {report['mean_km']:7.3f} km | "
+          f"clusters {min(sizes)}-{max(sizes)}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--trucks", type=int, default=8)
+    parser.add_argument("--capacity", type=float, default=1.1,
+                        help="per-truck capacity as a multiple of bins / trucks")
+    parser.add_argument("--js-max-size", type=int, default=50000, help="skip the JS baseline above this")
+    parser.add_argument("--js-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    k = args.trucks
+    for n in args.sizes:
+        lat, lng = make_bins(n, rng)
+        print(f"{n} bins, {k} trucks")
+        js = run_js(lat, lng, k, args.js_timeout) if n <= args.js_max_size else None
+        if js is None:
+            print("  js kMeansClustering    skipped (no node, or above --js-max-size)")
+        elif js.get("timeout"):
+            print(f"  js kMeansClustering    timed out after {args.js_timeout:.0f} s")
+        else:
+            line("js kMeansClustering", js["ms"], js["iterations"], cluster_report(lat, lng, js["labels"], k))
+
+        capacity = int(np.ceil(n / k * args.capacity))
+        for name, mode, caps in [("numpy full", "full", None),
+                                 ("numpy minibatch", "minibatch", None),
+                                 (f"numpy full, cap {capacity}", "full", [capacity] * k)]:
+            result = cluster_bins(lat, lng, k, capacities=caps, mode=mode, seed=args.seed)
+            line(name, result["ms"], result["iterations"], cluster_report(lat, lng, result["labels"], k))
+
+
+if __name__ == "__main__":
+    main()
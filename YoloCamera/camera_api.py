@@ -1,35 +1,39 @@
 from fastapi import FastAPI, Response
 from fastapi.responses import StreamingResponse, JSONResponse
-import cv2, io, threading, time
+import cv2, time
+from datetime import datetime
 from ultralytics import YOLO
-# … your OCR imports …
+from ocr_engine import get_engine
+from plate_stages import plate_pipeline, camera_frames, annotate
 
 app = FastAPI()
 model = YOLO("weights.pt")
 cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
 
 latest_plate = {"plate": None, "confidence": 0.0, "timestamp": None}
+latest_jpeg = None
 
-def detection_loop():
-    global latest_plate
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # … run YOLO, OCR, set latest_plate …
-        time.sleep(0.03)  # ~30fps
+def publish(job):
+    """Last pipeline step: remember the newest plate and annotated frame"""
+    global latest_plate, latest_jpeg
+    if job["plates"] and job["plates"][0]["text"]:
+        latest_plate = {
+            "plate": job["plates"][0]["text"],
+            "confidence": job["plates"][0]["conf"],
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    _, jpg = cv2.imencode('.jpg', annotate(job)["frame"])
+    latest_jpeg = jpg.tobytes()
 
-threading.Thread(target=detection_loop, daemon=True).start()
+# One capture thread feeds YOLO -> ROI prep -> OCR; /stream reuses its frames
+pipeline = plate_pipeline(model, get_engine(), source=camera_frames(cap), on_result=publish).start()
 
 def mjpeg_generator():
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # draw boxes on frame …
-        _, jpg = cv2.imencode('.jpg', frame)
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" + jpg.tobytes() + b"\r\n")
+        if latest_jpeg is not None:
+            yield (b"--frame\r\n"
+                   b"Content-Type: image/jpeg\r\n\r\n" + latest_jpeg + b"\r\n")
+        time.sleep(0.03)  # ~30fps
 
 @app.get("/stream")
 def stream_video():
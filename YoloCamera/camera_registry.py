@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from frame_bus import FrameBus, CaptureThread
+from metrics import stage_timer
+from mjpeg_stream import MjpegBroadcaster
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+CAPTURE_SECONDS = stage_timer("capture")
+
+
+class FileCapture:
+    """
+    VideoCapture wrapper for recorded video files: paces reads to the file's
+    frame rate (instead of decoding as fast as possible) and optionally loops.
+    """
+
+    def __init__(self, path, loop=True, fps=None):
+        self.path = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._next_due = 0.0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        delay = self._next_due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_due = time.monotonic() + 1.0 / self.fps
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageFolderCapture:
+    """Plays the images of a directory (sorted by name) as if they were a camera."""
+
+    def __init__(self, path, loop=True, fps=2.0):
+        self.path = path
+        self.loop = loop
+        self.fps = fps
+        self.files = sorted(
+            os.path.join(path, f) for f in os.listdir(path)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._index = 0
+        self._next_due = 0.0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        if self._index >= len(self.files):
+            if not self.loop or not self.files:
+                return False, None
+            self._index = 0
+        delay = self._next_due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_due = time.monotonic() + 1.0 / self.fps
+        frame = cv2.imread(self.files[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+    def release(self):
+        self.files = []
+
+
+def open_source(source, loop=True, fps=None):
+    """
+    Open a camera source:
+      - int (or digit string)          -> local device index
+      - rtsp:// / http(s):// URL       -> network stream
+      - directory                      -> ImageFolderCapture
+      - anything else                  -> video file (FileCapture)
+    """
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        backend = cv2.CAP_DSHOW if os.name == 'nt' else cv2.CAP_ANY
+        return cv2.VideoCapture(int(source), backend)
+    if source.startswith(('rtsp://', 'rtmp://', 'http://', 'https://')):
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+    if os.path.isdir(source):
+        return ImageFolderCapture(source, loop=loop, fps=fps or 2.0)
+    return FileCapture(source, loop=loop, fps=fps)
+
+
+class CameraPipeline:
+    """Capture thread, frame bus, MJPEG broadcaster and detection thread of one camera."""
+
+    def __init__(self, camera_id, source, name=None, loop=True, fps=None, stream_options=None):
+        self.id = camera_id
+        self.source = source
+        self.name = name or camera_id
+        self.loop = loop
+        self.fps = fps
+        self.bus = FrameBus(capacity=8)
+        self.broadcaster = MjpegBroadcaster(self.bus, **(stream_options or {}))
+        self.latest_detection = {
+            "plate": None,
+            "confidence": 0.0,
+            "timestamp": None
+        }
+        # Counters published by the detection thread (tracker, gating, ...)
+        self.stats = {}
+        self.camera = None
+        self.capture_thread = None
+        self.detection_thread = None
+        self.error = None
+        self._stop_event = threading.Event()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def start(self, detect_fn):
+        """Open the source and start capture, streaming and detect_fn(pipeline) threads."""
+        self.camera = open_source(self.source, loop=self.loop, fps=self.fps)
+        if not self.camera.isOpened():
+            self.error = f"Could not open source {self.source!r}"
+            print(f"Error: [{self.id}] {self.error}")
+            return False
+        self._stop_event.clear()
+        self.capture_thread = CaptureThread(self.camera, self.bus, observe_read=CAPTURE_SECONDS.observe)
+        self.capture_thread.name = f"capture-{self.id}"
+        self.capture_thread.start()
+        self.broadcaster.start()
+        self.detection_thread = threading.Thread(
+            target=detect_fn, args=(self,), daemon=True, name=f"detect-{self.id}"
+        )
+        self.detection_thread.start()
+        print(f"[INFO] Camera '{self.id}' started ({self.source})")
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+        self.broadcaster.stop()
+        if self.capture_thread:
+            self.capture_thread.stop()
+        if self.camera:
+            self.camera.release()
+
+    def status(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "source": self.source,
+            "running": self.capture_thread is not None and self.capture_thread.is_alive(),
+            "error": self.error,
+            "frames": self.bus.seq,
+            "stream_clients": self.broadcaster.client_count,
+            "stats": self.stats,
+            "latest": self.latest_detection,
+        }
+
+
+class CameraRegistry:
+    """Ordered collection of camera pipelines; the first one is the default camera."""
+
+    def __init__(self):
+        self.cameras = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path, stream_options=None):
+        """
+        Load cameras from a JSON file of the form
+            {"cameras": [{"id": "rear", "source": 0, "name": "Rear loader"}, ...]}
+        Falls back to a single local webcam when the file does not exist.
+        """
+        registry = cls()
+        entries = [{"id": "default", "source": 0}]
+        if os.path.exists(path):
+            with open(path) as f:
+                entries = json.load(f).get("cameras", [])
+        for entry in entries:
+            registry.add(CameraPipeline(
+                entry["id"], entry["source"],
+                name=entry.get("name"),
+                loop=entry.get("loop", True),
+                fps=entry.get("fps"),
+                stream_options=stream_options,
+            ))
+        return registry
+
+    def add(self, pipeline):
+        if pipeline.id in self.cameras:
+            raise ValueError(f"Duplicate camera id: {pipeline.id}")
+        self.cameras[pipeline.id] = pipeline
+
+    def get(self, camera_id):
+        return self.cameras.get(camera_id)
+
+    def default(self):
+        return next(iter(self.cameras.values()), None)
+
+    def __iter__(self):
+        return iter(self.cameras.values())
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def start_all(self, detect_fn):
+        """Start every pipeline; sources are opened concurrently (each can take seconds)."""
+        threads = [threading.Thread(target=self._start, args=(pipeline, detect_fn), name=f"open-{pipeline.id}")
+                   for pipeline in self]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _start(self, pipeline, detect_fn):
+        try:
+            pipeline.start(detect_fn)
+        except Exception as e:
+            pipeline.error = str(e)
+            print(f"Error starting camera '{pipeline.id}': {e}")
+
+    def stop_all(self):
+        for pipeline in self:
+            pipeline.stop()
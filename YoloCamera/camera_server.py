@@ -1,25 +1,41 @@
-from fastapi import FastAPI, Response
-from fastapi.responses import StreamingResponse
+import time
+IMPORTS_STARTED = time.perf_counter()  # the startup report counts from here
+
+from fastapi import FastAPI, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import cv2
-import pytesseract
 import re
-import difflib
-from ultralytics import YOLO
 from datetime import datetime
 import json
 import threading
-import time
 from typing import Optional
-import io
-from PIL import Image
 import numpy as np
-from gdrive_auth import upload_to_gdrive
+import os
+from upload_queue import UploadQueue, LocalDriveBackend
+from camera_registry import CameraRegistry
+from plate_index import LivePlateIndex, ScheduleMatcher, load_schedule_plates
+from plate_tracker import PlateTracker
+from inference_scheduler import InferenceScheduler
+from ocr_engine import get_engine
+from motion_gate import MotionGate
+from frame_scheduler import AdaptiveFrameScheduler
+from event_hub import DetectionEventHub
+from plate_stages import RoiPreprocessor, OrientationRanker, orient, clean_text
+from detection_store import DetectionStore
+from image_store import ImageStore
+from metrics import REGISTRY, CONTENT_TYPE, stage_timer
+from startup import StartupTracker
+IMPORTS_SECONDS = time.perf_counter() - IMPORTS_STARTED
 
 # ——— CONFIG ———
 MODEL_PATH = r"C:\Users\User\Documents\GitHub\Kutip\YoloCamera\weights.pt"
+# The model is loaded in the background at startup and run once on a blank
+# frame of this shape, so the first real frame doesn't pay the warm-up cost
+MODEL_WARMUP = True
+MODEL_WARMUP_SHAPE = (480, 640, 3)
 DRIVE_FOLDER_ID = "1oLqV0VLJiqyoGBDXwCQNo1zL3xu0lj56"
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 # Your fixed list of 10 bin IDs
 KNOWN_PLATES = [
@@ -28,6 +44,87 @@ KNOWN_PLATES = [
 ]
 # Minimum similarity ratio (0–1) to accept a match
 MATCH_THRESHOLD = 0.7
+# Where to load bin plates from: a .txt/.csv/.json file, "supabase" for the bins
+# table, or None to use KNOWN_PLATES. The index is rebuilt in the background
+# every PLATE_REFRESH_INTERVAL seconds (or on POST /plates/reload).
+PLATES_SOURCE = None
+PLATE_REFRESH_INTERVAL = 300
+# While a camera's truck is on a schedule (POST /cameras/{id}/schedule), readings
+# are matched against the bins of that schedule first. A reading that matches
+# none of them falls back to all plates, but on-route it needs
+# ON_ROUTE_MATCH_THRESHOLD. A schedule is dropped after SCHEDULE_TTL_HOURS.
+ON_ROUTE_MATCH_THRESHOLD = 0.85
+SCHEDULE_TTL_HOURS = 14
+
+# Frames from all cameras are batched into one YOLO predict() call: up to
+# INFER_MAX_BATCH frames, waiting at most INFER_MAX_WAIT_MS for the batch to fill
+INFER_MAX_BATCH = 4
+INFER_MAX_WAIT_MS = 20
+
+# Detection rate per camera: aim for TARGET_FPS, always on the newest frame,
+# and back off when a frame takes longer than LATENCY_BUDGET_MS to process
+TARGET_FPS = 10
+MIN_FPS = 1
+LATENCY_BUDGET_MS = 250
+
+# Motion gating: skip YOLO while the (downscaled, grayscale) scene is static.
+# A frame counts as changed when more than MOTION_MIN_AREA of its pixels differ
+# from the background by MOTION_PIXEL_THRESHOLD; YOLO still runs at least every
+# MOTION_HEARTBEAT seconds.
+MOTION_GATE = True
+MOTION_WIDTH = 160
+MOTION_PIXEL_THRESHOLD = 25
+MOTION_MIN_AREA = 0.01
+MOTION_HEARTBEAT = 2.0
+
+# Every box above the YOLO confidence is tracked and OCR'd (up to this many per frame)
+MAX_PLATES_PER_FRAME = 8
+
+# Plate tracking: boxes are linked across frames by IoU and each bin lift is
+# OCR'd at most TRACK_MAX_OCR times. One detection is reported per track once
+# TRACK_CONFIRM_VOTES readings agree, or when the track ends (unseen for
+# TRACK_MAX_AGE seconds).
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_AGE = 1.0
+TRACK_MAX_OCR = 5
+TRACK_CONFIRM_VOTES = 2
+
+# Camera sources (device index, video file, RTSP URL or image directory), one
+# pipeline per entry. Without this file a single local webcam is used.
+CAMERAS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cameras.json")
+# The server is not ready until every camera has delivered a frame; a camera
+# that cannot be opened, or sends nothing for this many seconds, fails startup
+CAMERA_FIRST_FRAME_TIMEOUT = 30
+
+# Pending Drive uploads are spooled here and drained by background workers
+UPLOAD_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_spool")
+UPLOAD_WORKERS = 2
+# Set to a folder to "upload" into it instead of Google Drive (for testing)
+FAKE_DRIVE_DIR = None
+
+# Detection images (full frame + plate crop) are written here under content-hash
+# names. Near-identical frames of the same plate within IMAGE_DEDUP_WINDOW
+# seconds are stored once; the least recently used files are deleted beyond
+# IMAGE_QUOTA_MB or after IMAGE_MAX_AGE_DAYS.
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "captures")
+IMAGE_FULL_FORMAT, IMAGE_FULL_QUALITY = "webp", 80
+IMAGE_CROP_FORMAT, IMAGE_CROP_QUALITY = "jpg", 95
+IMAGE_QUOTA_MB = 2048
+IMAGE_MAX_AGE_DAYS = 30
+IMAGE_DEDUP_DISTANCE = 6   # max differing bits of the 64-bit perceptual hash
+IMAGE_DEDUP_WINDOW = 300
+
+# Every reported detection is kept in a local SQLite history for /detections.
+# Rows older than DETECTION_RETENTION_DAYS or beyond the newest
+# DETECTION_MAX_ROWS are deleted in the background.
+DETECTIONS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detections.db")
+DETECTION_RETENTION_DAYS = 30
+DETECTION_MAX_ROWS = 100000
+
+# /stream settings: every frame is encoded once and shared by all viewers
+STREAM_JPEG_QUALITY = 80
+STREAM_MAX_WIDTH = 960   # frames wider than this are downscaled
+STREAM_MAX_FPS = 15
 
 app = FastAPI()
 
@@ -40,175 +137,492 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables to store latest detection
-latest_detection = {
-    "plate": None,
-    "confidence": 0.0,
-    "timestamp": None
+# One pipeline (capture thread, frame bus, stream, latest detection) per camera
+registry = CameraRegistry.from_file(CAMERAS_CONFIG, stream_options={
+    "quality": STREAM_JPEG_QUALITY,
+    "max_width": STREAM_MAX_WIDTH,
+    "max_fps": STREAM_MAX_FPS,
+})
+
+uploader = UploadQueue(
+    UPLOAD_SPOOL_DIR,
+    upload=LocalDriveBackend(FAKE_DRIVE_DIR) if FAKE_DRIVE_DIR else None,
+    workers=UPLOAD_WORKERS,
+)
+
+# Fuzzy OCR-aware index over the known plates
+plate_index = LivePlateIndex(PLATES_SOURCE, KNOWN_PLATES, refresh_interval=PLATE_REFRESH_INTERVAL)
+
+# ... narrowed to the active schedule of each camera's truck
+schedules = {
+    pipeline.id: ScheduleMatcher(plate_index, MATCH_THRESHOLD, ON_ROUTE_MATCH_THRESHOLD,
+                                 ttl=SCHEDULE_TTL_HOURS * 3600)
+    for pipeline in registry
 }
 
-# Camera and model instances
-camera = None
+# Every detection event is pushed to /events (SSE) and /ws subscribers
+events = DetectionEventHub(history=500)
+
+# ... written to the local history in batches
+history = DetectionStore(DETECTIONS_DB, max_age_days=DETECTION_RETENTION_DAYS, max_rows=DETECTION_MAX_ROWS)
+
+# Detection images are saved off the detection threads; images still waiting
+# to be uploaded are never evicted
+images = ImageStore(
+    IMAGE_DIR,
+    full_format=IMAGE_FULL_FORMAT, full_quality=IMAGE_FULL_QUALITY,
+    crop_format=IMAGE_CROP_FORMAT, crop_quality=IMAGE_CROP_QUALITY,
+    quota_mb=IMAGE_QUOTA_MB, max_age_days=IMAGE_MAX_AGE_DAYS,
+    dedup_distance=IMAGE_DEDUP_DISTANCE, dedup_window=IMAGE_DEDUP_WINDOW,
+    pinned=uploader.is_pending,
+)
+
+# Pool of long-lived OCR workers shared by all cameras (see ocr_engine.py)
+ocr = None
+
+# A single YOLO model shared by all pipelines through the batching scheduler
 model = None
-detection_thread = None
-stop_detection = False
+scheduler = None
+
+# Slow startup work (model, OCR, Drive client) runs in the background; detection
+# starts once the required components are ready (see /healthz and /readyz)
+startup = StartupTracker(required=("model", "ocr", "cameras"), since=IMPORTS_STARTED)
+startup.record("imports", IMPORTS_SECONDS)
+startup.record("setup", startup.elapsed() - IMPORTS_SECONDS)
+
+# Prometheus metrics served on /metrics. Stage timings are histograms; counters
+# that other components already keep are read when /metrics is scraped.
+INFERENCE_SECONDS = stage_timer("inference")
+ROI_SECONDS = stage_timer("roi")
+MATCH_SECONDS = stage_timer("match")
+FRAMES = REGISTRY.counter("kutip_frames", "Frames taken by the detection loop", ["camera"])
+DETECTIONS = REGISTRY.counter("kutip_detections", "Plate boxes found by YOLO", ["camera"])
+MATCHES = REGISTRY.counter("kutip_plate_matches", "OCR readings matched to a known plate", ["camera"])
+NON_MATCHES = REGISTRY.counter("kutip_plate_non_matches", "OCR readings below MATCH_THRESHOLD", ["camera"])
+EVENTS = REGISTRY.counter("kutip_detection_events", "Detections reported (one per tracked bin lift)", ["camera"])
+REGISTRY.counter("kutip_frames_dropped", "Frames superseded before the detection loop took them", ["camera"]).set_function(
+    lambda: {(p.id,): p.stats.get("rate", {}).get("dropped", 0) for p in registry})
+REGISTRY.counter("kutip_frames_skipped", "Frames the motion gate kept away from YOLO", ["camera"]).set_function(
+    lambda: {(p.id,): p.stats.get("motion", {}).get("skipped", 0) for p in registry})
+REGISTRY.counter("kutip_upload_failures", "Drive uploads given up on after all retries").set_function(
+    lambda: uploader.stats()["failed"])
+REGISTRY.counter("kutip_upload_retries", "Failed Drive upload attempts that were retried").set_function(
+    lambda: uploader.stats()["retries"])
+REGISTRY.gauge("kutip_queue_depth", "Items waiting in a work queue", ["queue"]).set_function(
+    lambda: {
+        ("upload",): uploader.stats()["queued"],
+        ("inference",): scheduler.stats()["queued"] if scheduler else 0,
+        ("ocr",): ocr.stats()["pending"] if ocr else 0,
+        ("image_write",): images.stats()["queued"],
+    })
+REGISTRY.gauge("kutip_stream_clients", "Connected MJPEG viewers", ["camera"]).set_function(
+    lambda: {(p.id,): p.broadcaster.client_count for p in registry})
+REGISTRY.gauge("kutip_event_clients", "Connected SSE / WebSocket subscribers").set_function(
+    lambda: events.client_count)
+REGISTRY.counter("kutip_plate_match_source", "Readings matched on the active schedule, on all plates, or not at all",
+                 ["camera", "source"]).set_function(
+    lambda: {(camera, source): n for camera, m in schedules.items() for source, n in m.stats.items()})
 
 def get_nearest_plate(ocr_text: str):
     """
     Returns (best_match, ratio). If best_ratio < MATCH_THRESHOLD, returns (None, best_ratio).
     """
-    best_match = None
-    best_ratio = 0.0
-    for candidate in KNOWN_PLATES:
-        ratio = difflib.SequenceMatcher(None, ocr_text, candidate).ratio()
-        if ratio > best_ratio:
-            best_ratio, best_match = ratio, candidate
-    if best_ratio >= MATCH_THRESHOLD:
-        return best_match, best_ratio
-    return None, best_ratio
-
-def preprocess_image(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return cv2.GaussianBlur(th, (5, 5), 0)
-
-def rotate_180(img):
-    return cv2.rotate(img, cv2.ROTATE_180)
-
-def crop_borders(img):
-    g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, th = cv2.threshold(g, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    cnts, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    if cnts:
-        c = max(cnts, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(c)
-        return img[y:y+h, x:x+w]
-    return img
-
-def clean_text(s):
-    return ''.join(ch for ch in s if ch.isalnum() or ch.isspace()).strip()
-
-def detection_loop():
-    """Background thread for continuous detection"""
-    global latest_detection, camera, model, stop_detection
-    
-    while not stop_detection:
-        if camera is None or model is None:
-            time.sleep(1)
-            continue
-            
-        ret, frame = camera.read()
-        if not ret:
-            time.sleep(0.1)
+    return plate_index.best(ocr_text, MATCH_THRESHOLD)
+
+def get_nearest_plates(ocr_texts, camera=None):
+    """
+    get_nearest_plate() for all readings of a frame; repeated readings are
+    matched once. With a camera, its active schedule's bins are tried first.
+    """
+    if camera in schedules:
+        return schedules[camera].best_many(ocr_texts)
+    return plate_index.best_many(ocr_texts, MATCH_THRESHOLD)
+
+def emit_detection(pipeline, track):
+    """Save, upload and publish the final result of one plate track"""
+    plate, ratio, supporting = track.winner()
+    best = track.best[1]
+
+    pipeline.latest_detection = event = events.publish({
+        "plate": plate,
+        "confidence": ratio,
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "camera": pipeline.id,
+        "track": track.id,
+        "box": list(track.box),
+        "votes": supporting,
+        "readings": len(track.readings)
+    })
+
+    # The history row is written whether or not the images can be saved
+    history.add(event)
+
+    def saved(paths):
+        # Queue the Google Drive upload (once per stored image); workers retry until it succeeds
+        if not paths["duplicate"]:
+            uploader.enqueue(paths["plate"], folder_id=DRIVE_FOLDER_ID)
+        history.attach(event, os.path.basename(paths["plate"]))
+
+    # Images of the best reading are encoded and written by the image store's thread
+    images.save(best["frame"], best["roi"], key=plate, callback=saved)
+    EVENTS.labels(camera=pipeline.id).inc()
+    print(f"✅ [{pipeline.id}] Matched: {plate} | Track={track.id} | Votes={supporting}/{len(track.readings)} "
+          f"| Ratio={ratio:.2f} | Conf={track.conf:.2f}")
+
+def read_plates(pipeline, pending, ranker):
+    """
+    Match finished OCR jobs and record them as readings of their tracks.
+    A plate that matches nothing in the orientation tried first is queued
+    again in the next one; returns those jobs (they resolve next iteration).
+    """
+    retry = []
+    texts = [clean_text(job["future"].result()) for job in pending]
+
+    # find best known matches for all plates of the frame at once
+    with MATCH_SECONDS.time():
+        matches = get_nearest_plates(texts, pipeline.id)
+    for job, ocr_plate, (matched_plate, ratio) in zip(pending, texts, matches):
+        orientation = job["orientations"][0]
+        if job["best"] is None or ratio > job["best"][1]:
+            job["best"] = (matched_plate, ratio, ocr_plate, orientation)
+        if not matched_plate and len(job["orientations"]) > 1:
+            job["orientations"] = job["orientations"][1:]
+            job["future"] = ocr.submit(np.ascontiguousarray(orient(job["prep"], job["orientations"][0])))
+            retry.append(job)
             continue
 
-        res = model.predict(source=frame, conf=0.5, save=False)[0]
-        if res.boxes:
-            x1, y1, x2, y2 = map(int, res.boxes.xyxy[0].cpu().numpy())
-            conf = float(res.boxes.conf[0].cpu().numpy())
-
-            # crop & preprocess
-            roi = frame[y1:y2, x1:x2]
-            roi = crop_borders(roi)
-            roi = rotate_180(roi)
-            prep = preprocess_image(roi)
-
-            # OCR + clean
-            raw = pytesseract.image_to_string(prep, config='--psm 8')
-            ocr_plate = clean_text(raw)
-
-            # find best known match
-            matched_plate, ratio = get_nearest_plate(ocr_plate)
-
-            if matched_plate:
-                ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-                cf = f"plate_{ts}.jpg"
-                ff = f"full_{ts}.jpg"
-                
-                # Save images
-                cv2.imwrite(ff, frame)
-                cv2.imwrite(cf, roi)
-                
-                # Upload to Google Drive
-                try:
-                    upload_to_gdrive(cf, folder_id=DRIVE_FOLDER_ID)
-                    print(f"📤 Uploaded {cf} to Google Drive")
-                except Exception as e:
-                    print(f"⚠️ Upload failed: {e}")
-                
-                latest_detection = {
-                    "plate": matched_plate,
-                    "confidence": ratio,
-                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                print(f"✅ Matched: {matched_plate} | OCR='{ocr_plate}' | Ratio={ratio:.2f} | Conf={conf:.2f}")
-            else:
-                print(f"❌ No match above {MATCH_THRESHOLD:.2f}: OCR='{ocr_plate}' | Best ratio={ratio:.2f}")
-
-        time.sleep(0.1)  # Small delay to prevent excessive CPU usage
-
-def generate_frames():
-    """Generate MJPEG stream frames"""
-    global camera
-    while True:
-        if camera is None:
-            time.sleep(1)
+        matched_plate, ratio, ocr_plate, orientation = job["best"]
+        roi = np.ascontiguousarray(orient(job["roi"], orientation))
+        job["track"].add_reading(matched_plate, ratio, ocr_plate, roi=roi, frame=job["frame"])
+        (MATCHES if matched_plate else NON_MATCHES).labels(camera=pipeline.id).inc()
+        if matched_plate:
+            ranker.record(orientation)
+        else:
+            print(f"❌ [{pipeline.id}] No match above {MATCH_THRESHOLD:.2f}: OCR='{ocr_plate}' | Best ratio={ratio:.2f}")
+    return retry
+
+def detection_loop(pipeline):
+    """Background thread for continuous detection on one camera"""
+    tracker = PlateTracker(iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE,
+                           max_ocr=TRACK_MAX_OCR, confirm_votes=TRACK_CONFIRM_VOTES)
+    pipeline.stats["tracker"] = tracker.stats
+    gate = MotionGate(width=MOTION_WIDTH, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                      min_area=MOTION_MIN_AREA, heartbeat=MOTION_HEARTBEAT)
+    pipeline.stats["motion"] = gate.stats
+    pacer = AdaptiveFrameScheduler(target_fps=TARGET_FPS, min_fps=MIN_FPS,
+                                   latency_budget=LATENCY_BUDGET_MS / 1000.0)
+    pipeline.stats["rate"] = pacer.stats
+    frames = FRAMES.labels(camera=pipeline.id)
+    detections = DETECTIONS.labels(camera=pipeline.id)
+    prepare_roi = RoiPreprocessor()
+    ranker = OrientationRanker()
+    pipeline.stats["orientation"] = ranker.stats
+    pipeline.stats["schedule"] = schedules[pipeline.id].stats
+    last_seq = 0
+    pending = []  # OCR jobs of the previous frame(s), see read_plates()
+    while not pipeline.stopped:
+        # only the model and OCR: one broken camera must not stop the others
+        if not startup.wait(1.0, names=("model", "ocr")):
             continue
             
-        ret, frame = camera.read()
-        if not ret:
-            time.sleep(0.1)
+        latest = pacer.next_frame(pipeline.bus, last_seq, timeout=1.0)
+        if latest is None:
+            # no frames: still close tracks that have gone out of view
+            pending = read_plates(pipeline, pending, ranker)
+            for track in tracker.collect_events():
+                emit_detection(pipeline, track)
             continue
+        last_seq = latest.seq
+        frame = latest.image
+        started = time.monotonic()
+        frames.inc()
 
-        # Convert frame to JPEG
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Static scene and nothing being tracked: skip inference on this frame
+        if MOTION_GATE and not gate.should_infer(frame, latest.timestamp, force=bool(tracker.tracks)):
+            pending = read_plates(pipeline, pending, ranker)
+            for track in tracker.collect_events(latest.timestamp):
+                emit_detection(pipeline, track)
+            pacer.frame_done(latest, started)
+            continue
+
+        with INFERENCE_SECONDS.time():
+            res = scheduler.predict(frame)
+        # OCR submitted for the previous frame ran while YOLO worked on this one
+        pending = read_plates(pipeline, pending, ranker)
+        boxes, confs = [], []
+        if res.boxes:
+            # one device->host copy for all boxes of the frame
+            boxes = [tuple(b) for b in res.boxes.xyxy.cpu().numpy().astype(int)[:MAX_PLATES_PER_FRAME].tolist()]
+            confs = res.boxes.conf.cpu().numpy()[:MAX_PLATES_PER_FRAME].tolist()
+            detections.inc(len(boxes))
+
+        for (x1, y1, x2, y2), track in zip(boxes, tracker.update(boxes, confs, latest.timestamp)):
+            # OCR only a few times per bin lift; the tracker votes on the readings
+            if not tracker.needs_ocr(track, latest.timestamp):
+                continue
+
+            # crop & binarize in one pass (views of the frame, reused buffers)
+            with ROI_SECONDS.time():
+                roi, prep = prepare_roi(frame[y1:y2, x1:x2])
+
+            # OCR of all plates runs concurrently in the worker pool, most
+            # likely orientation first; the results are read next iteration
+            orientations = ranker.order()
+            pending.append({
+                "track": track, "roi": roi, "prep": prep, "frame": frame,
+                "orientations": orientations, "best": None,
+                "future": ocr.submit(np.ascontiguousarray(orient(prep, orientations[0]))),
+            })
+
+        for track in tracker.collect_events(latest.timestamp):
+            emit_detection(pipeline, track)
+
+        pacer.frame_done(latest, started)
+
+def load_model():
+    """Import ultralytics, load the shared model and warm it up"""
+    global model, scheduler
+    with startup.step("model.import"):
+        from ultralytics import YOLO
+    with startup.step("model.load"):
+        model = YOLO(MODEL_PATH)
+    # No point waiting for a batch larger than the number of cameras
+    scheduler = InferenceScheduler(
+        model,
+        max_batch=min(INFER_MAX_BATCH, len(registry)),
+        max_wait=INFER_MAX_WAIT_MS / 1000.0,
+        conf=0.5, save=False
+    ).start()
+    if MODEL_WARMUP:
+        with startup.step("model.warmup"):
+            scheduler.predict(np.zeros(MODEL_WARMUP_SHAPE, np.uint8))
+    print("[INFO] Model initialized successfully")
+
+def load_ocr():
+    """Start the OCR workers and let each of them read once"""
+    global ocr
+    with startup.step("ocr.load"):
+        ocr = get_engine()
+    with startup.step("ocr.warmup"):
+        ocr.warm_up()
+
+def start_cameras():
+    """Open every camera and wait for its first frame; raises if a camera has no working capture"""
+    registry.start_all(detection_loop)
+    with startup.step("cameras.first_frame"):
+        deadline = time.monotonic() + CAMERA_FIRST_FRAME_TIMEOUT
+        failed = []
+        for pipeline in registry:
+            if pipeline.error:
+                failed.append(f"{pipeline.id}: {pipeline.error}")
+            elif pipeline.bus.wait_newer(0, max(0.0, deadline - time.monotonic())) is None:
+                failed.append(f"{pipeline.id}: no frame within {CAMERA_FIRST_FRAME_TIMEOUT}s")
+    if not len(registry):
+        failed.append("no cameras configured")
+    if failed:
+        raise RuntimeError("; ".join(failed))
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize camera and model on startup"""
-    global camera, model, detection_thread, stop_detection
-    
-    try:
-        # Initialize camera
-        camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not camera.isOpened():
-            print("Error: Could not open camera")
-            return
-            
-        # Load model
-        model = YOLO(MODEL_PATH)
-        print("[INFO] Camera and model initialized successfully")
-        
-        # Start detection thread
-        stop_detection = False
-        detection_thread = threading.Thread(target=detection_loop, daemon=True)
-        detection_thread.start()
-        
-    except Exception as e:
-        print(f"Error during startup: {e}")
+    """Start loading the model and OCR in the background and one pipeline per configured camera"""
+    startup.run("model", load_model)
+    startup.run("ocr", load_ocr)
+    # the Google Drive client is slow to import; uploads only need it later
+    startup.run("drive", uploader.load_backend)
+    # cameras stream while the model loads; detection waits for startup
+    startup.run("cameras", start_cameras)
+
+    uploader.start()
+    history.start()
+    plate_index.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown"""
-    global camera, stop_detection
-    
-    stop_detection = True
-    if camera:
-        camera.release()
-    print("[INFO] Camera released")
+    registry.stop_all()
+    if scheduler:
+        scheduler.stop()
+    images.close()
+    uploader.stop()
+    history.stop()
+    plate_index.stop()
+    print("[INFO] Cameras released")
+
+def latest_response(request: Request, pipeline):
+    """Latest detection with an ETag, answering 304 when the client is up to date"""
+    etag = f'"{pipeline.id}-{events.event_id(pipeline.latest_detection)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(pipeline.latest_detection, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def get_pipeline(camera_id: Optional[str] = None):
+    pipeline = registry.get(camera_id) if camera_id else registry.default()
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail=f"Unknown camera: {camera_id}")
+    return pipeline
 
 @app.get("/")
 async def root():
     return {"message": "Camera Detection Server", "status": "running"}
 
+def camera_health():
+    return {p.id: {"running": p.status()["running"], "error": p.error} for p in registry}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up. Also reports every component and where startup time went"""
+    return dict(startup.report(), status="ok", cameras=camera_health())
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model and OCR are warmed up and every camera has sent a frame, 503 until then"""
+    report = startup.report()
+    body = {"ready": report["ready"], "components": report["components"], "cameras": camera_health()}
+    return JSONResponse(body, status_code=200 if report["ready"] else 503)
+
 @app.get("/latest")
-async def get_latest_detection():
-    """Get the latest plate detection result"""
-    return latest_detection
+async def get_latest_detection(request: Request):
+    """Get the latest plate detection result of the default camera"""
+    return latest_response(request, get_pipeline())
+
+@app.get("/uploads")
+async def upload_status():
+    """Counters of the background Drive upload queue"""
+    return uploader.stats()
+
+@app.get("/images")
+async def image_status():
+    """Files, bytes and dedup/eviction counters of the detection image store"""
+    return images.stats()
+
+@app.get("/events")
+async def detection_events(request: Request, since: Optional[str] = None, camera: Optional[str] = None):
+    """
+    Server-Sent Events stream of detection events. Reconnecting clients resume
+    after the Last-Event-ID header (sent automatically by EventSource) or
+    ?since= (an event id "<epoch>-<seq>", or a seq; 0 replays the buffer);
+    ids from before a restart resume from the oldest buffered event. Without
+    either, only new events are sent.
+    """
+    since = request.headers.get("last-event-id") or since
+    return StreamingResponse(
+        events.sse(since, camera),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws")
+async def detection_socket(websocket: WebSocket, since: Optional[str] = None, camera: Optional[str] = None):
+    """WebSocket push of detection events, resuming after ?since=<event id or seq> (new events only without it)"""
+    await websocket.accept()
+    try:
+        async for event in events.subscribe(since, camera):
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/detections")
+def detection_history(since: Optional[str] = None, plate: Optional[str] = None, camera: Optional[str] = None,
+                      limit: int = 50, cursor: Optional[int] = None):
+    """
+    Stored detections, newest first. since is a unix time or ISO date/time;
+    pass the returned next_cursor as ?cursor= to get the next page.
+    """
+    if since:
+        try:
+            since = float(since)
+        except ValueError:
+            try:
+                since = datetime.fromisoformat(since).timestamp()
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid since: {since}")
+    return history.query(since=since, plate=plate, camera=camera, limit=max(1, min(limit, 1000)), cursor=cursor)
+
+@app.get("/detections/stats")
+def detection_history_stats():
+    """Size and retention counters of the detection history"""
+    return history.stats()
+
+@app.get("/inference")
+async def inference_status():
+    """Batched YOLO throughput and latency per batch size"""
+    ocr_stats = ocr.stats() if ocr else None
+    if scheduler is None:
+        return {"ready": False, "ocr": ocr_stats}
+    return {"ready": True, **scheduler.stats(), "ocr": ocr_stats}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage latencies, counters and queue depths"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/plates")
+async def plates_status():
+    """Size, source and load time of the plate index"""
+    return plate_index.status()
+
+@app.get("/plates/search")
+async def plates_search(q: str, k: int = 5):
+    """Top-k known plates for an OCR reading"""
+    return [{"plate": plate, "ratio": ratio} for plate, ratio in plate_index.search(q, k)]
+
+@app.post("/plates/reload")
+async def plates_reload():
+    """Rebuild the plate index from PLATES_SOURCE in the background"""
+    plate_index.reload()
+    return {"success": True, **plate_index.status()}
+
+def get_schedule(camera_id: Optional[str] = None):
+    return schedules[get_pipeline(camera_id).id]
+
+@app.get("/schedule")
+def schedule_status():
+    """Active schedule of the default camera"""
+    return get_schedule().status()
+
+@app.post("/schedule")
+def set_schedule(body: dict):
+    """Set the active schedule of the default camera (see /cameras/{id}/schedule)"""
+    return set_camera_schedule(None, body)
+
+@app.delete("/schedule")
+def clear_schedule():
+    get_schedule().clear()
+    return {"success": True}
+
+@app.get("/cameras/{camera_id}/schedule")
+def camera_schedule(camera_id: str):
+    """Active schedule of one camera and where its readings were matched"""
+    return get_schedule(camera_id).status()
+
+@app.post("/cameras/{camera_id}/schedule")
+def set_camera_schedule(camera_id: str, body: dict):
+    """
+    Match this camera's readings against one schedule's bins first. Body:
+    {"schedule_id", "route_id", "plates": [...]}; without plates they are
+    pulled from the schedule's truck_assignments (optionally for "truck_id").
+    """
+    matcher = get_schedule(camera_id)
+    plates, schedule_id = body.get("plates"), body.get("schedule_id")
+    if plates is None:
+        if schedule_id is None:
+            raise HTTPException(status_code=400, detail="Pass plates or a schedule_id to pull them for")
+        try:
+            plates = load_schedule_plates(schedule_id, body.get("truck_id"))
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Could not load plates of schedule {schedule_id}: {e}")
+    if not plates:
+        matcher.clear()
+        return {"success": False, "error": "Schedule has no bins; matching against all plates", **matcher.status()}
+    status = matcher.set_schedule(plates, schedule_id, body.get("route_id"))
+    print(f"[INFO] [{get_pipeline(camera_id).id}] Schedule {schedule_id}: matching {status['plates']} bin(s) first")
+    return {"success": True, **status}
+
+@app.delete("/cameras/{camera_id}/schedule")
+def clear_camera_schedule(camera_id: str):
+    """Schedule finished: match against all plates again"""
+    get_schedule(camera_id).clear()
+    return {"success": True}
 
 @app.post("/mark-collected")
 async def mark_bin_collected(plate_data: dict):
@@ -226,12 +640,47 @@ async def mark_bin_collected(plate_data: dict):
 
 @app.get("/stream")
 async def video_stream():
-    """Stream MJPEG video feed"""
+    """Stream MJPEG video feed of the default camera"""
+    return await camera_stream(None)
+
+@app.get("/snapshot")
+async def snapshot():
+    """Serve the most recently encoded frame of the default camera"""
+    return await camera_snapshot(None)
+
+@app.get("/cameras")
+async def list_cameras():
+    """List configured cameras and their status"""
+    return [pipeline.status() for pipeline in registry]
+
+@app.get("/cameras/{camera_id}/latest")
+async def camera_latest(camera_id: str, request: Request):
+    """Get the latest plate detection result of one camera"""
+    return latest_response(request, get_pipeline(camera_id))
+
+@app.get("/cameras/{camera_id}/stats")
+async def camera_stats(camera_id: str):
+    """Detection counters of one camera (tracking, motion gate skip ratio, ...)"""
+    return get_pipeline(camera_id).stats
+
+@app.get("/cameras/{camera_id}/stream")
+async def camera_stream(camera_id: str):
+    """Stream MJPEG video feed of one camera"""
+    pipeline = get_pipeline(camera_id)
     return StreamingResponse(
-        generate_frames(),
+        pipeline.broadcaster.stream(),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
+@app.get("/cameras/{camera_id}/snapshot")
+async def camera_snapshot(camera_id: str):
+    """Serve the most recently encoded frame of one camera as a single JPEG"""
+    # snapshot() may have to JPEG-encode a frame; keep that off the event loop
+    latest = await run_in_threadpool(get_pipeline(camera_id).broadcaster.snapshot)
+    if latest is None:
+        return Response(status_code=503)
+    return Response(content=latest.jpeg, media_type="image/jpeg")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    timestamp TEXT,
+    camera TEXT,
+    plate TEXT COLLATE NOCASE,
+    confidence REAL,
+    votes INTEGER,
+    readings INTEGER,
+    seq INTEGER,
+    image TEXT
+);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_plate ON detections (plate, id);
+CREATE INDEX IF NOT EXISTS detections_camera ON detections (camera, id);
+"""
+
+COLUMNS = ("id", "ts", "timestamp", "camera", "plate", "confidence", "votes", "readings", "seq", "image")
+
+
+class DetectionStore:
+    """
+    Embedded SQLite history of detection events.
+
+    add() only appends to an in-memory buffer; a writer thread inserts the
+    buffer in one transaction every batch_size rows or flush_interval seconds
+    (together with the image names attach() set on rows added earlier)
+    and applies the retention policy (rows older than max_age_days, or beyond
+    the newest max_rows) every retention_interval seconds. query() pages
+    newest-first with an id cursor, so every page is one index range scan.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=1.0, max_age_days=30,
+                 max_rows=100000, retention_interval=300):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.retention_interval = retention_interval
+        self.counters = {"added": 0, "written": 0, "flushes": 0, "pruned": 0}
+        self._buffer = []
+        self._images = []  # (image, camera, seq) of rows added without one
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stopping = False
+        self._thread = None
+        self._last_prune = 0.0
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        """One read connection per thread (FastAPI runs sync endpoints in a pool)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+            db.row_factory = sqlite3.Row
+        return db
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, daemon=True, name="detection-store")
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Write whatever is buffered and stop the writer thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add(self, event: dict, image=None):
+        """Buffer one detection event (as published to /events)."""
+        row = (time.time(), event.get("timestamp"), event.get("camera"), event.get("plate"),
+               event.get("confidence"), event.get("votes"), event.get("readings"), event.get("seq"), image)
+        with self._cond:
+            self._buffer.append(row)
+            self.counters["added"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def attach(self, event: dict, image):
+        """Set the image of the row add() wrote for this event (once the image is on disk)."""
+        with self._cond:
+            self._images.append((image, event.get("camera"), event.get("seq")))
+
+    def _run(self):
+        db = self._connect()
+        try:
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.flush_interval
+                    while not self._stopping and len(self._buffer) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    rows, self._buffer = self._buffer, []
+                    images, self._images = self._images, []
+                    stopping = self._stopping
+                try:
+                    if rows or images:
+                        self._write(db, rows, images)
+                    if time.monotonic() - self._last_prune >= self.retention_interval:
+                        self.prune(db)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Detection store write failed, dropping {len(rows)} row(s): {e}")
+                if stopping:
+                    return
+        finally:
+            db.close()
+
+    def _write(self, db, rows, images=()):
+        with db:
+            db.executemany(
+                "INSERT INTO detections (ts, timestamp, camera, plate, confidence, votes, readings, seq, image) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # seq restarts with the server, so the newest row of the camera with that seq is the one
+            db.executemany(
+                "UPDATE detections SET image = ? WHERE id = (SELECT id FROM detections "
+                "WHERE camera = ? AND seq = ? ORDER BY id DESC LIMIT 1)", images)
+        self.counters["written"] += len(rows)
+        self.counters["flushes"] += 1
+
+    def prune(self, db=None):
+        """Apply the retention policy; returns the number of rows deleted."""
+        own = db is None
+        db = db or self._connect()
+        deleted = 0
+        try:
+            with db:
+                if self.max_age_days:
+                    cutoff = time.time() - self.max_age_days * 86400
+                    deleted += db.execute("DELETE FROM detections WHERE ts < ?", (cutoff,)).rowcount
+                if self.max_rows:
+                    deleted += db.execute(
+                        "DELETE FROM detections WHERE id <= "
+                        "(SELECT id FROM detections ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (self.max_rows,)).rowcount
+        finally:
+            if own:
+                db.close()
+        self._last_prune = time.monotonic()
+        self.counters["pruned"] += deleted
+        return deleted
+
+    def query(self, since=None, plate=None, camera=None, limit=50, cursor=None):
+        """
+        Detections newest first. since is a unix time; cursor is the
+        next_cursor of the previous page. Returns {"items", "next_cursor"}.
+        """
+        where, args = [], []
+        if cursor is not None:
+            where.append("id < ?")
+            args.append(int(cursor))
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(float(since))
+        if plate:
+            where.append("plate = ?")
+            args.append(plate)
+        if camera:
+            where.append("camera = ?")
+            args.append(camera)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM detections"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(int(limit) + 1)
+        rows = [dict(r) for r in self._reader().execute(sql, args)]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"items": rows, "next_cursor": rows[-1]["id"] if more else None}
+
+    def stats(self):
+        with self._cond:
+            counters = dict(self.counters, buffered=len(self._buffer))
+        row = self._reader().execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM detections").fetchone()
+        return dict(counters, rows=row[0], oldest=row[1], newest=row[2], path=self.path)
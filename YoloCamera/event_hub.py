@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+
+
+class DetectionEventHub:
+    """
+    Sequenced fan-out of detection events to push clients (SSE / WebSocket).
+
+    publish() may be called from any thread; it stamps the event with the next
+    sequence number, keeps it in a bounded history and wakes every subscriber
+    on its event loop. Subscribers that reconnect pass the last sequence number
+    they saw and first receive whatever they missed from the history.
+
+    Sequence numbers restart with the server, so every event also carries the
+    hub's epoch (new on every start) and event ids are "<epoch>-<seq>". An id
+    from another epoch, or a seq the hub has not reached yet, resumes from the
+    start of the history instead of filtering out every new event. Without
+    an id (None) only events published from then on are sent.
+    """
+
+    def __init__(self, history=500):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict) -> dict:
+        with self._lock:
+            self.seq += 1
+            event = dict(event, seq=self.seq, epoch=self.epoch)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for loop, wake in subscribers:
+            loop.call_soon_threadsafe(wake.set)
+        return event
+
+    def event_id(self, event):
+        return f"{event.get('epoch', self.epoch)}-{event.get('seq', 0)}"
+
+    def resume_seq(self, last_id) -> int:
+        """Sequence number to resume after, from an event id ("<epoch>-<seq>") or a bare seq."""
+        if last_id is None:
+            with self._lock:
+                return self.seq
+        epoch, _, seq = str(last_id or "").rpartition("-")
+        if not seq.isdigit() or (epoch and epoch != self.epoch):
+            return 0
+        seq = int(seq)
+        with self._lock:
+            return seq if seq <= self.seq else 0
+
+    def since(self, last_seq: int, camera=None):
+        """Buffered events newer than last_seq (optionally for one camera), oldest first."""
+        with self._lock:
+            return [e for e in self._history
+                    if e["seq"] > last_seq and (camera is None or e.get("camera") == camera)]
+
+    @property
+    def oldest_seq(self):
+        with self._lock:
+            return self._history[0]["seq"] if self._history else self.seq + 1
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self, last_seq: int = 0, camera=None):
+        """Async generator of events after last_seq (a seq or an event id): first the backlog, then live ones."""
+        last_seq = self.resume_seq(last_seq)
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        subscriber = (loop, wake)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            while True:
+                wake.clear()
+                for event in self.since(last_seq, camera):
+                    last_seq = event["seq"]
+                    yield event
+                await wake.wait()
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    async def sse(self, last_seq: int = 0, camera=None, keepalive=15.0):
+        """Server-Sent Events stream; the `id:` field lets browsers resume via Last-Event-ID."""
+        events = self.subscribe(last_seq, camera)
+        pending = None
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(events.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=keepalive)
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                event, pending = pending.result(), None
+                yield f"id: {self.event_id(event)}\nevent: detection\ndata: {json.dumps(event)}\n\n"
+        finally:
+            if pending is not None:
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+            await events.aclose()
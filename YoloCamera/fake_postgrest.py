@@ -0,0 +1,78 @@
+"""
+Minimal local stand-in for the Supabase PostgREST endpoint, for testing
+BinLogWriter without touching the real database:
+
+    python fake_postgrest.py --port 54321 --out fake_bin_logs.jsonl
+
+then point the writer at it with BinLogWriter(base_url="http://localhost:54321").
+POST /rest/v1/<table> accepts a row or a list of rows and appends them to the
+output file. POST /_outage?seconds=N makes inserts fail with 503 for N seconds.
+bin_id is what the callers log: the matched plate text (or "Unrecognized").
+A batch with a row without one (missing, null or empty) is rejected with 400,
+as PostgREST does for a not-null violation, to exercise the rejected-row path.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+state = {"rows": 0, "requests": 0, "down_until": 0.0}
+lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    out_path = "fake_bin_logs.jsonl"
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with lock:
+            self._reply(200, dict(state))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if url.path == "/_outage":
+            seconds = float(parse_qs(url.query).get("seconds", ["30"])[0])
+            with lock:
+                state["down_until"] = time.time() + seconds
+            return self._reply(200, {"down_for": seconds})
+        if not url.path.startswith("/rest/v1/"):
+            return self._reply(404, {"message": "not found"})
+        with lock:
+            state["requests"] += 1
+            if time.time() < state["down_until"]:
+                return self._reply(503, {"message": "simulated outage"})
+            rows = json.loads(body or b"[]")
+            rows = rows if isinstance(rows, list) else [rows]
+            if any(row.get("bin_id") in (None, "") for row in rows):
+                return self._reply(400, {"code": "23502", "message": 'null value in column "bin_id" violates '
+                                                                    'not-null constraint'})
+            table = url.path.rsplit("/", 1)[-1]
+            with open(self.out_path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps({"table": table, **row}) + "\n")
+            state["rows"] += len(rows)
+        self._reply(201)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--out", default="fake_bin_logs.jsonl")
+    args = parser.parse_args()
+    Handler.out_path = args.out
+    print(f"[INFO] Fake PostgREST listening on http://localhost:{args.port}")
+    ThreadingHTTPServer(("0.0.0.0", args.port), Handler).serve_forever()
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+# One captured frame: a monotonically increasing sequence number, the capture
+# time (time.time()) and the BGR image. Images are shared between consumers
+# without copying, so they are marked read-only when published.
+Frame = namedtuple("Frame", ["seq", "timestamp", "image"])
+
+
+class FrameBus:
+    """
+    Bounded ring buffer of the newest captured frames.
+
+    A single producer (CaptureThread) publishes frames; any number of consumers
+    read them with latest() / wait_newer() without touching the camera device.
+    """
+
+    def __init__(self, capacity: int = 8):
+        self._frames = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self.closed = False
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest published frame (0 if none yet)."""
+        return self._seq
+
+    def publish(self, image, timestamp: float = None) -> Frame:
+        image.flags.writeable = False
+        with self._cond:
+            self._seq += 1
+            frame = Frame(self._seq, timestamp or time.time(), image)
+            self._frames.append(frame)
+            self._cond.notify_all()
+        return frame
+
+    def latest(self):
+        """Newest frame, or None if nothing has been captured yet."""
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def since(self, after_seq: int):
+        """All buffered frames newer than after_seq, oldest first."""
+        with self._cond:
+            return [f for f in self._frames if f.seq > after_seq]
+
+    def wait_newer(self, after_seq: int = 0, timeout: float = None):
+        """
+        Block until a frame newer than after_seq is available and return the
+        newest one. Returns None on timeout or when the bus is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self._seq > after_seq, timeout):
+                return None
+            if self.closed and self._seq <= after_seq:
+                return None
+            return self._frames[-1]
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CaptureThread(threading.Thread):
+    """
+    The only reader of a cv2.VideoCapture; publishes every frame into a FrameBus.
+    observe_read, if given, is called with the duration of every read() in seconds.
+    """
+
+    def __init__(self, camera, bus: FrameBus, retry_delay: float = 0.1, observe_read=None):
+        super().__init__(daemon=True, name="capture")
+        self.camera = camera
+        self.bus = bus
+        self.retry_delay = retry_delay
+        self.observe_read = observe_read
+        self.frames_read = 0
+        self.read_failures = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            ret, frame = self.camera.read()
+            if self.observe_read is not None:
+                self.observe_read(time.perf_counter() - started)
+            if not ret:
+                self.read_failures += 1
+                time.sleep(self.retry_delay)
+                continue
+            self.frames_read += 1
+            self.bus.publish(frame)
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.bus.close()
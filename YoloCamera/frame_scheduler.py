@@ -0,0 +1,80 @@
+import time
+
+
+class AdaptiveFrameScheduler:
+    """
+    Paces a detection loop at a target rate instead of a fixed sleep.
+
+    next_frame() waits until the next slot and then takes the newest frame from
+    the bus; any frames published in between are dropped (and counted).
+    frame_done() measures how long the frame took and how old it was when
+    finished: when processing exceeds the latency budget the interval is
+    stretched (down to min_fps), and when there is plenty of headroom it is
+    shortened again towards target_fps.
+    """
+
+    def __init__(self, target_fps=10.0, latency_budget=0.25, min_fps=1.0, smoothing=0.2):
+        self.target_fps = target_fps
+        self.latency_budget = latency_budget
+        self.min_fps = min_fps
+        self.smoothing = smoothing
+        self.interval = 1.0 / target_fps
+        self._next_due = 0.0
+        self._last_done = None
+        self._proc = None
+        self._age = None
+        self._fps = None
+        self.stats = {
+            "target_fps": target_fps,
+            "current_fps": target_fps,
+            "achieved_fps": 0.0,
+            "processed": 0,
+            "dropped": 0,
+            "processing_ms": 0.0,
+            "frame_age_ms": 0.0,
+            "max_frame_age_ms": 0.0,
+            "backoffs": 0,
+        }
+
+    def _ewma(self, previous, value):
+        return value if previous is None else previous + self.smoothing * (value - previous)
+
+    def next_frame(self, bus, last_seq, timeout=1.0):
+        """Newest frame after last_seq once the next slot is due, or None on timeout."""
+        delay = self._next_due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        frame = bus.wait_newer(last_seq, timeout=timeout)
+        if frame is None:
+            return None
+        if last_seq:
+            self.stats["dropped"] += max(0, frame.seq - last_seq - 1)
+        self._next_due = time.monotonic() + self.interval
+        return frame
+
+    def frame_done(self, frame, started):
+        """Record one processed frame; started is the time.monotonic() it was taken."""
+        now = time.monotonic()
+        self._proc = self._ewma(self._proc, now - started)
+        age = time.time() - frame.timestamp
+        self._age = self._ewma(self._age, age)
+        if self._last_done is not None and now > self._last_done:
+            self._fps = self._ewma(self._fps, 1.0 / (now - self._last_done))
+        self._last_done = now
+
+        slowest = 1.0 / self.min_fps
+        fastest = 1.0 / self.target_fps
+        if self._proc > self.latency_budget or age > 2 * self.latency_budget:
+            if self.interval < slowest:
+                self.interval = min(slowest, self.interval * 1.25)
+                self.stats["backoffs"] += 1
+        elif self._proc < 0.5 * self.latency_budget and self.interval > fastest:
+            self.interval = max(fastest, self.interval * 0.9)
+
+        stats = self.stats
+        stats["processed"] += 1
+        stats["current_fps"] = round(1.0 / self.interval, 2)
+        stats["achieved_fps"] = round(self._fps or 0.0, 2)
+        stats["processing_ms"] = round(self._proc * 1000, 1)
+        stats["frame_age_ms"] = round(self._age * 1000, 1)
+        stats["max_frame_age_ms"] = round(max(stats["max_frame_age_ms"], age * 1000), 1)
@@ -2,14 +2,21 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload     # ← make sure this is here
 from google.auth.transport.requests import Request
-import os, pickle
+import os, pickle, threading
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
 CREDENTIALS_PATH = r'C:\xampp\htdocs\Kutip\YoloCamera\credentials.json'
 TOKEN_PATH = 'token.pickle'
 
-def authenticate():
+# Cached credentials shared by every upload. The Drive service object itself
+# wraps an httplib2 connection, which is not thread-safe, so each upload
+# worker thread builds its own service once and reuses it.
+_creds = None
+_creds_lock = threading.Lock()
+_local = threading.local()
+
+def load_credentials():
     creds = None
     if os.path.exists(TOKEN_PATH):
         with open(TOKEN_PATH, 'rb') as token:
@@ -22,10 +29,37 @@ def authenticate():
             creds = flow.run_local_server(port=0)
         with open(TOKEN_PATH, 'wb') as token:
             pickle.dump(creds, token)
-    return build('drive', 'v3', credentials=creds)
+    return creds
+
+def authenticate():
+    return build('drive', 'v3', credentials=load_credentials())
+
+def get_credentials():
+    """
+    Return the cached credentials, loading them on first use. Expired
+    credentials are refreshed in place instead of re-reading token.pickle.
+    """
+    global _creds
+    with _creds_lock:
+        if _creds is None:
+            _creds = load_credentials()
+        elif not _creds.valid and _creds.refresh_token:
+            _creds.refresh(Request())
+            with open(TOKEN_PATH, 'wb') as token:
+                pickle.dump(_creds, token)
+        return _creds
+
+def get_drive_service():
+    """Return this thread's cached Drive service."""
+    creds = get_credentials()
+    service = getattr(_local, 'service', None)
+    if service is None or getattr(_local, 'creds', None) is not creds:
+        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        _local.service, _local.creds = service, creds
+    return service
 
 def upload_to_gdrive(file_path, folder_id=None):
-    service = authenticate()
+    service = get_drive_service()
     if service is None:
         print("⚠️ Drive auth failed.")
         return
@@ -35,3 +69,4 @@ def upload_to_gdrive(file_path, folder_id=None):
     media = MediaFileUpload(file_path, resumable=True)
     file = service.files().create(media_body=media, body=metadata).execute()
     print(f"✔️ Uploaded {file_path} → Drive ID {file.get('id')}")
+    return file.get('id')
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from metrics import stage_timer
+
+IMAGE_WRITE_SECONDS = stage_timer("image_write")
+
+ENCODE_PARAMS = {
+    "jpg": lambda q: [cv2.IMWRITE_JPEG_QUALITY, q],
+    "webp": lambda q: [cv2.IMWRITE_WEBP_QUALITY, q],
+    "png": lambda q: [cv2.IMWRITE_PNG_COMPRESSION, 3],
+}
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: robust to re-encoding, noise and small shifts."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ImageStore:
+    """
+    Spool of detection images with collision-free names and a disk quota.
+
+    save() returns immediately; a writer thread encodes the images (format and
+    quality per kind, e.g. WebP full frames and JPEG crops), names each file
+    after the hash of its bytes and calls back with the paths. A full frame
+    whose perceptual hash is within dedup_distance bits of one saved for the
+    same key (e.g. the plate) in the last dedup_window seconds is not stored
+    again; the earlier paths are returned instead. When the directory exceeds
+    quota_mb, or files get older than max_age_days, the least recently used
+    files are deleted, except those for which pinned(path) is true (e.g.
+    images still waiting to be uploaded).
+    """
+
+    def __init__(self, directory, full_format="webp", full_quality=80, crop_format="jpg",
+                 crop_quality=95, quota_mb=2048, max_age_days=None, dedup_distance=6, dedup_window=300,
+                 pinned=None):
+        self.directory = directory
+        self.pinned = pinned
+        self.formats = {"full": (full_format, full_quality), "plate": (crop_format, crop_quality)}
+        self.quota = quota_mb * 1024 * 1024 if quota_mb else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.dedup_distance = dedup_distance
+        self.dedup_window = dedup_window
+        self.counters = {"saved": 0, "deduped": 0, "evicted": 0, "errors": 0, "queued": 0}
+        self._files = OrderedDict()  # path -> (size, mtime), least recently used first
+        self._bytes = 0
+        self._recent = {}  # key -> deque of (time, hash, paths)
+        self._last_full = (None, None, None)  # (frame, hash, path): plates of one frame share it
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)  # interrupted write
+            elif os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, path, st.st_size))
+        for mtime, path, size in sorted(entries):
+            self._files[path] = (size, mtime)
+            self._bytes += size
+
+    def save(self, full, crop, key=None, callback=None):
+        """
+        Queue one detection's full frame and crop. Returns a Future of
+        {"full": path, "plate": path, "duplicate": bool}; callback(result) is
+        called from the writer thread once the files are on disk.
+        """
+        with self._lock:
+            self.counters["queued"] += 1
+        future = self._pool.submit(self._save, full, crop, key)
+        if callback is not None:
+            def done(f):
+                if f.result() is not None:
+                    callback(f.result())
+            future.add_done_callback(done)
+        return future
+
+    def _save(self, full, crop, key):
+        try:
+            with IMAGE_WRITE_SECONDS.time():
+                return self._store(full, crop, key)
+        except Exception as e:
+            with self._lock:
+                self.counters["errors"] += 1
+            print(f"⚠️ Could not save detection images: {e}")
+            return None
+        finally:
+            with self._lock:
+                self.counters["queued"] -= 1
+
+    def _store(self, full, crop, key):
+        now = time.time()
+        last_frame, last_hash, last_path = self._last_full
+        same_frame = full is last_frame and last_path in self._files
+        fingerprint = last_hash if same_frame else dhash(full)
+        if key is not None and self.dedup_distance is not None:
+            duplicate = self._find_duplicate(key, fingerprint, now)
+            if duplicate is not None:
+                return dict(duplicate, duplicate=True)
+
+        full_path = last_path if same_frame else self._write("full", full)
+        self._last_full = (full, fingerprint, full_path)
+        paths = {"full": full_path, "plate": self._write("plate", crop)}
+        if key is not None:
+            with self._lock:
+                self._recent.setdefault(key, deque(maxlen=16)).append((now, fingerprint, paths))
+        self._evict(now, keep=set(paths.values()))
+        with self._lock:
+            self.counters["saved"] += 1
+        return dict(paths, duplicate=False)
+
+    def _find_duplicate(self, key, fingerprint, now):
+        with self._lock:
+            for seen, other, paths in reversed(self._recent.get(key, ())):
+                if now - seen > self.dedup_window:
+                    break
+                if hamming(fingerprint, other) <= self.dedup_distance and all(p in self._files for p in paths.values()):
+                    for p in paths.values():
+                        self._files.move_to_end(p)
+                    self.counters["deduped"] += 1
+                    return paths
+        return None
+
+    def _write(self, kind, image):
+        fmt, quality = self.formats[kind]
+        ok, buf = cv2.imencode("." + fmt, image, ENCODE_PARAMS.get(fmt, lambda q: [])(quality))
+        if not ok:
+            raise ValueError(f"could not encode {kind} image as {fmt}")
+        data = buf.tobytes()
+        name = f"{kind}_{hashlib.blake2b(data, digest_size=10).hexdigest()}.{fmt}"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            exists = path in self._files
+            if exists:
+                self._files.move_to_end(path)
+        if not exists:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock:
+                self._files[path] = (len(data), time.time())
+                self._bytes += len(data)
+        return path
+
+    def _evict(self, now, keep=()):
+        victims = []
+        with self._lock:
+            # Least recently used first: the quota stops at the first file it may
+            # keep, but a recently used file says nothing about the age of the
+            # ones behind it, so with max_age every file is checked
+            for path, (size, mtime) in list(self._files.items()):
+                if path in keep:
+                    continue
+                over_quota = self.quota is not None and self._bytes > self.quota
+                expired = self.max_age is not None and now - mtime > self.max_age
+                if not (over_quota or expired):
+                    if self.max_age is None:
+                        break
+                    continue
+                if self.pinned is not None and self.pinned(path):
+                    continue  # stays until it is no longer pinned
+                del self._files[path]
+                self._bytes -= size
+                victims.append(path)
+            self.counters["evicted"] += len(victims)
+        for path in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, files=len(self._files), bytes=self._bytes,
+                        quota=self.quota, directory=self.directory)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+
+class InferenceScheduler:
+    """
+    Collects frames from several pipelines into one model.predict() batch.
+
+    submit() queues a frame and returns a Future. A single worker thread takes
+    the first waiting frame, keeps collecting until max_batch frames are queued
+    or max_wait seconds have passed, runs one predict() over the batch and
+    resolves each Future with its own result. Since only this thread calls the
+    model, no other locking is needed around predict().
+    """
+
+    def __init__(self, model, max_batch=4, max_wait=0.02, **predict_kwargs):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs or {"conf": 0.5, "save": False}
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._by_size = defaultdict(lambda: {"batches": 0, "frames": 0, "total_ms": 0.0, "max_ms": 0.0})
+        self._wait_ms = 0.0
+        self._frames = 0
+        self._started_at = None
+
+    def start(self):
+        if self._thread is None:
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="inference")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._queue.put(None)
+
+    def submit(self, frame) -> Future:
+        future = Future()
+        self._queue.put((frame, future, time.monotonic()))
+        return future
+
+    def predict(self, frame, timeout=None):
+        """Blocking helper: submit one frame and wait for its result."""
+        return self.submit(frame).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop_event.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            frames = [item[0] for item in batch]
+            started = time.monotonic()
+            try:
+                results = self.model.predict(source=frames, **self.predict_kwargs)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed_ms = (time.monotonic() - started) * 1000
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self._record(len(batch), elapsed_ms, sum(started - queued for _, _, queued in batch) * 1000)
+        # fail anything still waiting so callers don't block forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def _record(self, size, elapsed_ms, wait_ms):
+        with self._lock:
+            entry = self._by_size[size]
+            entry["batches"] += 1
+            entry["frames"] += size
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            self._frames += size
+            self._wait_ms += wait_ms
+
+    def stats(self):
+        """Throughput overall and predict() latency per batch size."""
+        with self._lock:
+            uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+            by_size = {}
+            for size, entry in sorted(self._by_size.items()):
+                mean_ms = entry["total_ms"] / entry["batches"]
+                by_size[size] = {
+                    "batches": entry["batches"],
+                    "mean_ms": round(mean_ms, 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "ms_per_frame": round(mean_ms / size, 2),
+                    "frames_per_s": round(1000.0 * size / mean_ms, 2) if mean_ms else None,
+                }
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "frames": self._frames,
+                "throughput_fps": round(self._frames / uptime, 2) if uptime else 0.0,
+                "mean_queue_wait_ms": round(self._wait_ms / self._frames, 2) if self._frames else 0.0,
+                "queued": self._queue.qsize(),
+                "by_batch_size": by_size,
+            }
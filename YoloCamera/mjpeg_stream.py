@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+from frame_bus import FrameBus
+
+# One encoded frame, shared as-is by every subscriber. `chunk` is the complete
+# multipart part (boundary + headers + JPEG) ready to be written to a client.
+EncodedFrame = namedtuple("EncodedFrame", ["seq", "timestamp", "jpeg", "chunk"])
+
+
+class MjpegBroadcaster:
+    """
+    Encode-once MJPEG fan-out.
+
+    A single encoder thread takes the newest frame from the FrameBus, downscales
+    and JPEG-encodes it at most max_fps times per second, and wakes every
+    subscribed client. Clients always send the newest encoded frame and simply
+    skip any they missed, so a slow browser never builds a backlog.
+    """
+
+    def __init__(self, bus: FrameBus, quality: int = 80, max_width: int = 960, max_fps: float = 15.0):
+        self.bus = bus
+        self.quality = quality
+        self.max_width = max_width
+        self.max_fps = max_fps
+        self.frames_encoded = 0
+        self._latest = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="mjpeg-encoder")
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def _encode(self, frame) -> EncodedFrame:
+        img = frame.image
+        h, w = img.shape[:2]
+        if self.max_width and w > self.max_width:
+            scale = self.max_width / w
+            img = cv2.resize(img, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        jpeg = buffer.tobytes()
+        chunk = (b'--frame\r\n'
+                 b'Content-Type: image/jpeg\r\n'
+                 b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+        encoded = EncodedFrame(frame.seq, frame.timestamp, jpeg, chunk)
+        with self._lock:
+            if self._latest is None or encoded.seq > self._latest.seq:
+                self._latest = encoded
+            subscribers = list(self._subscribers)
+            self.frames_encoded += 1
+        for loop, event in subscribers:
+            loop.call_soon_threadsafe(event.set)
+        return encoded
+
+    def _run(self):
+        last_seq = 0
+        while not self._stop_event.is_set():
+            if not self._subscribers:
+                # Nobody is watching: don't spend CPU on encoding
+                self._wake.wait(0.5)
+                self._wake.clear()
+                continue
+            frame = self.bus.wait_newer(last_seq, timeout=1.0)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            started = time.monotonic()
+            self._encode(frame)
+            if self.max_fps:
+                remaining = 1.0 / self.max_fps - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    def snapshot(self):
+        """
+        Last encoded frame. If the encoder is idle (no stream clients) and the
+        cached frame is stale, the newest bus frame is encoded once and cached.
+        Returns None before the first frame is captured.
+        """
+        latest = self._latest
+        frame = self.bus.latest()
+        if frame is not None and (latest is None or latest.seq < frame.seq) and not self._subscribers:
+            latest = self._encode(frame)
+        return latest
+
+    async def stream(self):
+        """Async generator of multipart chunks for one client."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        subscriber = (loop, event)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        self._wake.set()
+        try:
+            last_seq = 0
+            if self._latest is not None:
+                event.set()
+            while True:
+                await event.wait()
+                event.clear()
+                latest = self._latest
+                if latest is None or latest.seq == last_seq:
+                    continue
+                last_seq = latest.seq
+                yield latest.chunk
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
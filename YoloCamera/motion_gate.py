@@ -0,0 +1,63 @@
+import time
+
+import cv2
+
+
+class MotionGate:
+    """
+    Cheap pre-filter that skips YOLO while the scene is not changing.
+
+    Each frame is downscaled to `width` pixels, converted to grayscale, blurred
+    and compared with a running-average background. Inference runs when more
+    than `min_area` of the pixels differ by over `pixel_threshold`, for `hold`
+    seconds after the last change, when the caller forces it (e.g. a plate is
+    still being tracked), and at least every `heartbeat` seconds regardless.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_area=0.01, heartbeat=2.0,
+                 hold=1.0, learning_rate=0.05):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.heartbeat = heartbeat
+        self.hold = hold
+        self.learning_rate = learning_rate
+        self.stats = {"frames": 0, "inferred": 0, "skipped": 0, "heartbeats": 0, "skip_ratio": 0.0}
+        self._background = None
+        self._last_motion = 0.0
+        self._last_inference = 0.0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        if w > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_fraction(self, frame):
+        """Fraction of (downscaled) pixels that differ from the background; updates it."""
+        gray = self._small_gray(frame)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype("float32")
+            return 1.0
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) / float(mask.size)
+
+    def should_infer(self, frame, timestamp=None, force=False):
+        timestamp = timestamp or time.time()
+        self.stats["frames"] += 1
+        if self.changed_fraction(frame) >= self.min_area:
+            self._last_motion = timestamp
+        heartbeat = timestamp - self._last_inference >= self.heartbeat
+        infer = force or heartbeat or timestamp - self._last_motion <= self.hold
+        if infer:
+            self._last_inference = timestamp
+            self.stats["inferred"] += 1
+            if heartbeat and timestamp - self._last_motion > self.hold and not force:
+                self.stats["heartbeats"] += 1
+        else:
+            self.stats["skipped"] += 1
+        self.stats["skip_ratio"] = round(self.stats["skipped"] / self.stats["frames"], 3)
+        return infer
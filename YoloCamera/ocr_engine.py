@@ -0,0 +1,249 @@
+import ctypes
+import ctypes.util
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import stage_timer
+
+# ——— CONFIG ———
+TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+TESSDATA_PATH = r"C:\Program Files\Tesseract-OCR\tessdata"
+TESSERACT_LIB = None  # libtesseract to load; None looks next to TESSERACT_CMD, then on the library path
+OCR_LANG = "eng"
+OCR_WORKERS = 2
+OCR_PSM = 8  # treat the plate as a single word
+
+# optional in-process Tesseract API bindings, imported on first use (see _load_tesserocr)
+tesserocr = None
+# libtesseract's C API through ctypes, loaded on first use (see _load_capi)
+_capi = None
+
+OCR_SECONDS = stage_timer("ocr")
+
+
+def _load_tesserocr():
+    global tesserocr
+    if tesserocr is None:
+        try:
+            import tesserocr as module
+        except ImportError:
+            return None
+        tesserocr = module
+    return tesserocr
+
+
+def _find_libtesseract(tesseract_cmd=TESSERACT_CMD):
+    if TESSERACT_LIB:
+        return TESSERACT_LIB
+    # the Windows installer ships the library beside tesseract.exe (libtesseract-5.dll)
+    if tesseract_cmd:
+        found = sorted(glob.glob(os.path.join(os.path.dirname(tesseract_cmd), "libtesseract*.dll")))
+        if found:
+            return found[-1]
+    return ctypes.util.find_library("tesseract")
+
+
+def _load_capi(tesseract_cmd=TESSERACT_CMD):
+    global _capi
+    if _capi is None:
+        path = _find_libtesseract(tesseract_cmd)
+        if not path:
+            return None
+        try:
+            lib = ctypes.CDLL(path)
+        except OSError as e:
+            print(f"⚠️ Could not load {path}: {e}")
+            return None
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit3.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPIInit3.restype = ctypes.c_int
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p  # freed with TessDeleteText
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+        _capi = lib
+    return _capi
+
+
+class _CapiTesseract:
+    """
+    One Tesseract instance driven through libtesseract's C API, with the
+    methods of tesserocr.PyTessBaseAPI that OcrEngine uses. ctypes releases
+    the GIL during each call, so instances on different threads run in
+    parallel.
+    """
+
+    def __init__(self, lib, psm, path=None, lang=OCR_LANG):
+        self._lib = lib
+        self._handle = lib.TessBaseAPICreate()
+        datapath = path.encode() if path else None
+        if lib.TessBaseAPIInit3(self._handle, datapath, lang.encode()) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            raise RuntimeError(f"Tesseract could not load '{lang}' from {path or 'its default tessdata'}")
+        lib.TessBaseAPISetPageSegMode(self._handle, psm)
+
+    def SetImageBytes(self, imagedata, width, height, bytes_per_pixel, bytes_per_line):
+        self._lib.TessBaseAPISetImage(self._handle, imagedata, width, height,
+                                      bytes_per_pixel, bytes_per_line)
+
+    def GetUTF8Text(self):
+        ptr = self._lib.TessBaseAPIGetUTF8Text(self._handle)
+        if not ptr:
+            return ""
+        try:
+            return ctypes.string_at(ptr).decode("utf-8", "replace")
+        finally:
+            self._lib.TessDeleteText(ptr)
+
+    def End(self):
+        if self._handle:
+            self._lib.TessBaseAPIEnd(self._handle)
+            self._lib.TessBaseAPIDelete(self._handle)
+            self._handle = None
+
+
+class OcrEngine:
+    """
+    Pool of long-lived OCR workers that read plate ROIs straight from memory.
+
+    Every worker thread keeps its own Tesseract API instance alive and feeds
+    it the raw pixel buffer (the calls release the GIL, so workers run in
+    parallel). The instance comes from the optional `tesserocr` bindings or,
+    where they are not installed (e.g. Windows), from the libtesseract
+    library that ships with Tesseract, loaded through ctypes. Only if neither
+    is available does the engine fall back to pytesseract, which starts one
+    tesseract process per call.
+
+    submit() returns a Future so OCR can run while the caller moves on, e.g.
+    to YOLO on the next frame.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, psm=OCR_PSM, backend="auto",
+                 tesseract_cmd=TESSERACT_CMD, tessdata_path=TESSDATA_PATH):
+        if backend == "auto":
+            if _load_tesserocr() is not None:
+                backend = "tesserocr"
+            elif _load_capi(tesseract_cmd) is not None:
+                backend = "capi"
+            else:
+                backend = "pytesseract"
+        elif backend == "tesserocr":
+            _load_tesserocr()
+        elif backend == "capi" and _load_capi(tesseract_cmd) is None:
+            raise RuntimeError("libtesseract not found (set TESSERACT_LIB in ocr_engine.py)")
+        self.backend = backend
+        self.psm = psm
+        self.tessdata_path = tessdata_path
+        self.calls = 0
+        self.pending = 0
+        self.total_ms = 0.0
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+        if backend == "pytesseract":
+            print("⚠️ Neither tesserocr nor libtesseract was found: OCR falls back to pytesseract, "
+                  "which starts one tesseract process per plate (check TESSERACT_CMD / TESSERACT_LIB)")
+            import pytesseract
+            if tesseract_cmd and os.path.exists(tesseract_cmd):
+                pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+            self._pytesseract = pytesseract
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        self.workers = workers
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            path = self.tessdata_path if self.tessdata_path and os.path.isdir(self.tessdata_path) else None
+            if self.backend == "capi":
+                api = _CapiTesseract(_capi, self.psm, path=path)
+            else:
+                kwargs = {"psm": tesserocr.PSM(self.psm)}
+                if path:
+                    kwargs["path"] = path
+                api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def _read(self, image):
+        started = time.perf_counter()
+        if self.backend in ("tesserocr", "capi"):
+            img = np.ascontiguousarray(image)
+            height, width = img.shape[:2]
+            channels = 1 if img.ndim == 2 else img.shape[2]
+            api = self._api()
+            api.SetImageBytes(img.tobytes(), width, height, channels, width * channels)
+            text = api.GetUTF8Text()
+        else:
+            text = self._pytesseract.image_to_string(image, config=f'--psm {self.psm}')
+        elapsed = time.perf_counter() - started
+        OCR_SECONDS.observe(elapsed)
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed * 1000
+        return text
+
+    def _run(self, image):
+        try:
+            return self._read(image)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def submit(self, image):
+        """Queue one preprocessed ROI; the Future resolves to the raw OCR text."""
+        with self._lock:
+            self.pending += 1
+        return self._pool.submit(self._run, image)
+
+    def read(self, image):
+        """Drop-in for pytesseract.image_to_string(image, config='--psm 8')."""
+        return self.submit(image).result()
+
+    def read_many(self, images):
+        """OCR several ROIs concurrently; results are in input order."""
+        return [f.result() for f in [self.submit(img) for img in images]]
+
+    def warm_up(self, shape=(40, 160)):
+        """
+        Read a blank image on every worker, so that loading Tesseract (or
+        starting its process) is not paid for by the first plate.
+        """
+        self.read_many([np.full(shape, 255, np.uint8)] * self.workers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "workers": self.workers,
+                "calls": self.calls,
+                "pending": self.pending,
+                "mean_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        for api in self._apis:
+            api.End()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Process-wide OcrEngine shared by every caller."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OcrEngine()
+        return _engine
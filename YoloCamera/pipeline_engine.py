@@ -0,0 +1,213 @@
+import queue
+import threading
+import time
+
+from metrics import stage_timer
+
+_END = object()  # end-of-stream marker passed down the stages
+
+
+class Stage:
+    """
+    One step of a PipelineEngine. fn(job) returns the job for the next stage
+    (usually the same object, updated), or None to drop it. With workers > 1
+    jobs are processed concurrently and may leave the stage out of order.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=2):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.stats = {"processed": 0, "dropped": 0, "errors": 0, "busy_ms": 0.0}
+        self._timer = stage_timer(name)
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        started = time.perf_counter()
+        try:
+            result = self.fn(job)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠️ Stage '{self.name}' failed: {e}")
+            result = None
+        elapsed = time.perf_counter() - started
+        self._timer.observe(elapsed)
+        with self._lock:
+            self.stats["processed"] += 1
+            self.stats["busy_ms"] += elapsed * 1000
+            if result is None:
+                self.stats["dropped"] += 1
+        return result
+
+
+class PipelineEngine:
+    """
+    Runs jobs (e.g. camera frames) through a chain of stages.
+
+    mode="parallel": every stage has its own worker thread(s) and a bounded
+    input queue, so while OCR reads frame N, YOLO is already running on frame
+    N+1. mode="serial": one thread runs all stages for a job before taking the
+    next, like the original detection loops.
+
+    Jobs come from `source` (any iterable, read on its own thread) and/or
+    submit(). With live=True a full input queue drops its oldest job instead
+    of blocking, so a slow pipeline always works on recent frames; with
+    live=False (files, batch jobs) nothing is dropped. Output of the last
+    stage goes to on_result(job), or to results() when no callback is given.
+    """
+
+    def __init__(self, stages, source=None, mode="parallel", live=True, on_result=None, result_queue_size=4):
+        if mode not in ("parallel", "serial"):
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        self.stages = list(stages)
+        self.source = source
+        self.mode = mode
+        self.live = live
+        self.on_result = on_result
+        self.counters = {"submitted": 0, "dropped": 0, "completed": 0}
+        self._results = queue.Queue(maxsize=result_queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._done = threading.Event()
+
+        # serial mode is one stage that runs the others back to back
+        groups = [[s] for s in self.stages] if mode == "parallel" else [self.stages]
+        self._queues = [queue.Queue(maxsize=max(1, g[0].queue_size)) for g in groups]
+        self._groups = groups
+
+    def start(self):
+        for i, group in enumerate(self._groups):
+            workers = group[0].workers if len(group) == 1 else 1
+            alive = [workers]
+            for n in range(workers):
+                name = group[0].name if len(group) == 1 else "serial"
+                t = threading.Thread(target=self._work, args=(i, group, alive), daemon=True,
+                                     name=f"stage-{name}-{n}")
+                t.start()
+                self._threads.append(t)
+        if self.source is not None:
+            t = threading.Thread(target=self._feed, daemon=True, name="stage-source")
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def _put(self, q, job, drop_oldest):
+        """
+        Put job on q. With drop_oldest a full queue loses its oldest job instead
+        of blocking; returns False when that happened (or when stopping).
+        """
+        if drop_oldest:
+            dropped = False
+            while True:
+                try:
+                    q.put_nowait(job)
+                    return not dropped
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                        dropped = True
+                    except queue.Empty:
+                        pass
+        while not self._stopping.is_set():
+            try:
+                q.put(job, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def submit(self, job):
+        """Queue one job for the first stage; returns False if a job was dropped."""
+        with self._lock:
+            self.counters["submitted"] += 1
+        ok = self._put(self._queues[0], job, self.live)
+        if not ok:
+            with self._lock:
+                self.counters["dropped"] += 1
+        return ok
+
+    def _feed(self):
+        try:
+            for job in self.source:
+                if self._stopping.is_set():
+                    break
+                self.submit(job)
+        except Exception as e:
+            print(f"⚠️ Pipeline source failed: {e}")
+        self.finish()
+
+    def finish(self):
+        """No more jobs: let the queued ones drain, then end results()."""
+        self._put(self._queues[0], _END, False)
+
+    def _work(self, index, group, alive):
+        q = self._queues[index]
+        while not self._stopping.is_set():
+            try:
+                job = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if job is _END:
+                with self._lock:
+                    alive[0] -= 1
+                    last = alive[0] == 0
+                if not last:
+                    q.put(_END)  # let sibling workers see it too
+                elif index + 1 < len(self._queues):
+                    self._put(self._queues[index + 1], _END, False)
+                else:
+                    self._done.set()
+                    if self.on_result is None:
+                        self._put(self._results, _END, False)
+                return
+            for stage in group:
+                job = stage(job)
+                if job is None:
+                    break
+            if job is None:
+                continue
+            if index + 1 < len(self._queues):
+                self._put(self._queues[index + 1], job, False)
+            else:
+                self._emit(job)
+
+    def _emit(self, job):
+        with self._lock:
+            self.counters["completed"] += 1
+        if self.on_result is not None:
+            try:
+                self.on_result(job)
+            except Exception as e:
+                print(f"⚠️ Pipeline result handler failed: {e}")
+        else:
+            self._put(self._results, job, self.live)
+
+    def results(self, timeout=None):
+        """Yield finished jobs until the source ends (or timeout passes without one)."""
+        while not self._stopping.is_set():
+            try:
+                job = self._results.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if job is _END:
+                return
+            yield job
+
+    def join(self, timeout=None):
+        """Wait until every job from a finite source has gone through all stages."""
+        return self._done.wait(timeout)
+
+    def stop(self, timeout=2.0):
+        self._stopping.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, mode=self.mode, stages={
+            s.name: dict(s.stats, workers=s.workers, busy_ms=round(s.stats["busy_ms"], 1)) for s in self.stages
+        }, queued=[q.qsize() for q in self._queues])
@@ -0,0 +1,348 @@
+import csv
+import difflib
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+
+# Characters Tesseract commonly mistakes for each other on bin plates. A
+# substitution inside one group is cheap; any other substitution costs as much
+# as deleting one character and inserting another. Groups are disjoint so the
+# distance stays a metric.
+CONFUSION_GROUPS = ["0ODQ", "1IL", "8B", "5S", "2Z", "6G"]
+
+EDIT_COST = 10  # insertion or deletion
+SUBSTITUTION_COST = 2 * EDIT_COST
+CONFUSION_COST = 3
+
+_CANONICAL = {ch: group[0] for group in CONFUSION_GROUPS for ch in group}
+
+
+def normalize(text: str) -> str:
+    """Uppercase and drop everything that is not a letter or digit (spaces included)."""
+    return ''.join(ch for ch in text.upper() if ch.isalnum())
+
+
+def canonical(text: str) -> str:
+    """Collapse every confusion group to one representative character."""
+    return ''.join(_CANONICAL.get(ch, ch) for ch in text)
+
+
+def _sub_cost(a, b):
+    if a == b:
+        return 0
+    if _CANONICAL.get(a, a) == _CANONICAL.get(b, b):
+        return CONFUSION_COST
+    return SUBSTITUTION_COST
+
+
+def ocr_distance(a: str, b: str) -> int:
+    """Weighted Levenshtein distance between two normalized strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(0, (len(b) + 1) * EDIT_COST, EDIT_COST))
+    for i, ca in enumerate(a, 1):
+        current = [i * EDIT_COST]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + EDIT_COST,
+                current[j - 1] + EDIT_COST,
+                previous[j - 1] + _sub_cost(ca, cb),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    0–1 similarity of two normalized strings on the scale of difflib's ratio():
+    with confusable substitutions counted as mismatches, 1 - distance / (EDIT_COST
+    * total length) is exactly 2 * matching characters / total length, so
+    MATCH_THRESHOLD means what it meant with difflib.
+    """
+    total = len(a) + len(b)
+    if total == 0:
+        return 0.0
+    return max(0.0, 1.0 - ocr_distance(a, b) / (EDIT_COST * total))
+
+
+def _bigrams(canon):
+    padded = f"^{canon}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class PlateIndex:
+    """
+    Immutable fuzzy index over known plates.
+
+    Candidates are generated from an inverted index of bigrams over the
+    confusion-canonical form of each plate (so "8AM 9Z67" still shares every
+    bigram with "BAM 9267"), then the best few are re-ranked with the
+    OCR-aware weighted edit distance. Lookups touch a handful of posting lists
+    instead of scanning every plate.
+    """
+
+    def __init__(self, plates, max_candidates=64, cache_size=4096):
+        self.plates = list(dict.fromkeys(plates))
+        self.max_candidates = max_candidates
+        # OCR keeps producing the same few strings for a bin in view; the
+        # index never changes, so their top match can be remembered
+        self.cache_size = cache_size
+        self._cache = {}
+        self._normalized = [normalize(p) for p in self.plates]
+        self._normalized_set = set(self._normalized)
+        self._exact = defaultdict(list)
+        self._postings = defaultdict(list)
+        for i, norm in enumerate(self._normalized):
+            canon = canonical(norm)
+            self._exact[canon].append(i)
+            for gram in _bigrams(canon):
+                self._postings[gram].append(i)
+
+    def __len__(self):
+        return len(self.plates)
+
+    def __contains__(self, plate):
+        return normalize(plate) in self._normalized_set
+
+    def search(self, text: str, k: int = 5):
+        """Top-k (plate, similarity) pairs for an OCR reading, best first."""
+        query = normalize(text)
+        if not query or not self.plates:
+            return []
+        canon = canonical(query)
+        candidates = set(self._exact.get(canon, ()))
+        grams = _bigrams(canon)
+        counts = Counter(chain.from_iterable(self._postings.get(g, ()) for g in grams))
+        limit = max(self.max_candidates, k * 8)
+        candidates.update(i for i, _ in heapq.nlargest(limit, counts.items(), key=lambda item: item[1]))
+        scored = [(similarity(query, self._normalized[i]), i) for i in candidates]
+        if not scored:
+            return []
+        # Ties on the OCR-aware distance are common between similar plates;
+        # break them with difflib on the raw text, which also sees spacing.
+        cutoff = heapq.nlargest(k, scored)[-1][0]
+        raw = text.upper().strip()
+        ranked = heapq.nlargest(k, (
+            (score, difflib.SequenceMatcher(None, raw, self.plates[i]).ratio(), i)
+            for score, i in scored if score >= cutoff
+        ))
+        return [(self.plates[i], score) for score, _, i in ranked]
+
+    def best(self, text: str, threshold: float):
+        """(plate, similarity) of the best match, or (None, similarity) below threshold."""
+        results = self._cache.get(text)
+        if results is None:
+            results = self.search(text, k=1)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[text] = results
+        if not results:
+            return None, 0.0
+        plate, score = results[0]
+        if score >= threshold:
+            return plate, score
+        return None, score
+
+    def best_many(self, texts, threshold: float):
+        """best() for several readings (e.g. all plates of one frame), in order."""
+        return [self.best(text, threshold) for text in texts]
+
+
+def load_plates(source):
+    """
+    Load plate strings from:
+      - "supabase"        -> bin_plate column of the bins table
+      - *.json            -> list of plates, or {"plates": [...]}
+      - *.csv             -> column "bin_plate" (or "plate"), else the first column
+      - any other file    -> one plate per line
+    """
+    if source == "supabase":
+        import requests
+        from cameraDb import SUPABASE_URL, HEADERS
+        res = requests.get(f"{SUPABASE_URL}/rest/v1/bins", params={"select": "bin_plate"},
+                           headers=HEADERS, timeout=10)
+        res.raise_for_status()
+        return [row["bin_plate"] for row in res.json() if row.get("bin_plate")]
+    if source.endswith(".json"):
+        with open(source) as f:
+            data = json.load(f)
+        return data["plates"] if isinstance(data, dict) else data
+    if source.endswith(".csv"):
+        with open(source, newline='') as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return []
+        header = [h.strip().lower() for h in rows[0]]
+        for column in ("bin_plate", "plate"):
+            if column in header:
+                col = header.index(column)
+                return [r[col].strip() for r in rows[1:] if len(r) > col and r[col].strip()]
+        return [r[0].strip() for r in rows if r and r[0].strip()]
+    with open(source) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_schedule_plates(schedule_id, truck_id=None):
+    """Plates of the bins assigned to a schedule (and truck) in the truck_assignments table."""
+    import requests
+    from cameraDb import SUPABASE_URL, HEADERS
+    params = {"select": "bins(bin_plate)", "schedule_id": f"eq.{schedule_id}"}
+    if truck_id is not None:
+        params["truck_id"] = f"eq.{truck_id}"
+    res = requests.get(f"{SUPABASE_URL}/rest/v1/truck_assignments", params=params,
+                       headers=HEADERS, timeout=10)
+    res.raise_for_status()
+    return [row["bins"]["bin_plate"] for row in res.json()
+            if (row.get("bins") or {}).get("bin_plate")]
+
+
+class LivePlateIndex:
+    """
+    Holds the current PlateIndex and rebuilds it in the background.
+
+    The source (see load_plates) is re-read every refresh_interval seconds or on
+    reload(); a new index is built off the hot path and swapped in atomically,
+    so new bins become matchable without restarting the server. When source is
+    None, or loading fails before any successful load, fallback_plates are used.
+    """
+
+    def __init__(self, source=None, fallback_plates=(), refresh_interval=300):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.index = PlateIndex(fallback_plates)
+        self.loaded_at = None
+        self.last_error = None
+        self._fingerprint = None
+        self._reload_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.source and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="plate-index")
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._reload_event.set()
+
+    def reload(self):
+        """Ask the background thread to rebuild the index now."""
+        self._reload_event.set()
+
+    def _fingerprint_of(self, plates):
+        if self.source != "supabase" and os.path.exists(self.source):
+            return os.path.getmtime(self.source), len(plates)
+        return hash(tuple(plates))
+
+    def refresh(self):
+        """Re-read the source and swap in a new index if it changed."""
+        started = time.perf_counter()
+        try:
+            plates = load_plates(self.source)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Could not load plates from {self.source}: {e}")
+            return False
+        fingerprint = self._fingerprint_of(plates)
+        if fingerprint == self._fingerprint:
+            return False
+        self.index = PlateIndex(plates)
+        self._fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self.last_error = None
+        print(f"[INFO] Plate index rebuilt: {len(plates)} plates in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._reload_event.wait(self.refresh_interval)
+            self._reload_event.clear()
+
+    def best(self, text, threshold):
+        return self.index.best(text, threshold)
+
+    def best_many(self, texts, threshold):
+        return self.index.best_many(texts, threshold)
+
+    def search(self, text, k=5):
+        return self.index.search(text, k)
+
+    def status(self):
+        return {
+            "source": self.source or "built-in",
+            "plates": len(self.index),
+            "loaded_at": self.loaded_at,
+            "error": self.last_error,
+        }
+
+
+class ScheduleMatcher:
+    """
+    Plate matching for one camera that knows the truck's active schedule.
+
+    set_schedule() builds a small PlateIndex over the bins of the schedule
+    once. Readings are matched against it first; only a reading that matches
+    none of them is looked up in the global index, with the stricter
+    fallback_threshold (a bin that is not on the route is unlikely, so it
+    needs a near-certain reading). Without a schedule, or once it is older
+    than ttl seconds, every reading goes to the global index at `threshold`.
+    """
+
+    def __init__(self, global_index, threshold, fallback_threshold=None, ttl=None):
+        self.global_index = global_index
+        self.threshold = threshold
+        self.fallback_threshold = threshold if fallback_threshold is None else fallback_threshold
+        self.ttl = ttl
+        self.stats = {"schedule": 0, "global": 0, "none": 0}
+        self._active = None  # (PlateIndex, info), swapped atomically
+
+    def set_schedule(self, plates, schedule_id=None, route_id=None):
+        index = PlateIndex(plates)
+        info = {"schedule_id": schedule_id, "route_id": route_id,
+                "plates": len(index), "since": time.time()}
+        self._active = (index, info)
+        return self.status()
+
+    def clear(self):
+        self._active = None
+
+    def _schedule(self):
+        active = self._active
+        if active is not None and self.ttl and time.time() - active[1]["since"] > self.ttl:
+            self._active = active = None
+        return active
+
+    def best_many(self, texts):
+        """(plate, similarity) per reading, like PlateIndex.best_many()."""
+        active = self._schedule()
+        if active is None:
+            results = self.global_index.best_many(texts, self.threshold)
+            for plate, _ in results:
+                self.stats["global" if plate else "none"] += 1
+            return results
+        results = []
+        for text, (plate, score) in zip(texts, active[0].best_many(texts, self.threshold)):
+            if plate:
+                self.stats["schedule"] += 1
+            else:
+                plate, fallback = self.global_index.best(text, self.fallback_threshold)
+                self.stats["global" if plate else "none"] += 1
+                score = fallback if plate else max(score, fallback)
+            results.append((plate, score))
+        return results
+
+    def status(self):
+        active = self._schedule()
+        return {
+            "active": active is not None,
+            **(active[1] if active else {}),
+            "threshold": self.threshold,
+            "fallback_threshold": self.fallback_threshold if active else self.threshold,
+            "matches": dict(self.stats),
+        }
@@ -0,0 +1,228 @@
+"""
+Plate detection stages shared by camera_server.py, the detection scripts and
+bench_pipeline.py.
+
+The image helpers (crop_borders, rotate_180, preprocess_image, clean_text)
+work on single images; RoiPreprocessor fuses the first three. The job stages
+work on a job dict as it moves through a PipelineEngine:
+
+    {"frame": ndarray, "timestamp": float, "plates": [
+        {"box": (x1, y1, x2, y2), "conf": float, "roi": ndarray, "prep": ndarray,
+         "orientations": [...], "orientation": str,
+         "text": str, "match": str or None, "ratio": float}, ...]}
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from pipeline_engine import PipelineEngine, Stage
+
+
+def preprocess_image(img):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return cv2.GaussianBlur(th, (5, 5), 0)
+
+def rotate_180(img):
+    return cv2.rotate(img, cv2.ROTATE_180)
+
+def crop_borders(img):
+    g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, th = cv2.threshold(g, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    cnts, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if cnts:
+        c = max(cnts, key=cv2.contourArea)
+        x, y, w, h = cv2.boundingRect(c)
+        return img[y:y+h, x:x+w]
+    return img
+
+def clean_text(s):
+    return ''.join(ch for ch in s if ch.isalnum() or ch.isspace()).strip()
+
+# Plates are usually upside down (rotated) in our camera mounts, but not always
+ORIENTATIONS = ("rotated", "upright")
+
+def orient(img, orientation):
+    """View of img in the given orientation; "rotated" is rotate_180 without the copy."""
+    return img[::-1, ::-1] if orientation == "rotated" else img
+
+
+class RoiPreprocessor:
+    """
+    crop_borders + preprocess_image in one pass over a plate ROI.
+
+    Grayscale and the Otsu threshold are computed once, into buffers that are
+    reused from frame to frame; the border crop is a view of the ROI and of
+    the thresholded image, and only the blurred OCR input is a new array (it
+    may still be in the OCR queue when the next frame arrives). Orientation is
+    left to the caller: orient() gives a rotated view for free. One instance
+    per thread.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _buffer(self, name, h, w):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape[0] < h or buf.shape[1] < w:
+            old = buf.shape if buf is not None else (0, 0)
+            buf = self._buffers[name] = np.empty((max(h, old[0]), max(w, old[1])), np.uint8)
+        return buf[:h, :w]
+
+    def __call__(self, roi):
+        """Returns (cropped ROI view, upright OCR-ready binary image)."""
+        h, w = roi.shape[:2]
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", h, w))
+        _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=self._buffer("th", h, w))
+        cnts, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if cnts:
+            x, y, cw, ch = cv2.boundingRect(max(cnts, key=cv2.contourArea))
+            roi, th = roi[y:y+ch, x:x+cw], th[y:y+ch, x:x+cw]
+        return roi, cv2.GaussianBlur(th, (5, 5), 0)
+
+
+class OrientationRanker:
+    """
+    Order in which to try plate orientations: the one that produced matches
+    most recently first (exponentially decayed counts), so mixed mounts cost
+    a second OCR only when the first guess fails.
+    """
+
+    def __init__(self, orientations=ORIENTATIONS, decay=0.9):
+        self.decay = decay
+        # a slight head start keeps the historical default (rotated) first
+        self.scores = {o: 0.01 * (len(orientations) - i) for i, o in enumerate(orientations)}
+        self.stats = {o: 0 for o in orientations}
+
+    def order(self):
+        return sorted(self.scores, key=self.scores.get, reverse=True)
+
+    def record(self, orientation):
+        for o in self.scores:
+            self.scores[o] *= self.decay
+        self.scores[orientation] += 1.0 - self.decay
+        self.stats[orientation] += 1
+
+
+def read_best(ocr, prep, get_nearest_plate, orientations=ORIENTATIONS):
+    """
+    OCR prep in each orientation until one matches a known plate. Returns
+    (text, match, ratio, orientation) of the match, or of the best reading.
+    """
+    best = None
+    for orientation in orientations:
+        text = clean_text(ocr.read(np.ascontiguousarray(orient(prep, orientation))))
+        matched, ratio = get_nearest_plate(text)
+        if best is None or ratio > best[2]:
+            best = (text, matched, ratio, orientation)
+        if matched:
+            break
+    return best
+
+_preprocessors = threading.local()
+
+def prepare_roi(frame, box):
+    """Crop one YOLO box out of the frame; returns (roi view, upright OCR-ready image)."""
+    pre = getattr(_preprocessors, "pre", None)
+    if pre is None:
+        pre = _preprocessors.pre = RoiPreprocessor()
+    x1, y1, x2, y2 = box
+    return pre(frame[y1:y2, x1:x2])
+
+
+# ——— job stages ———
+
+def new_job(frame, **extra):
+    return dict(extra, frame=frame, timestamp=time.time(), plates=[])
+
+def camera_frames(cap):
+    """Source of jobs from a cv2.VideoCapture; stops when a read fails."""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Failed to read frame")
+            return
+        yield new_job(frame)
+
+def detect(model, conf=0.5, max_boxes=None):
+    """YOLO stage: fills job["plates"] with the boxes (first max_boxes of them)."""
+    def stage(job):
+        res = model.predict(source=job["frame"], conf=conf, save=False, verbose=False)[0]
+        if res.boxes:
+            boxes = res.boxes.xyxy.cpu().numpy()[:max_boxes]
+            confs = res.boxes.conf.cpu().numpy()[:max_boxes]
+            job["plates"] = [{"box": tuple(map(int, b)), "conf": float(c)} for b, c in zip(boxes, confs)]
+        return job
+    return stage
+
+def prepare(job):
+    """ROI stage: crop and binarize every detected plate (fused, see RoiPreprocessor)."""
+    for plate in job["plates"]:
+        plate["roi"], plate["prep"] = prepare_roi(job["frame"], plate["box"])
+    return job
+
+def read_text(ocr, ranker=None):
+    """OCR stage: reads all plates of a job concurrently, in the most likely orientation."""
+    ranker = ranker or OrientationRanker()
+    def stage(job):
+        order = ranker.order()
+        texts = ocr.read_many([np.ascontiguousarray(orient(plate["prep"], order[0])) for plate in job["plates"]])
+        for plate, raw in zip(job["plates"], texts):
+            plate["orientations"], plate["orientation"] = order, order[0]
+            plate["text"] = clean_text(raw)
+            plate["roi"] = orient(plate["roi"], order[0])
+        return job
+    stage.ranker = ranker
+    return stage
+
+def match(get_nearest_plate, ocr=None, ranker=None):
+    """
+    Match stage: nearest known plate (or None) and its similarity ratio. With
+    ocr, a plate that matches nothing is read again in its other orientations.
+    """
+    def stage(job):
+        for plate in job["plates"]:
+            plate["match"], plate["ratio"] = get_nearest_plate(plate["text"])
+            if not plate["match"] and ocr is not None and len(plate["orientations"]) > 1:
+                text, matched, ratio, orientation = read_best(
+                    ocr, plate["prep"], get_nearest_plate, plate["orientations"][1:])
+                if ratio > plate["ratio"]:
+                    # orient() is its own inverse: undo the first guess, apply the new one
+                    upright = orient(plate["roi"], plate["orientations"][0])
+                    plate.update(text=text, match=matched, ratio=ratio, orientation=orientation,
+                                 roi=orient(upright, orientation))
+            if plate["match"] and ranker is not None:
+                ranker.record(plate["orientation"])
+        return job
+    return stage
+
+def annotate(job):
+    """Draw boxes (and matched plates) onto the frame for display."""
+    for plate in job["plates"]:
+        x1, y1, x2, y2 = plate["box"]
+        cv2.rectangle(job["frame"], (x1, y1), (x2, y2), (0, 255, 0), 2)
+        if plate.get("match"):
+            cv2.putText(job["frame"], f"{plate['match']} ({plate['ratio']:.2f})", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    return job
+
+def plate_pipeline(model, ocr, get_nearest_plate=None, sink=None, source=None, conf=0.5,
+                   max_boxes=None, mode="parallel", live=True, on_result=None):
+    """
+    PipelineEngine of YOLO -> ROI prep -> OCR -> match (if get_nearest_plate
+    is given) -> sink (if given). sink(job) runs on its own worker so slow
+    saving/uploading never holds up detection.
+    """
+    ranker = OrientationRanker()
+    stages = [
+        Stage("inference", detect(model, conf, max_boxes)),
+        Stage("roi", prepare),
+        Stage("ocr", read_text(ocr, ranker)),
+    ]
+    if get_nearest_plate is not None:
+        stages.append(Stage("match", match(get_nearest_plate, ocr, ranker)))
+    if sink is not None:
+        stages.append(Stage("sink", sink, queue_size=8))
+    return PipelineEngine(stages, source=source, mode=mode, live=live, on_result=on_result)
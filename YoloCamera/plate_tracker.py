@@ -0,0 +1,138 @@
+import itertools
+import time
+from collections import defaultdict
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    """One bin plate followed across frames, with its accumulated OCR votes."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box, conf, timestamp):
+        self.id = next(self._ids)
+        self.box = box
+        self.conf = conf
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.ocr_attempts = 0
+        self.last_ocr = 0.0
+        self.votes = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.readings = []
+        self.best = None  # (ratio, reading) of the best supporting reading
+        self.emitted = False
+
+    def add_reading(self, plate, ratio, ocr_text, **extra):
+        """Record one OCR attempt; plate is None when nothing matched."""
+        self.readings.append(ocr_text)
+        if plate is None:
+            return
+        self.votes[plate] += ratio
+        self.counts[plate] += 1
+        if self.best is None or ratio > self.best[0]:
+            self.best = (ratio, dict(extra, plate=plate, ocr=ocr_text, ratio=ratio))
+
+    def winner(self):
+        """(plate, mean ratio, supporting readings) of the leading plate, or None."""
+        if not self.votes:
+            return None
+        plate = max(self.votes, key=self.votes.get)
+        return plate, self.votes[plate] / self.counts[plate], self.counts[plate]
+
+
+class PlateTracker:
+    """
+    IoU tracker for plate boxes that limits OCR to a few readings per track.
+
+    Each frame's boxes are greedily matched to live tracks by IoU. OCR runs on
+    a track at most max_ocr times and no more often than every ocr_interval
+    seconds; readings vote for a known plate. A track produces exactly one
+    detection event: as soon as confirm_votes readings agree, or when it ends
+    (unseen for max_age seconds) with at least one matching reading.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=1.0, max_ocr=5, ocr_interval=0.2, confirm_votes=2):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.max_ocr = max_ocr
+        self.ocr_interval = ocr_interval
+        self.confirm_votes = confirm_votes
+        self.tracks = []
+        self.stats = {"tracks": 0, "ocr_calls": 0, "ocr_skipped": 0, "events": 0}
+
+    def update(self, boxes, confs=None, timestamp=None):
+        """
+        Associate this frame's boxes with tracks. Returns the track for each
+        box (new tracks are created for unmatched boxes).
+        """
+        timestamp = timestamp or time.time()
+        confs = confs if confs is not None else [0.0] * len(boxes)
+        pairs = sorted(
+            ((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+            reverse=True,
+        )
+        assigned = [None] * len(boxes)
+        used = set()
+        for score, ti, bi in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used or assigned[bi] is not None:
+                continue
+            track = self.tracks[ti]
+            track.box, track.conf, track.last_seen = boxes[bi], confs[bi], timestamp
+            track.hits += 1
+            assigned[bi] = track
+            used.add(ti)
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is None:
+                track = Track(box, confs[bi], timestamp)
+                self.tracks.append(track)
+                self.stats["tracks"] += 1
+                assigned[bi] = track
+        return assigned
+
+    def needs_ocr(self, track, timestamp=None):
+        timestamp = timestamp or time.time()
+        wanted = (not track.emitted
+                  and track.ocr_attempts < self.max_ocr
+                  and timestamp - track.last_ocr >= self.ocr_interval)
+        if wanted:
+            track.ocr_attempts += 1
+            track.last_ocr = timestamp
+            self.stats["ocr_calls"] += 1
+        else:
+            self.stats["ocr_skipped"] += 1
+        return wanted
+
+    def collect_events(self, timestamp=None):
+        """
+        Tracks that are ready to be reported (confirmed, or ended with votes).
+        Ended tracks are dropped. Each track is returned at most once.
+        """
+        timestamp = timestamp or time.time()
+        ready, alive = [], []
+        for track in self.tracks:
+            ended = timestamp - track.last_seen > self.max_age
+            if not track.emitted:
+                win = track.winner()
+                if win and (win[2] >= self.confirm_votes or ended):
+                    track.emitted = True
+                    self.stats["events"] += 1
+                    ready.append(track)
+            if not ended:
+                alive.append(track)
+        self.tracks = alive
+        return ready
@@ -0,0 +1,247 @@
+"""
+A day's truck plan that can take newly due bins without re-clustering
+(served by scheduling_server.py).
+
+RoutePlan.build() runs the full clustering and orders every truck's stops
+once. Afterwards insert() places each new bin into the route where it adds
+the least distance, looking only at the trucks with the nearest centroids,
+and re-runs 2-opt on just the routes that changed. Stops a truck has already
+collected (see collect()) are never moved, so trucks on the road keep their
+route. Centroids and route legs are kept up to date as bins come in, so an
+update only reads the cached distances of the routes it touches.
+
+A plan keeps the coordinates of its own bins: when the cache no longer
+knows one of them, distances are computed from those instead.
+"""
+import threading
+import time
+
+import numpy as np
+
+from routing import nearest_neighbour_path, route_matrix, two_opt
+from scheduling import cluster_bins, haversine_km, to_lat_lng, to_unit_vectors
+
+
+class TruckRoute:
+    """One truck's share of a plan: stops still to visit (in order) and stops collected."""
+
+    def __init__(self, truck_id, capacity=None):
+        self.truck_id = truck_id
+        self.capacity = capacity
+        self.stops = []
+        self.collected = []
+        self.position = None     # (lat, lng) of the last reported position
+        self.vector_sum = np.zeros(3)
+        self.legs = np.empty(0)  # start -> stops[0], ..., stops[-1] -> end (km)
+
+    @property
+    def load(self):
+        return len(self.stops) + len(self.collected)
+
+    def has_room(self):
+        return self.capacity is None or self.load < self.capacity
+
+    def centroid(self):
+        norm = np.linalg.norm(self.vector_sum)
+        return self.vector_sum / norm if norm > 1e-12 else None
+
+    @property
+    def km(self):
+        return float(self.legs.sum())
+
+    def to_dict(self):
+        centroid = self.centroid()
+        if centroid is not None:
+            lat, lng = to_lat_lng(centroid)
+            centroid = {"lat": float(lat), "lng": float(lng)}
+        return {"truck_id": self.truck_id, "capacity": self.capacity, "bin_ids": list(self.stops),
+                "collected": list(self.collected), "centroid": centroid, "remaining_km": round(self.km, 3)}
+
+
+class RoutePlan:
+    """
+    Trucks and their routes for one schedule, over the bins of a DistanceCache.
+
+    Routes start at the truck's last reported position, else at its last
+    collected bin, else at the depot; they end at `end` (the depot by
+    default, None for routes that stop at their last bin).
+    """
+
+    def __init__(self, cache, trucks, depot, end="depot", candidates=3, max_passes=50):
+        self.cache = cache
+        self.depot = depot
+        self.end = depot if end == "depot" else end
+        self.candidates = candidates
+        self.max_passes = max_passes
+        self.trucks = {truck.truck_id: truck for truck in trucks}
+        self.unassigned = []
+        self.coords = {}  # bin id -> (lat, lng) of every bin the plan has seen
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, cache, bin_ids, lat, lng, truck_ids, capacities, depot, end="depot", candidates=3,
+              max_passes=50, **cluster_args):
+        """Cluster the (distinct) bins between the trucks and order every route (the full run)."""
+        plan = cls(cache, [TruckRoute(t, c) for t, c in zip(truck_ids, capacities)], depot, end,
+                   candidates, max_passes)
+        bin_ids = list(bin_ids)
+        lat, lng = np.asarray(lat, np.float64), np.asarray(lng, np.float64)
+        plan.coords.update(zip(bin_ids, zip(lat.tolist(), lng.tolist())))
+        result = cluster_bins(lat, lng, len(truck_ids), capacities=capacities, **cluster_args)
+        vectors = to_unit_vectors(lat, lng)
+        for truck, label in zip(plan.trucks.values(), range(len(result["centers"]))):
+            members = np.flatnonzero(result["labels"] == label)
+            truck.stops = [bin_ids[i] for i in members]
+            truck.vector_sum = vectors[members].sum(axis=0)
+            plan._reorder(truck)
+        plan.unassigned = [bin_ids[i] for i in np.flatnonzero(result["labels"] < 0)]
+        return plan
+
+    # ——— route geometry ———
+
+    def bin_ids(self):
+        """Every bin the plan refers to (to keep them in the cache)."""
+        with self._lock:
+            return set(self.coords)
+
+    def _coordinates(self, ids):
+        points = np.array([self.coords[bin_id] for bin_id in ids], np.float64).reshape(-1, 2)
+        return points[:, 0], points[:, 1]
+
+    def _between(self, ids, other_ids):
+        """Distances from the cache, or from the plan's coordinates for bins it has dropped."""
+        try:
+            return self.cache.between(ids, other_ids).astype(np.float64)
+        except KeyError:
+            lat, lng = self._coordinates(ids)
+            lat2, lng2 = self._coordinates(other_ids)
+            return haversine_km(lat[:, None], lng[:, None], lat2[None, :], lng2[None, :])
+
+    def _start(self, truck):
+        if truck.position is not None:
+            return truck.position
+        if truck.collected:
+            return self.coords[truck.collected[-1]]
+        return self.depot
+
+    def _ends(self, truck, ids):
+        """Distances of the bins from the truck's start and to the route's end (None: open)."""
+        lat, lng = self._coordinates(ids)
+        start = self._start(truck)
+        start_km = haversine_km(start[0], start[1], lat, lng)
+        end_km = None if self.end is None else haversine_km(self.end[0], self.end[1], lat, lng)
+        return start_km, end_km
+
+    def _legs(self, truck):
+        """Leg lengths of the route in its current order."""
+        if not truck.stops:
+            return np.empty(0)
+        lat, lng = self._coordinates(truck.stops)
+        start_km, end_km = self._ends(truck, truck.stops)
+        inner = haversine_km(lat[:-1], lng[:-1], lat[1:], lng[1:])
+        return np.concatenate([start_km[:1], inner, [0.0] if end_km is None else end_km[-1:]])
+
+    def _reorder(self, truck, from_scratch=True):
+        """Order a truck's remaining stops: nearest neighbour + 2-opt, or 2-opt on the current order."""
+        if len(truck.stops) < 2:
+            truck.legs = self._legs(truck)
+            return
+        start_km, end_km = self._ends(truck, truck.stops)
+        full = route_matrix(self._between(truck.stops, truck.stops), start_km, end_km)
+        path = nearest_neighbour_path(full) if from_scratch else np.arange(len(full))
+        path = two_opt(full, path, self.max_passes)
+        truck.stops = [truck.stops[i - 1] for i in path[1:-1]]
+        truck.legs = full[path[:-1], path[1:]]
+
+    # ——— updates ———
+
+    def insert(self, bin_ids, lat, lng):
+        """
+        Add newly due bins at these coordinates. Each goes to the cheapest
+        position in the route of one of the `candidates` trucks with the
+        nearest centroids that still have room; the routes that changed are
+        then re-optimised. Returns {"assigned": {bin_id: truck_id},
+        "unassigned", "changed": [truck ids], "added_km", "ms"}.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            known = {b for t in self.trucks.values() for b in t.stops + t.collected}
+            points = dict(zip(bin_ids, zip(np.asarray(lat, np.float64).tolist(),
+                                           np.asarray(lng, np.float64).tolist())))
+            new = [b for b in points if b not in known]
+            self.coords.update((b, points[b]) for b in new)
+            self.unassigned = [b for b in self.unassigned if b not in points]
+            before = {t.truck_id: t.km for t in self.trucks.values()}
+            assigned, changed = {}, {}
+            vectors = to_unit_vectors(*self._coordinates(new)).reshape(-1, 3)
+            for bin_id, vector in zip(new, vectors):
+                best = self._cheapest(bin_id, vector)
+                if best is None:
+                    self.unassigned.append(bin_id)
+                    continue
+                truck, position, legs = best
+                truck.stops.insert(position, bin_id)
+                truck.legs = np.concatenate([truck.legs[:position], legs, truck.legs[position + 1:]])
+                truck.vector_sum = truck.vector_sum + vector
+                assigned[bin_id] = truck.truck_id
+                changed[truck.truck_id] = True
+            for truck_id in changed:
+                self._reorder(self.trucks[truck_id], from_scratch=False)
+            self.updated_at = time.time()
+            return {
+                "assigned": assigned,
+                "unassigned": list(self.unassigned),
+                "changed": list(changed),
+                "added_km": round(sum(self.trucks[t].km - before[t] for t in changed), 3),
+                "ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+
+    def _direction(self, truck):
+        """Unit vector a new bin is compared with: the centroid, or the start of an empty route."""
+        centroid = truck.centroid()
+        return centroid if centroid is not None else to_unit_vectors(*self._start(truck))
+
+    def _cheapest(self, bin_id, vector):
+        """(truck, position, the two new legs) of the cheapest insertion, or None if no truck has room."""
+        open_trucks = [t for t in self.trucks.values() if t.has_room()]
+        open_trucks.sort(key=lambda t: -float(self._direction(t) @ vector))
+        best = None
+        for truck in open_trucks[:self.candidates]:
+            start_km, end_km = self._ends(truck, [bin_id])
+            end_km = np.zeros(1) if end_km is None else end_km
+            to_stops = self._between([bin_id], truck.stops)[0]
+            into = np.concatenate([start_km, to_stops])  # from the stop before each position
+            out = np.concatenate([to_stops, end_km])     # to the stop after it
+            cost = into + out - truck.legs if truck.stops else into + out
+            position = int(np.argmin(cost))
+            if best is None or cost[position] < best[0]:
+                best = (float(cost[position]), truck, position, np.array([into[position], out[position]]))
+        return best[1:] if best else None
+
+    def truck_bins(self, truck_id):
+        """(stops still to visit, stops collected) of one truck, as copies."""
+        with self._lock:
+            truck = self.trucks[truck_id]
+            return list(truck.stops), list(truck.collected)
+
+    def collect(self, truck_id, bin_ids=(), position=None):
+        """Mark stops as collected (they leave the route) and/or record the truck's position."""
+        with self._lock:
+            truck = self.trucks[truck_id]
+            done = set(bin_ids) & set(truck.stops)
+            truck.collected += [b for b in truck.stops if b in done]
+            truck.stops = [b for b in truck.stops if b not in done]
+            if position is not None:
+                truck.position = position
+            truck.legs = self._legs(truck)
+            self.updated_at = time.time()
+            return len(done)
+
+    def to_dict(self):
+        with self._lock:
+            trucks = [t.to_dict() for t in self.trucks.values()]
+        return {"trucks": trucks, "unassigned": list(self.unassigned),
+                "remaining_km": round(sum(t["remaining_km"] for t in trucks), 3),
+                "created_at": self.created_at, "updated_at": self.updated_at}
@@ -0,0 +1,418 @@
+"""
+Spatial index, cached distances and stop ordering for truck routes
+(served by scheduling_server.py).
+
+KDTree answers "nearest bins to this GPS point" without touching every bin.
+DistanceCache keeps the pairwise distances between all known bins in a
+float32 memory-mapped file and only computes the rows of bins that were
+added or moved. order_stops() orders a cluster's stops from its slice of that
+matrix with a nearest-neighbour tour improved by 2-opt.
+"""
+import csv
+import heapq
+import json
+import os
+import threading
+
+import numpy as np
+
+from scheduling import chord_to_km, haversine_km, to_unit_vectors
+
+
+class KDTree:
+    """
+    KD-tree over bins as unit vectors. The straight-line (chord) distance
+    between unit vectors orders points exactly like the great-circle distance,
+    so the nearest bins by chord are the nearest by haversine.
+    """
+
+    def __init__(self, lat, lng, leaf_size=32):
+        self.points = to_unit_vectors(lat, lng).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self.perm = np.arange(len(self.points))
+        # per node: start, end, left, right (-1 for leaves) and bounding box
+        self.start, self.end, self.left, self.right, self.lo, self.hi = [], [], [], [], [], []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, start, end):
+        node = len(self.start)
+        pts = self.points[self.perm[start:end]]
+        lo, hi = pts.min(axis=0), pts.max(axis=0)
+        for values, v in ((self.start, start), (self.end, end), (self.left, -1), (self.right, -1),
+                          (self.lo, lo), (self.hi, hi)):
+            values.append(v)
+        if end - start > self.leaf_size:
+            dim = int(np.argmax(hi - lo))
+            mid = (end - start) // 2
+            order = np.argpartition(pts[:, dim], mid)
+            self.perm[start:end] = self.perm[start:end][order]
+            self.left[node] = self._build(start, start + mid)
+            self.right[node] = self._build(start + mid, end)
+        return node
+
+    def query(self, lat, lng, k=5):
+        """(indices, km) of the k bins nearest to a point, closest first."""
+        k = min(k, len(self.points))
+        if k <= 0:
+            return np.empty(0, np.int64), np.empty(0)
+        q = to_unit_vectors(lat, lng).reshape(3)
+        best_idx, best_d2 = np.empty(0, np.int64), np.empty(0)
+        heap = [(0.0, 0)]
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if len(best_d2) == k and bound > best_d2[-1]:
+                break
+            if self.left[node] >= 0:
+                for child in (self.left[node], self.right[node]):
+                    gap = np.maximum(0.0, np.maximum(self.lo[child] - q, q - self.hi[child]))
+                    heapq.heappush(heap, (float(gap @ gap), child))
+                continue
+            idx = self.perm[self.start[node]:self.end[node]]
+            diff = self.points[idx] - q
+            d2 = np.einsum("ij,ij->i", diff, diff)
+            best_idx, best_d2 = np.concatenate([best_idx, idx]), np.concatenate([best_d2, d2])
+            keep = np.argsort(best_d2, kind="stable")[:k]
+            best_idx, best_d2 = best_idx[keep], best_d2[keep]
+        return best_idx, chord_to_km(best_d2)
+
+
+def bin_key(bin_id):
+    """Bin ids as the bins table has them: integers, also when read from CSV or a URL."""
+    if isinstance(bin_id, str) and bin_id.strip().isdigit():
+        return int(bin_id)
+    return bin_id
+
+
+class CacheFull(Exception):
+    """More bins than the distance cache's max_capacity."""
+
+
+class DistanceCache:
+    """
+    Great-circle distances (km) between every pair of known bins.
+
+    The matrix is a float32 memory-mapped file (<path>.<capacity>.npy,
+    capacity x capacity) with the bin ids and coordinates next to it
+    (<path>.json), so it survives restarts and is paged in only where routes
+    need it. Growing it writes a new file and switches the index over to it;
+    a mapped file is never renamed or deleted in place (Windows refuses).
+    Capacity doubles up to max_capacity: the file takes 4 * capacity² bytes
+    (1 GB at 16384 bins), and update() raises CacheFull beyond that. Every bin
+    owns a slot; update() computes the rows of new or moved bins only, and
+    slots of removed bins are reused. Columns are never written (that would
+    dirty a page of every row): each slot remembers when its row was
+    written, and a distance is read from the row of the newer of the two.
+    Without a path the matrix lives in memory. The KD-tree is rebuilt lazily
+    after a change.
+    """
+
+    def __init__(self, path=None, initial_capacity=1024, max_capacity=16384):
+        self.path = path
+        self.max_capacity = max_capacity
+        self.capacity = 0
+        self.slots = {}          # bin id -> slot
+        self.ids = []            # slot -> bin id (None: free)
+        self.used = 0            # slots below this have been handed out
+        self.lat = np.empty(0)
+        self.lng = np.empty(0)
+        self.written = np.empty(0, np.int64)  # slot -> update that last wrote its row
+        self.clock = 0
+        self.matrix = None
+        self._tree = None
+        self._tree_slots = None
+        self._lock = threading.RLock()
+        if path and os.path.exists(path + ".json") and self._load():
+            return
+        self._resize(initial_capacity)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, bin_id):
+        return bin_id in self.slots
+
+    # ——— storage ———
+
+    def _matrix_path(self, capacity):
+        return f"{self.path}.{capacity}.npy"
+
+    def _open(self, capacity, mode):
+        if not self.path:
+            return np.zeros((capacity, capacity), np.float32)
+        return np.lib.format.open_memmap(self._matrix_path(capacity), mode=mode, dtype=np.float32,
+                                         shape=(capacity, capacity) if mode == "w+" else None)
+
+    def _load(self):
+        try:
+            with open(self.path + ".json") as f:
+                meta = json.load(f)
+            matrix = self._open(meta["capacity"], "r+")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Distance cache {self.path} unreadable, rebuilding: {e}")
+            return False
+        if matrix.shape != (meta["capacity"], meta["capacity"]):
+            print(f"⚠️ Distance cache {self.path} does not match its index, rebuilding")
+            return False
+        self.matrix, self.capacity = matrix, meta["capacity"]
+        self.ids = meta["ids"] + [None] * (self.capacity - len(meta["ids"]))
+        self.lat = np.zeros(self.capacity)
+        self.lng = np.zeros(self.capacity)
+        self.written = np.zeros(self.capacity, np.int64)
+        used = len(meta["ids"])
+        self.lat[:used], self.lng[:used], self.written[:used] = meta["lat"], meta["lng"], meta["written"]
+        self.clock = int(self.written.max(initial=0))
+        self.slots = {bin_id: slot for slot, bin_id in enumerate(self.ids) if bin_id is not None}
+        self.used = len(meta["ids"])
+        print(f"[INFO] Distance cache loaded: {len(self.slots)} bins from {self.path}")
+        return True
+
+    def _resize(self, capacity):
+        old, used, old_capacity = self.matrix, self.used, self.capacity
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # copy into a new file; the index points at the old one until flush()
+        self.matrix = self._open(capacity, "w+")
+        if old is not None and used:
+            for row in range(0, used, 1024):
+                stop = min(row + 1024, used)
+                self.matrix[row:stop, :used] = old[row:stop, :used]
+        self.lat = np.concatenate([self.lat, np.zeros(capacity - self.capacity)])
+        self.lng = np.concatenate([self.lng, np.zeros(capacity - self.capacity)])
+        self.written = np.concatenate([self.written, np.zeros(capacity - self.capacity, np.int64)])
+        self.ids += [None] * (capacity - self.capacity)
+        self.capacity = capacity
+        if self.path and old is not None:
+            self.flush()
+            del old  # unmaps the old file, which can then be deleted
+            try:
+                os.remove(self._matrix_path(old_capacity))
+            except OSError as e:
+                print(f"⚠️ Could not delete the old distance matrix: {e}")
+
+    def flush(self):
+        """Write the matrix and the bin index to disk."""
+        if not self.path:
+            return
+        with self._lock:
+            self.matrix.flush()
+            meta = {"capacity": self.capacity, "ids": self.ids[:self.used],
+                    "lat": self.lat[:self.used].tolist(), "lng": self.lng[:self.used].tolist(),
+                    "written": self.written[:self.used].tolist()}
+            with open(self.path + ".json.tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(self.path + ".json.tmp", self.path + ".json")
+
+    # ——— updates ———
+
+    def update(self, ids, lat, lng, flush=True):
+        """Add new bins and move changed ones. Returns {"added", "moved"}."""
+        lat, lng = np.asarray(lat, np.float64), np.asarray(lng, np.float64)
+        with self._lock:
+            needed = len(self.slots) + len({bin_id for bin_id in ids if bin_id not in self.slots})
+            if needed > self.capacity:
+                if needed > self.max_capacity:
+                    raise CacheFull(f"{needed} bins do not fit in the distance cache "
+                                    f"(max_capacity {self.max_capacity})")
+                capacity = max(self.capacity, 1)
+                while capacity < needed:
+                    capacity *= 2
+                self._resize(min(capacity, self.max_capacity))
+            changed, added, moved = [], 0, 0
+            free = (slot for slot, bin_id in enumerate(self.ids) if bin_id is None)
+            for bin_id, a, b in zip(ids, lat, lng):
+                slot = self.slots.get(bin_id)
+                if slot is None:
+                    slot = next(free)
+                    self.slots[bin_id], self.ids[slot] = slot, bin_id
+                    self.used = max(self.used, slot + 1)
+                    added += 1
+                elif self.lat[slot] == a and self.lng[slot] == b:
+                    continue
+                else:
+                    moved += 1
+                self.lat[slot], self.lng[slot] = a, b
+                changed.append(slot)
+            if changed:
+                self._fill(np.array(changed))
+                if flush:
+                    self.flush()
+            return {"added": added, "moved": moved}
+
+    def _fill(self, changed, block=256):
+        """Recompute the rows of the changed slots, a block at a time."""
+        used = self.used
+        self.clock += 1
+        self.written[changed] = self.clock
+        for i in range(0, len(changed), block):
+            chunk = changed[i:i + block]
+            rows = haversine_km(self.lat[chunk, None], self.lng[chunk, None],
+                                self.lat[None, :used], self.lng[None, :used]).astype(np.float32)
+            self.matrix[chunk, :used] = rows
+        self._tree = None
+
+    def remove(self, ids, flush=True):
+        """Forget bins; their slots are reused by later bins. Returns how many were known."""
+        with self._lock:
+            removed = 0
+            for bin_id in ids:
+                slot = self.slots.pop(bin_id, None)
+                if slot is not None:
+                    self.ids[slot] = None
+                    removed += 1
+            if removed:
+                self._tree = None
+                if flush:
+                    self.flush()
+            return removed
+
+    def sync(self, ids, lat, lng, previous=(), keep=()):
+        """
+        Bring the bins of a source up to date: add or move these bins and drop
+        the ones of `previous` (the ids of the last sync) that are gone, except
+        those in `keep`. Bins added with update() by anyone else stay.
+        """
+        with self._lock:
+            current = set(ids)
+            gone = [bin_id for bin_id in previous if bin_id not in current and bin_id not in keep]
+            removed = self.remove(gone, flush=False)
+            result = self.update(ids, lat, lng, flush=False)
+            self.flush()
+            return {**result, "removed": removed}
+
+    # ——— queries ———
+
+    def slots_of(self, ids):
+        """Slots of bin ids; raises KeyError on the first unknown one."""
+        with self._lock:
+            return np.array([self.slots[bin_id] for bin_id in ids], np.int64)
+
+    def coordinates(self, ids):
+        with self._lock:
+            slots = self.slots_of(ids)
+            return self.lat[slots], self.lng[slots]
+
+    def submatrix(self, ids):
+        """(m, m) float32 distances between the given bins."""
+        with self._lock:
+            slots = self.slots_of(ids)
+            block = np.asarray(self.matrix[np.ix_(slots, slots)])
+            newer = self.written[slots][:, None] >= self.written[slots][None, :]
+            return np.where(newer, block, block.T)
+
+    def between(self, ids, other_ids):
+        """(len(ids), len(other_ids)) float32 distances from some bins to others."""
+        with self._lock:
+            rows, cols = self.slots_of(ids), self.slots_of(other_ids)
+            newer = self.written[rows][:, None] >= self.written[cols][None, :]
+            return np.where(newer, self.matrix[np.ix_(rows, cols)], self.matrix[np.ix_(cols, rows)].T)
+
+    def nearest(self, lat, lng, k=5):
+        """[(bin_id, km), ...] of the k bins nearest to a point, closest first."""
+        with self._lock:
+            if self._tree is None:
+                self._tree_slots = np.array(sorted(self.slots.values()), np.int64)
+                self._tree = KDTree(self.lat[self._tree_slots], self.lng[self._tree_slots])
+            idx, km = self._tree.query(lat, lng, k)
+            return [(self.ids[self._tree_slots[i]], float(d)) for i, d in zip(idx, km)]
+
+    def status(self):
+        return {"bins": len(self.slots), "capacity": self.capacity, "path": self.path,
+                "bytes": int(self.matrix.nbytes) if self.matrix is not None else 0}
+
+
+def load_bins(source):
+    """
+    (ids, latitudes, longitudes) of bins from:
+      - "supabase"        -> bin_id, latitude, longitude of the bins table
+      - *.json            -> list of bins, or {"bins": [...]}
+      - *.csv             -> columns bin_id, latitude, longitude
+    """
+    if source == "supabase":
+        import requests
+        from cameraDb import SUPABASE_URL, HEADERS
+        res = requests.get(f"{SUPABASE_URL}/rest/v1/bins", params={"select": "bin_id,latitude,longitude"},
+                           headers=HEADERS, timeout=10)
+        res.raise_for_status()
+        rows = res.json()
+    elif source.endswith(".json"):
+        with open(source) as f:
+            rows = json.load(f)
+        rows = rows["bins"] if isinstance(rows, dict) else rows
+    else:
+        with open(source, newline='') as f:
+            rows = list(csv.DictReader(f))
+    rows = [r for r in rows if r.get("latitude") not in (None, "") and r.get("longitude") not in (None, "")]
+    return ([bin_key(r["bin_id"]) for r in rows], np.array([float(r["latitude"]) for r in rows]),
+            np.array([float(r["longitude"]) for r in rows]))
+
+
+def nearest_neighbour_path(D):
+    """Path from node 0 to node n-1 (both fixed) that always visits the closest unvisited node next."""
+    n = len(D)
+    path = [0]
+    unvisited = np.ones(n, bool)
+    unvisited[[0, n - 1]] = False
+    current = 0
+    for _ in range(n - 2):
+        nxt = int(np.argmin(np.where(unvisited, D[current], np.inf)))
+        path.append(nxt)
+        unvisited[nxt] = False
+        current = nxt
+    return np.array(path + [n - 1])
+
+
+def two_opt(D, path, max_passes=50):
+    """
+    Improve a path with fixed endpoints by reversing segments (2-opt) while
+    that shortens it. For each edge, the best of all reversals starting there
+    is found with one vectorized step, so a pass costs n numpy calls.
+    """
+    path = path.copy()
+    n = len(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 3):
+            a, b = path[i], path[i + 1]
+            c, d = path[i + 2:n - 1], path[i + 3:n]
+            delta = D[a, c] + D[b, d] - D[a, b] - D[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                path[i + 1:i + j + 3] = path[i + 1:i + j + 3][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+def path_length(D, path):
+    return float(D[path[:-1], path[1:]].sum())
+
+
+def route_matrix(D, start_km, end_km=None):
+    """(m + 2, m + 2) distances with the start as node 0 and the end as node m + 1 (0 km to reach if None)."""
+    m = len(D)
+    full = np.zeros((m + 2, m + 2))
+    full[1:m + 1, 1:m + 1] = D
+    full[0, 1:m + 1] = full[1:m + 1, 0] = start_km
+    if end_km is not None:
+        full[m + 1, 1:m + 1] = full[1:m + 1, m + 1] = end_km
+    return full
+
+
+def order_stops(D, start_km, end_km=None, max_passes=50):
+    """
+    Visiting order of m stops given their (m, m) distances, the distance of
+    each stop from the start point and to the end point (None: the route
+    ends at the last stop). Returns (order, km, nearest-neighbour km).
+    """
+    if len(D) == 0:
+        return np.empty(0, np.int64), 0.0, 0.0
+    full = route_matrix(D, start_km, end_km)
+    path = nearest_neighbour_path(full)
+    nn_km = path_length(full, path)
+    path = two_opt(full, path, max_passes)
+    return path[1:-1] - 1, path_length(full, path), nn_km
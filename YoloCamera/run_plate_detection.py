@@ -1,121 +1,343 @@
-import cv2
-from ultralytics import YOLO
-from datetime import datetime
-import pytesseract  # OCR for extracting the plate number
-from gdrive_auth import upload_to_gdrive  # Function to upload to Google Drive
-from cameraDb import log_to_supabase  # Function to log to Supabase
+"""
+Bin plate detection from the webcam, or headless over recorded footage.
+
+Interactive (default): shows the camera, press 'c' to capture and detect,
+'q' to quit. Plates are saved, uploaded to Google Drive and logged to Supabase.
+
+Headless batch: pass image folders, images and/or video files. Frames are
+split into chunks that are spread over a process pool (one YOLO + OCR per
+process), run through the same detect -> crop -> OCR -> match stages and
+written as they finish to a JSONL or CSV file, one row per plate:
+
+    python run_plate_detection.py dashcam/2025-06-28/*.mp4 audit_images/ \\
+        --out results.jsonl --plates plates.txt --stride 5
+    python run_plate_detection.py dashcam/2025-06-28/*.mp4 --out results.jsonl --resume
+
+Finished chunks are recorded in <out>.done, so --resume (with the same
+arguments) skips them and appends to the existing output.
+"""
+import argparse
+import csv
+import json
 import os
-import re
-
-# Load the YOLO model
-model = YOLO("weights.pt")
-cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-
-# Tesseract OCR path (Ensure Tesseract is installed)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-
-print("[INFO] Press 'c' to capture and detect, 'q' to quit.")
-print("[INFO] Make sure the camera window is active (click it) before pressing keys.")
-
-# Preprocess the image for better OCR accuracy
-def preprocess_image(cropped_plate):
-    gray = cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return cv2.GaussianBlur(thresh, (5, 5), 0)
-
-# Function to rotate the image 180 degrees
-def rotate_image_180(image):
-    return cv2.rotate(image, cv2.ROTATE_180)
-
-# Function to crop tightly around the detected plate (to remove unwanted border)
-def crop_plate_borders(cropped_plate):
-    # Convert to grayscale and find contours to remove extra space
-    gray = cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    
-    # Find contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    for contour in contours:
-        # Get bounding box for each contour
-        x, y, w, h = cv2.boundingRect(contour)
-        # Crop the plate more tightly around the bounding box
-        cropped_plate = cropped_plate[y:y+h, x:x+w]
-    
-    return cropped_plate
-
-# Function to clean up OCR results and remove unwanted characters
-def clean_plate_text(plate_text):
-    # Remove leading negative signs or unwanted characters (e.g., ' — ')
-    cleaned_text = plate_text.strip()
-    if cleaned_text.startswith('—'):
-        cleaned_text = cleaned_text[1:].strip()
-    return cleaned_text
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("❌ Failed to read frame")
-        break
-
-    cv2.imshow("Bin Plate Detection", frame)
-    key = cv2.waitKey(1) & 0xFF
-
-    if key == ord('c'):
-        print("[INFO] Capturing image and running YOLOv8 detection...")
-        result = model.predict(source=frame, conf=0.5, save=False)[0]
-
-        if result.boxes:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            confidences = result.boxes.conf.cpu().numpy()
-
-            for idx, ((x1, y1, x2, y2), conf) in enumerate(zip(boxes, confidences)):
-                # Draw rectangle
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-
-                # Crop the detected plate
-                cropped_plate = frame[int(y1):int(y2), int(x1):int(x2)]
-
-                # Optionally, crop plate more tightly to remove borders
-                cropped_plate = crop_plate_borders(cropped_plate)
-
-                # Rotate image 180 degrees (if the plate is upside down)
-                rotated_plate = rotate_image_180(cropped_plate)
-
-                # Preprocess the rotated plate for OCR
-                preprocessed_plate = preprocess_image(rotated_plate)
-
-                # Apply OCR to extract plate text
-                plate_text = pytesseract.image_to_string(preprocessed_plate, config='--psm 8').strip()
-
-                # Clean the OCR result by removing leading '-' (if it's mistakenly detected)
-                plate_text = clean_plate_text(plate_text)
-
-                # Use timestamp as unique filename
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                full_filename = f"full_plate_{timestamp}.jpg"
-                crop_filename = f"plate_{timestamp}.jpg"
-
-                # Save images (both full frame and cropped plate)
-                cv2.imwrite(full_filename, frame)
-                cv2.imwrite(crop_filename, rotated_plate)
-
-                print(f"✅ Plate Detected: {plate_text or 'N/A'} | Confidence: {conf:.2f}")
-                print(f"📝 Saved crop as {crop_filename} and full frame as {full_filename}")
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-                # Upload to Google Drive
-                upload_to_gdrive(crop_filename)
+import cv2
+
+from camera_registry import IMAGE_EXTENSIONS
+from ocr_engine import get_engine, OcrEngine  # OCR for extracting the plate number
+from plate_index import PlateIndex, load_plates
+from plate_stages import (plate_pipeline, new_job, detect, prepare, read_text, match,
+                          OrientationRanker)
+
+MODEL_PATH = "weights.pt"
+MATCH_THRESHOLD = 0.7
+# Interactive mode keeps its images and pending uploads next to this script
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CSV_COLUMNS = ["file", "frame", "time_s", "x1", "y1", "x2", "y2", "conf",
+               "text", "match", "ratio", "orientation"]
+
+
+def interactive(weights=MODEL_PATH):
+    from ultralytics import YOLO
+    from upload_queue import UploadQueue  # Background Google Drive uploads
+    from cameraDb import log_to_supabase  # Function to log to Supabase
+    from image_store import ImageStore
 
+    # Load the YOLO model
+    model = YOLO(weights)
+    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+
+    # Long-lived OCR workers (Tesseract path is configured in ocr_engine.py)
+    ocr = get_engine()
+
+    # Crops of all plates are uploaded to Google Drive in parallel, with retries
+    uploader = UploadQueue(os.path.join(BASE_DIR, "upload_spool"), workers=4).start()
+
+    # Full frames and crops are written under content-hash names (no overwrites);
+    # crops still waiting to be uploaded are never evicted
+    images = ImageStore(os.path.join(BASE_DIR, "captures"), full_format="jpg", pinned=uploader.is_pending)
+
+    def report(job):
+        """Save, upload and log every plate of one captured frame"""
+        if not job["plates"]:
+            print("❌ No bin plate detected.")
+        for plate in job["plates"]:
+            plate_text = plate["text"]
+            print(f"✅ Plate Detected: {plate_text or 'N/A'} | Confidence: {plate['conf']:.2f}")
+
+            def saved(paths, plate_text=plate_text, conf=plate["conf"]):
+                if paths["duplicate"]:
+                    print(f"♻️ {plate_text} was just saved; not uploading it again")
+                    return
+                print(f"📝 Saved crop as {paths['plate']} and full frame as {paths['full']}")
+                # Upload to Google Drive
+                uploader.enqueue(paths["plate"])
                 # Log to Supabase
                 log_to_supabase(
                     bin_id=plate_text if plate_text else "Unrecognized",
-                    confidence=float(conf),
-                    filename=crop_filename
+                    confidence=conf,
+                    filename=os.path.basename(paths["plate"])
                 )
-        else:
-            print("❌ No bin plate detected.")
+            # frames of the same plate close together are stored and uploaded once
+            images.save(job["frame"], plate["roi"], key=plate_text or None, callback=saved)
+
+    # YOLO -> ROI prep -> OCR -> report on worker threads; the window stays responsive
+    pipeline = plate_pipeline(model, ocr, on_result=report, live=False).start()
+
+    print("[INFO] Press 'c' to capture and detect, 'q' to quit.")
+    print("[INFO] Make sure the camera window is active (click it) before pressing keys.")
+
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Failed to read frame")
+            break
+
+        cv2.imshow("Bin Plate Detection", frame)
+        key = cv2.waitKey(1) & 0xFF
+
+        if key == ord('c'):
+            print("[INFO] Capturing image and running YOLOv8 detection...")
+            pipeline.submit(new_job(frame.copy()))
+
+        elif key == ord('q'):
+            break
+
+    pipeline.finish()
+    pipeline.join(timeout=30)
+    pipeline.stop()
+    images.close()
+    uploader.stop()
+    cap.release()
+    cv2.destroyAllWindows()
+
+
+# ——— headless batch mode ———
+
+def plan_chunks(inputs, chunk, stride):
+    """
+    Split the inputs into work units of about `chunk` frames each:
+    {"id", "path", "files": [...]} for images, {"id", "path", "start", "stop",
+    "fps"} for a frame range of a video. Returns (units, frames per input).
+    """
+    units, totals = [], {}
+    for path in inputs:
+        if os.path.isdir(path) or path.lower().endswith(IMAGE_EXTENSIONS):
+            if os.path.isdir(path):
+                files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                               if f.lower().endswith(IMAGE_EXTENSIONS))[::stride]
+            else:
+                files = [path]
+            totals[path] = len(files)
+            for i in range(0, len(files), chunk):
+                units.append({"id": f"{path}#{i}:{chunk}/{stride}", "path": path, "files": files[i:i + chunk]})
+            continue
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"⚠️ Skipping {path}: not an image folder, image or readable video")
+            continue
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        cap.release()
+        # unknown length (some streams/containers): one unit reads to the end
+        bounds = [(s, s + chunk * stride) for s in range(0, count, chunk * stride)] if count > 0 else [(0, None)]
+        totals[path] = -(-count // stride) if count > 0 else None
+        for start, stop in bounds:
+            units.append({"id": f"{path}#{start}:{chunk}/{stride}", "path": path,
+                          "start": start, "stop": stop, "fps": fps})
+    return units, totals
+
+
+def unit_frames(unit, stride):
+    """Yield (file key, frame index, seconds into the video, frame) for one unit."""
+    if "files" in unit:
+        for f in unit["files"]:
+            frame = cv2.imread(f)
+            if frame is not None:
+                yield os.path.basename(f), None, None, frame
+        return
+    name = os.path.basename(unit["path"])
+    cap = cv2.VideoCapture(unit["path"])
+    index = unit["start"]
+    if index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    try:
+        while unit["stop"] is None or index < unit["stop"]:
+            # grab() skips decoding the frames between strides
+            if not cap.grab():
+                break
+            if (index - unit["start"]) % stride == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    yield f"{name}#{index}", index, round(index / unit["fps"], 3) if unit["fps"] else None, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+_worker = {}
+
+def _init_worker(weights, plates, threshold, conf, max_boxes, stride):
+    """Per process: one YOLO model, one single-threaded OCR worker, one plate index."""
+    # parallelism comes from the processes; keep every library to one thread
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from ultralytics import YOLO
+    index = PlateIndex(plates)
+    ocr = OcrEngine(workers=1)
+    ranker = OrientationRanker()
+    _worker["stride"] = stride
+    _worker["stages"] = [
+        detect(YOLO(weights), conf, max_boxes),
+        prepare,
+        read_text(ocr, ranker),
+        match(lambda text: index.best(text, threshold), ocr, ranker),
+    ]
+
+def _run_unit(unit):
+    """Detect -> crop -> OCR -> match every frame of one unit; returns (unit, frames, rows)."""
+    frames, rows = 0, []
+    for key, index, seconds, frame in unit_frames(unit, _worker["stride"]):
+        job = new_job(frame)
+        for stage in _worker["stages"]:
+            job = stage(job)
+        frames += 1
+        for plate in job["plates"]:
+            x1, y1, x2, y2 = plate["box"]
+            rows.append({
+                "file": key, "frame": index, "time_s": seconds,
+                "x1": x1, "y1": y1, "x2": x2, "y2": y2, "conf": round(plate["conf"], 4),
+                "text": plate["text"], "match": plate["match"], "ratio": round(float(plate["ratio"]), 4),
+                "orientation": plate["orientation"],
+            })
+    return unit, frames, rows
+
+
+class ResultWriter:
+    """Streams rows to a JSONL or CSV file and records finished units in <path>.done."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.done_path = path + ".done"
+        self.csv = path.lower().endswith(".csv")
+        self.done = {}  # unit id -> {"frames", "plates"}
+        if resume and os.path.exists(self.done_path):
+            with open(self.done_path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.done[record.pop("unit")] = record
+        mode = "a" if resume else "w"
+        fresh = not resume or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._out = open(path, mode, newline="", encoding="utf-8")
+        self._done = open(self.done_path, mode)
+        if self.csv:
+            self._csv = csv.DictWriter(self._out, fieldnames=CSV_COLUMNS)
+            if fresh:
+                self._csv.writeheader()
+
+    def write(self, unit, frames, rows):
+        for row in rows:
+            if self.csv:
+                self._csv.writerow(row)
+            else:
+                self._out.write(json.dumps(row) + "\n")
+        self._out.flush()
+        # only after its rows are on disk, so an interrupted unit is redone on resume
+        record = {"frames": frames, "plates": len(rows)}
+        self._done.write(json.dumps(dict(record, unit=unit["id"])) + "\n")
+        self._done.flush()
+        self.done[unit["id"]] = record
+
+    def close(self):
+        self._out.close()
+        self._done.close()
+
+
+def run_batch(args):
+    plates = load_plates(args.plates) if args.plates else []
+    if not plates:
+        print("⚠️ No known plates loaded; rows will have text but no match")
+    units, totals = plan_chunks(args.inputs, args.chunk, args.stride)
+    writer = ResultWriter(args.out, resume=args.resume)
+    todo = [u for u in units if u["id"] not in writer.done]
+    if len(todo) < len(units):
+        print(f"[INFO] Resuming: {len(units) - len(todo)} of {len(units)} chunks already done")
+    print(f"[INFO] {len(todo)} chunk(s) from {len(totals)} input(s) on {args.workers} process(es) -> {args.out}")
+
+    done = {path: 0 for path in totals}
+    found = {path: 0 for path in totals}
+    for unit in units:
+        if unit["id"] in writer.done:
+            done[unit["path"]] += writer.done[unit["id"]]["frames"]
+            found[unit["path"]] += writer.done[unit["id"]]["plates"]
+    remaining = {path: sum(1 for u in todo if u["path"] == path) for path in totals}
+    frames_total = 0
+    started = time.monotonic()
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker,
+        initargs=(args.model, plates, args.threshold, args.conf, args.max_boxes, args.stride))
+    try:
+        futures = [pool.submit(_run_unit, u) for u in todo]
+        for future in as_completed(futures):
+            try:
+                unit, frames, rows = future.result()
+            except Exception as e:
+                print(f"⚠️ Chunk failed (rerun with --resume to retry): {e}")
+                continue
+            writer.write(unit, frames, rows)
+            path = unit["path"]
+            done[path] += frames
+            found[path] += len(rows)
+            remaining[path] -= 1
+            frames_total += frames
+            fps = frames_total / (time.monotonic() - started)
+            total = f"/{totals[path]}" if totals[path] is not None else ""
+            status = "✅ done" if remaining[path] == 0 else "…"
+            print(f"{status} {os.path.basename(os.path.normpath(path))}: {done[path]}{total} frames, "
+                  f"{found[path]} plate(s) | {fps:.1f} frames/s overall")
+    except KeyboardInterrupt:
+        print("[INFO] Interrupted; finished chunks are saved, rerun with --resume to continue")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        writer.close()
+    pool.shutdown()
+    elapsed = time.monotonic() - started
+    print(f"[INFO] {frames_total} frames in {elapsed:.1f}s ({frames_total / max(elapsed, 1e-9):.1f} frames/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="image folders, images or video files (none: interactive webcam)")
+    parser.add_argument("--out", default="results.jsonl", help="results file, .jsonl or .csv")
+    parser.add_argument("--resume", action="store_true", help="skip chunks recorded in <out>.done and append")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes (default: one per core)")
+    parser.add_argument("--chunk", type=int, default=100, help="frames per work unit")
+    parser.add_argument("--stride", type=int, default=1, help="process every n-th frame / image")
+    parser.add_argument("--model", default=MODEL_PATH, help="YOLO weights")
+    parser.add_argument("--plates", help="known plates: a .txt/.csv/.json file or 'supabase'")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD, help="minimum match similarity")
+    parser.add_argument("--conf", type=float, default=0.5, help="YOLO confidence")
+    parser.add_argument("--max-boxes", type=int, help="plates per frame (default: all)")
+    args = parser.parse_args()
+    if not args.inputs:
+        interactive(args.model)
+        return
+    try:
+        run_batch(args)
+    except KeyboardInterrupt:
+        sys.exit(130)
 
-    elif key == ord('q'):
-        break
 
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
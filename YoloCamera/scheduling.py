@@ -0,0 +1,250 @@
+"""
+Bin clustering for truck scheduling (served by scheduling_server.py).
+
+Bins are clustered on the sphere: coordinates become unit vectors, so the
+nearest centroid by dot product is the nearest by haversine distance and the
+normalized mean of a cluster is its spherical centroid. With that, every
+k-means step is a matrix product and a few bincounts instead of a loop over
+bins and centroids (cf. kMeansClustering() in SchedulingMap.tsx).
+"""
+import time
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_vectors(lat, lng):
+    """(n, 3) unit vectors for arrays of latitudes and longitudes in degrees."""
+    lat, lng = np.radians(np.asarray(lat, np.float64)), np.radians(np.asarray(lng, np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def to_lat_lng(vectors):
+    """(latitudes, longitudes) in degrees of (n, 3) vectors (need not be normalized)."""
+    x, y, z = np.moveaxis(np.asarray(vectors, np.float64), -1, 0)
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; broadcasts like any numpy expression."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def chord_to_km(chord2):
+    """Great-circle km for squared chord lengths between unit vectors."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.sqrt(np.maximum(chord2, 0.0)) / 2, 0.0, 1.0))
+
+
+def _normalize(centers, fallback):
+    norms = np.linalg.norm(centers, axis=1, keepdims=True)
+    return np.where(norms > 1e-12, centers / np.maximum(norms, 1e-12), fallback)
+
+
+def _sums(X, labels, k):
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    sums = np.stack([np.bincount(labels, weights=X[:, d], minlength=k) for d in range(3)], axis=1)
+    return sums, counts
+
+
+def kmeans_pp(X, k, rng):
+    """k-means++ seeding: each next center is drawn with probability ~ squared distance."""
+    n = len(X)
+    centers = np.empty((k, 3))
+    centers[0] = X[rng.integers(n)]
+    d2 = np.maximum(2.0 - 2.0 * X @ centers[0], 0.0)  # squared chord to the nearest center
+    for i in range(1, k):
+        total = d2.sum()
+        index = rng.choice(n, p=d2 / total) if total > 0 else rng.integers(n)
+        centers[i] = X[index]
+        np.minimum(d2, np.maximum(2.0 - 2.0 * X @ centers[i], 0.0), out=d2)
+    return centers
+
+
+def _reseed_empty(X, centers, labels, counts):
+    """Move empty clusters onto the points farthest from their centers."""
+    empty = np.flatnonzero(counts == 0)
+    if len(empty):
+        far = np.argsort(np.einsum("ij,ij->i", X, centers[labels]))[:len(empty)]
+        centers[empty] = X[far]
+    return centers
+
+
+def lloyd(X, centers, max_iter=100, tol=1e-6):
+    """Full-batch k-means; tol is the largest centroid move (in chord length) to stop at."""
+    k = len(centers)
+    for iteration in range(1, max_iter + 1):
+        labels = np.argmax(X @ centers.T, axis=1)
+        sums, counts = _sums(X, labels, k)
+        new = _reseed_empty(X, _normalize(sums, centers), labels, counts)
+        shift = np.max(np.linalg.norm(new - centers, axis=1))
+        centers = new
+        if shift < tol:
+            break
+    return centers, iteration
+
+
+def minibatch(X, centers, rng, batch_size=1024, max_iter=100, tol=1e-6, patience=10):
+    """
+    Mini-batch k-means (Sculley 2010): every iteration moves the centers
+    towards the mean of a random batch, each with a learning rate of
+    1 / (points it has seen), so the cost per iteration does not grow with
+    the number of bins. Stops once the centers stop moving, or when a moving
+    average of the batch inertia has not improved for `patience` batches.
+    """
+    k, n = len(centers), len(X)
+    size = min(batch_size, n)
+    alpha = min(1.0, 2.0 * size / (n + 1))
+    seen = np.zeros(k)
+    smoothed, best, stale = None, np.inf, 0
+    for iteration in range(1, max_iter + 1):
+        batch = X[rng.integers(0, n, size)]
+        sims = batch @ centers.T
+        labels = np.argmax(sims, axis=1)
+        sums, counts = _sums(batch, labels, k)
+        seen += counts
+        rate = np.divide(counts, seen, out=np.zeros(k), where=seen > 0)[:, None]
+        means = np.divide(sums, counts[:, None], out=centers.copy(), where=counts[:, None] > 0)
+        new = _normalize((1 - rate) * centers + rate * means, centers)
+        shift = np.max(np.linalg.norm(new - centers, axis=1))
+        centers = new
+        if shift < tol:
+            break
+        inertia = np.mean(2.0 - 2.0 * sims[np.arange(size), labels])
+        smoothed = inertia if smoothed is None else (1 - alpha) * smoothed + alpha * inertia
+        if smoothed < best:
+            best, stale = smoothed, 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    return centers, iteration
+
+
+def capacitated_assign(X, centers, capacities):
+    """
+    Nearest-center labels where no cluster gets more bins than its capacity.
+
+    Bins of clusters within capacity keep their nearest center. An overfull
+    cluster keeps its closest bins; the others are placed greedily, the bin
+    that would lose most by not getting its best remaining choice (regret)
+    first. Returns -1 for bins that fit nowhere (total capacity too small).
+    """
+    sims = X @ centers.T
+    labels = np.argmax(sims, axis=1)
+    k = len(centers)
+    caps = np.asarray(capacities, np.float64)
+    counts = np.bincount(labels, minlength=k)
+    if np.all(counts <= caps):
+        return labels
+
+    displaced = []
+    for c in np.flatnonzero(counts > caps):
+        members = np.flatnonzero(labels == c)
+        keep = int(caps[c])
+        order = members[np.argsort(-sims[members, c])]
+        displaced.append(order[keep:])
+        labels[order[keep:]] = -1
+    displaced = np.concatenate(displaced)
+    remaining = caps - np.bincount(labels[labels >= 0], minlength=k)
+
+    if k > 1:
+        open_sims = np.where(remaining > 0, sims[displaced], -np.inf)
+        top2 = -np.sort(-open_sims, axis=1)[:, :2]
+        # a bin with a single open choice left goes first, one with none last
+        best, second = top2[:, 0], top2[:, 1]
+        regret = np.where(np.isfinite(second), best - np.where(np.isfinite(second), second, 0.0),
+                          np.where(np.isfinite(best), 4.0, 0.0))
+    else:
+        regret = np.zeros(len(displaced))
+    prefs = np.argsort(-sims[displaced], axis=1)
+    for i in np.argsort(-regret, kind="stable"):
+        for c in prefs[i]:
+            if remaining[c] > 0:
+                labels[displaced[i]] = c
+                remaining[c] -= 1
+                break
+    return labels
+
+
+def cluster_bins(lat, lng, k, capacities=None, mode="auto", seed=0, max_iter=100, tol_km=0.001,
+                 batch_size=1024, minibatch_threshold=5000, balance_rounds=5):
+    """
+    Cluster bins into k groups (one per truck).
+
+    mode is "full" (Lloyd), "minibatch", or "auto" (mini-batch above
+    minibatch_threshold bins). With capacities (one per cluster, None for
+    unlimited) the assignment respects them, and centers and capacitated
+    labels are refined together for up to balance_rounds rounds.
+
+    Returns {"labels": (n,) int array (-1: over capacity), "centers": (k, 2)
+    lat/lng, "iterations", "mode", "ms"}.
+    """
+    started = time.perf_counter()
+    X = to_unit_vectors(lat, lng)
+    n = len(X)
+    if n == 0 or k <= 0:
+        return {"labels": np.full(n, -1), "centers": np.empty((0, 2)), "iterations": 0, "mode": mode, "ms": 0.0}
+    k = min(k, n)
+    if mode == "auto":
+        mode = "minibatch" if n > minibatch_threshold else "full"
+    tol = tol_km / EARTH_RADIUS_KM
+    rng = np.random.default_rng(seed)
+
+    centers = kmeans_pp(X, k, rng)
+    if mode == "minibatch":
+        centers, iterations = minibatch(X, centers, rng, batch_size, max_iter, tol)
+        # a few full passes over all bins to settle the centers
+        centers, extra = lloyd(X, centers, max_iter=3, tol=tol)
+        iterations += extra
+    elif mode == "full":
+        centers, iterations = lloyd(X, centers, max_iter, tol)
+    else:
+        raise ValueError(f"Unknown k-means mode: {mode}")
+
+    if capacities is None or all(c is None for c in capacities):
+        labels = np.argmax(X @ centers.T, axis=1)
+    else:
+        caps = [np.inf if c is None else c for c in list(capacities)[:k]]
+        labels = capacitated_assign(X, centers, caps)
+        for _ in range(balance_rounds):
+            assigned = labels >= 0
+            sums, counts = _sums(X[assigned], labels[assigned], k)
+            centers = _normalize(sums, centers)
+            new = capacitated_assign(X, centers, caps)
+            if np.array_equal(new, labels):
+                break
+            labels = new
+
+    lat_c, lng_c = to_lat_lng(centers)
+    return {
+        "labels": labels,
+        "centers": np.column_stack([lat_c, lng_c]),
+        "iterations": iterations,
+        "mode": mode,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def cluster_report(lat, lng, labels, k):
+    """Size and distance of every bin to its cluster's centroid (km), per cluster and overall."""
+    X = to_unit_vectors(lat, lng)
+    labels = np.asarray(labels)
+    assigned = labels >= 0
+    sums, counts = _sums(X[assigned], labels[assigned], k)
+    centers = _normalize(sums, np.tile([1.0, 0.0, 0.0], (k, 1)))
+    dist = chord_to_km(2.0 - 2.0 * np.einsum("ij,ij->i", X[assigned], centers[labels[assigned]]))
+    per = []
+    for c in range(k):
+        d = dist[labels[assigned] == c]
+        per.append({"size": int(counts[c]), "mean_km": round(float(d.mean()), 3) if len(d) else 0.0,
+                    "max_km": round(float(d.max()), 3) if len(d) else 0.0})
+    return {
+        "mean_km": round(float(dist.mean()), 4) if len(dist) else 0.0,
+        "sse_km2": round(float((dist ** 2).sum()), 2),
+        "unassigned": int((~assigned).sum()),
+        "clusters": per,
+    }
@@ -0,0 +1,345 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+import numpy as np
+
+from route_plan import RoutePlan
+from routing import CacheFull, DistanceCache, bin_key, load_bins, order_stops
+from scheduling import cluster_bins, cluster_report, haversine_km
+
+# ——— CONFIG ———
+# Above this many bins, "auto" mode runs mini-batch k-means
+MINIBATCH_THRESHOLD = 5000
+MINIBATCH_SIZE = 1024
+KMEANS_MAX_ITER = 100
+# Seed of the k-means++ draw: the same bins and trucks give the same clusters
+KMEANS_SEED = 0
+# Collection centre (see SchedulingMap.tsx): routes start and end here unless told otherwise
+DEPOT_LAT, DEPOT_LNG = 1.5341, 103.6217
+# Pairwise bin distances as a memory-mapped file (<path>.<capacity>.npy + <path>.json); None keeps
+# them in memory. The file takes 4 * capacity² bytes, capacity being the bin count rounded up to a
+# power of two: 1 GB for up to DISTANCE_CACHE_MAX_BINS = 16384 bins, beyond which bins are refused
+DISTANCE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_cache", "distances")
+DISTANCE_CACHE_MAX_BINS = 16384
+# "supabase", a .json/.csv file, or None (only bins sent to PUT /bins). With a source, it is
+# re-read every BINS_REFRESH_INTERVAL seconds and bins that disappear from it are dropped
+# (bins sent to PUT /bins, /route or /plans stay)
+BINS_SOURCE = "supabase"
+BINS_REFRESH_INTERVAL = 300
+NEAREST_MAX_K = 100
+TWO_OPT_MAX_PASSES = 50
+# A newly due bin is tried in the routes of this many trucks with the nearest centroids
+INSERT_CANDIDATES = 3
+# Plans are kept in memory; the oldest is dropped beyond this many
+MAX_PLANS = 50
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+distances = DistanceCache(DISTANCE_CACHE_PATH, max_capacity=DISTANCE_CACHE_MAX_BINS)
+bins_source = {"source": BINS_SOURCE, "loaded_at": None, "error": None}
+source_ids = set()  # bins of BINS_SOURCE at the last sync; only these are dropped when they disappear
+plans = OrderedDict()
+plans_lock = threading.Lock()
+
+
+def refresh_bins():
+    """Keep the distance cache in step with BINS_SOURCE."""
+    while True:
+        started = time.perf_counter()
+        try:
+            ids, lat, lng = load_bins(BINS_SOURCE)
+            result = distances.sync(ids, lat, lng, previous=source_ids, keep=plan_bin_ids())
+            source_ids.clear()
+            source_ids.update(ids)
+            bins_source.update(loaded_at=time.time(), error=None)
+            print(f"[INFO] Bins synced from {BINS_SOURCE}: {result} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            bins_source["error"] = str(e)
+            print(f"⚠️ Could not load bins from {BINS_SOURCE}: {e}")
+        time.sleep(BINS_REFRESH_INTERVAL)
+
+
+@app.on_event("startup")
+async def startup_event():
+    if BINS_SOURCE:
+        threading.Thread(target=refresh_bins, daemon=True, name="bins").start()
+
+
+def parse_bins(bins):
+    """(ids, latitudes, longitudes) of [{"bin_id", "latitude", "longitude"}, ...]."""
+    try:
+        ids = [bin_key(b["bin_id"]) for b in bins]
+        lat = np.array([float(b["latitude"]) for b in bins])
+        lng = np.array([float(b["longitude"]) for b in bins])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Every bin needs bin_id, latitude and longitude: {e}")
+    if not (np.all(np.abs(lat) <= 90) and np.all(np.abs(lng) <= 180)):
+        raise HTTPException(status_code=400, detail="Coordinates out of range")
+    return ids, lat, lng
+
+
+def parse_point(point, default):
+    """(lat, lng) of {"lat", "lng"}; default when point is missing."""
+    if point is None:
+        return default
+    try:
+        return float(point["lat"]), float(point["lng"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Points need lat and lng: {e}")
+
+
+def update_cache(ids, lat, lng):
+    try:
+        return distances.update(ids, lat, lng)
+    except CacheFull as e:
+        raise HTTPException(status_code=507, detail=str(e))
+
+
+def cached_bins(body):
+    """
+    (ids, latitudes, longitudes) of "bins" (added to the distance cache
+    first) or "bin_ids" (must be cached already), without duplicates.
+    """
+    if body.get("bins"):
+        ids, lat, lng = parse_bins(body["bins"])
+        update_cache(ids, lat, lng)
+    else:
+        ids = [bin_key(bin_id) for bin_id in body.get("bin_ids") or []]
+    ids = list(dict.fromkeys(ids))
+    try:
+        lat, lng = distances.coordinates(ids)
+    except KeyError:
+        unknown = [bin_id for bin_id in ids if bin_id not in distances]
+        raise HTTPException(status_code=404, detail=f"Unknown bins: {unknown[:20]}")
+    return ids, lat, lng
+
+
+def plan_bin_ids():
+    """Bins of the live plans; the source sync never drops these."""
+    with plans_lock:
+        live = list(plans.values())
+    return set().union(*(plan.bin_ids() for plan in live))
+
+
+def parse_trucks(body):
+    """Truck ids and capacities (None: unlimited) from "trucks" or "k" + "capacity"."""
+    default = body.get("capacity")
+    if "trucks" in body:
+        trucks = body["trucks"]
+        ids = [t["truck_id"] if isinstance(t, dict) else t for t in trucks]
+        caps = [t.get("capacity", default) if isinstance(t, dict) else default for t in trucks]
+    else:
+        k = int(body.get("k", 0))
+        ids, caps = list(range(k)), [default] * k
+    if not ids:
+        raise HTTPException(status_code=400, detail="Pass trucks (or k)")
+    return ids, caps
+
+
+@app.get("/")
+async def root():
+    return {"message": "Scheduling Server", "status": "running",
+            "distances": distances.status(), "bins_source": bins_source}
+
+
+@app.post("/clusters")
+def clusters(body: dict):
+    """
+    Split bins between trucks. Body: {"bins": [{"bin_id", "latitude",
+    "longitude"}], "trucks": [{"truck_id", "capacity"?}] (or "k"),
+    "capacity"?: default bins per truck, "mode"?: "auto" | "full" | "minibatch"}.
+    Bins that fit in no truck are returned as "unassigned".
+    """
+    bin_ids, lat, lng = parse_bins(body.get("bins") or [])
+    truck_ids, caps = parse_trucks(body)
+    mode = body.get("mode", "auto")
+    if mode not in ("auto", "full", "minibatch"):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+
+    result = cluster_bins(lat, lng, len(truck_ids), capacities=caps, mode=mode,
+                          seed=body.get("seed", KMEANS_SEED), max_iter=KMEANS_MAX_ITER,
+                          batch_size=MINIBATCH_SIZE, minibatch_threshold=MINIBATCH_THRESHOLD)
+    labels = result["labels"]
+    report = cluster_report(lat, lng, labels, len(result["centers"]))
+    groups = [[] for _ in result["centers"]]
+    for bin_id, label in zip(bin_ids, labels.tolist()):
+        if label >= 0:
+            groups[label].append(bin_id)
+    return {
+        "clusters": [
+            {"truck_id": truck_id, "bin_ids": groups[i], "capacity": caps[i],
+             "centroid": {"lat": float(result["centers"][i][0]), "lng": float(result["centers"][i][1])},
+             **report["clusters"][i]}
+            for i, truck_id in enumerate(truck_ids[:len(groups)])
+        ],
+        "unassigned": [bin_id for bin_id, label in zip(bin_ids, labels.tolist()) if label < 0],
+        "stats": {"bins": len(bin_ids), "mode": result["mode"], "iterations": result["iterations"],
+                  "ms": result["ms"], "mean_km": report["mean_km"]},
+    }
+
+
+@app.put("/bins")
+def put_bins(body: dict):
+    """Add or move bins in the distance cache. Body: {"bins": [{"bin_id", "latitude", "longitude"}]}."""
+    ids, lat, lng = parse_bins(body.get("bins") or [])
+    started = time.perf_counter()
+    result = update_cache(ids, lat, lng)
+    return {**result, "bins": len(distances), "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+@app.delete("/bins/{bin_id}")
+def delete_bin(bin_id: str):
+    bin_id = bin_key(bin_id)
+    if not distances.remove([bin_id]):
+        raise HTTPException(status_code=404, detail=f"Unknown bin: {bin_id}")
+    return {"status": "removed", "bin_id": bin_id}
+
+
+@app.get("/nearest")
+def nearest(lat: float, lng: float, k: int = 5):
+    """The k bins closest to a GPS point (e.g. a truck's live position)."""
+    if not (abs(lat) <= 90 and abs(lng) <= 180):
+        raise HTTPException(status_code=400, detail="Coordinates out of range")
+    started = time.perf_counter()
+    found = distances.nearest(lat, lng, max(1, min(k, NEAREST_MAX_K)))
+    return {
+        "bins": [{"bin_id": bin_id, "distance_km": round(km, 4)} for bin_id, km in found],
+        "ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+@app.post("/route")
+def route(body: dict):
+    """
+    Order a cluster's stops. Body: {"bin_ids": [...]} of cached bins, or
+    {"bins": [{"bin_id", "latitude", "longitude"}]} (added to the cache
+    first); "start"?: {"lat", "lng"} (default: the depot); "end"?: the same,
+    or null for a route that ends at its last stop (default: the depot).
+    """
+    ids, lat, lng = cached_bins(body)
+    start = parse_point(body.get("start"), (DEPOT_LAT, DEPOT_LNG))
+    end = parse_point(body["end"], None) if "end" in body else (DEPOT_LAT, DEPOT_LNG)
+
+    started = time.perf_counter()
+    try:
+        D = distances.submatrix(ids).astype(np.float64)
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=f"Bin {e} was dropped from the distance cache, retry")
+    order, km, nn_km = order_stops(
+        D,
+        haversine_km(start[0], start[1], lat, lng),
+        None if end is None else haversine_km(end[0], end[1], lat, lng),
+        max_passes=TWO_OPT_MAX_PASSES,
+    )
+    return {
+        "bin_ids": [ids[i] for i in order.tolist()],
+        "distance_km": round(km, 3),
+        "nearest_neighbour_km": round(nn_km, 3),
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def get_plan(plan_id: str):
+    plan = plans.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"Unknown plan: {plan_id}")
+    return plan
+
+
+@app.post("/plans")
+def create_plan(body: dict):
+    """
+    Build a day's plan: cluster the bins between the trucks and order every
+    route. Body as for /clusters, with "bins" or "bin_ids", plus "plan_id"?
+    (e.g. the schedule id) and "end"? as for /route.
+    """
+    ids, lat, lng = cached_bins(body)
+    truck_ids, caps = parse_trucks(body)
+    mode = body.get("mode", "auto")
+    if mode not in ("auto", "full", "minibatch"):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    end = parse_point(body["end"], None) if "end" in body else "depot"
+
+    started = time.perf_counter()
+    plan = RoutePlan.build(distances, ids, lat, lng, truck_ids, caps, (DEPOT_LAT, DEPOT_LNG), end,
+                           candidates=INSERT_CANDIDATES, max_passes=TWO_OPT_MAX_PASSES,
+                           mode=mode, seed=body.get("seed", KMEANS_SEED), max_iter=KMEANS_MAX_ITER,
+                           batch_size=MINIBATCH_SIZE, minibatch_threshold=MINIBATCH_THRESHOLD)
+    ms = round((time.perf_counter() - started) * 1000, 2)
+    with plans_lock:
+        plan_id = str(body.get("plan_id") or f"plan-{int(time.time() * 1000)}")
+        plans[plan_id] = plan
+        plans.move_to_end(plan_id)
+        while len(plans) > MAX_PLANS:
+            plans.popitem(last=False)
+    return {"plan_id": plan_id, **plan.to_dict(), "ms": ms}
+
+
+@app.get("/plans/{plan_id}")
+def read_plan(plan_id: str):
+    return {"plan_id": plan_id, **get_plan(plan_id).to_dict()}
+
+
+@app.post("/plans/{plan_id}/bins")
+def insert_bins(plan_id: str, body: dict):
+    """
+    Add newly due bins to a plan without re-clustering: each is inserted
+    where it adds the least distance, and only the routes that got bins are
+    re-optimised. Body: {"bins": [...]} or {"bin_ids": [...]}.
+    """
+    plan = get_plan(plan_id)
+    try:
+        return plan.insert(*cached_bins(body))
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=f"Plan {plan_id} lost track of bin {e}")
+
+
+@app.post("/plans/{plan_id}/progress")
+def report_progress(plan_id: str, body: dict):
+    """
+    A truck's progress. Body: {"truck_id", "collected"?: [bin ids],
+    "position"?: {"lat", "lng"}}. Collected stops leave the route and later
+    insertions route the truck from its position.
+    """
+    plan = get_plan(plan_id)
+    if body.get("truck_id") not in plan.trucks:
+        raise HTTPException(status_code=404, detail=f"Unknown truck: {body.get('truck_id')}")
+    truck_id = body["truck_id"]
+    collected = [bin_key(bin_id) for bin_id in body.get("collected") or []]
+    stops, done = plan.truck_bins(truck_id)
+    route = set(stops) | set(done)
+    unknown = [b for b in collected if b not in route]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Not on truck {truck_id}'s route: {unknown[:20]}")
+    position = parse_point(body.get("position"), None)
+    try:
+        newly_collected = plan.collect(truck_id, collected, position)
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=f"Plan {plan_id} lost track of bin {e}")
+    truck = next(t for t in plan.to_dict()["trucks"] if t["truck_id"] == truck_id)
+    return {**truck, "newly_collected": newly_collected}
+
+
+@app.delete("/plans/{plan_id}")
+def delete_plan(plan_id: str):
+    with plans_lock:
+        if plans.pop(plan_id, None) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown plan: {plan_id}")
+    return {"status": "deleted", "plan_id": plan_id}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8001)
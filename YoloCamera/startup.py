@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTracker:
+    """
+    Runs the slow startup work in the background and keeps the state of each
+    component for /healthz and /readyz.
+
+    run(name, fn) starts fn on its own thread right away, so loading the
+    model, starting the OCR workers and importing the Drive client overlap
+    instead of running one after another. Every component is "loading",
+    "ready" or "failed"; the service is ready once all `required` components
+    are. step(name) times one phase (e.g. "model.warmup") from any thread;
+    when the last component has finished, the phases are printed slowest
+    first so it is clear where startup time goes.
+    """
+
+    def __init__(self, required=(), since=None):
+        """since: perf_counter() value to count from (default: now)."""
+        self.required = tuple(required)
+        self._t0 = time.perf_counter() if since is None else since
+        self.started = time.time() - self.elapsed()
+        self.components = {}
+        self.phases = {}
+        self.ready_after = None  # seconds from start until every required component was ready
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._ready = threading.Event()
+        self._reported = False
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = round(time.perf_counter() - started, 3)
+
+    def record(self, name, seconds):
+        """A phase timed elsewhere, e.g. the module imports before the tracker existed."""
+        with self._lock:
+            self.phases[name] = round(seconds, 3)
+
+    def run(self, name, fn):
+        """Run fn() in the background as component `name`."""
+        with self._lock:
+            self.components[name] = {"state": "loading", "seconds": None, "error": None}
+        threading.Thread(target=self._run, args=(name, fn), daemon=True, name=f"startup-{name}").start()
+
+    def _run(self, name, fn):
+        started = time.perf_counter()
+        try:
+            with self.step(name):
+                fn()
+        except Exception as e:
+            self._set(name, "failed", started, str(e))
+            print(f"⚠️ Startup: {name} failed: {e}")
+        else:
+            self._set(name, "ready", started)
+
+    def _set(self, name, state, started, error=None):
+        with self._lock:
+            self.components[name] = {"state": state, "seconds": round(time.perf_counter() - started, 3),
+                                     "error": error}
+            if self.ready_after is None and all(
+                    self.components.get(r, {}).get("state") == "ready" for r in self.required):
+                self.ready_after = round(self.elapsed(), 3)
+                self._ready.set()
+            self._changed.notify_all()
+            report = (not self._reported and all(r in self.components for r in self.required)
+                      and all(c["state"] != "loading" for c in self.components.values()))
+            if report:
+                self._reported = True
+        if report:
+            self.print_report()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None, names=None):
+        """Block until every required component (or the named ones) is ready; returns False on timeout."""
+        if names is None:
+            return self._ready.wait(timeout)
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: all(self.components.get(n, {}).get("state") == "ready" for n in names), timeout)
+
+    def report(self):
+        with self._lock:
+            components = {name: dict(c) for name, c in self.components.items()}
+            phases = dict(self.phases)
+        return {
+            "ready": self.is_ready(),
+            "required": list(self.required),
+            "started_at": self.started,
+            "uptime_s": round(self.elapsed(), 1),
+            "ready_after_s": self.ready_after,
+            "components": components,
+            "phases": dict(sorted(phases.items(), key=lambda kv: -kv[1])),
+        }
+
+    def print_report(self):
+        report = self.report()
+        status = f"ready after {report['ready_after_s']:.1f}s" if report["ready"] else "NOT ready"
+        print(f"⏱️ Startup {status}; where the time went (phases overlap):")
+        for name, seconds in report["phases"].items():
+            print(f"   {name:<16} {seconds:7.2f}s")
@@ -0,0 +1,236 @@
+import heapq
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+
+from metrics import stage_timer
+
+UPLOAD_SECONDS = stage_timer("upload")
+
+
+class LocalDriveBackend:
+    """
+    Stand-in for Google Drive used for testing: "uploads" by copying the file
+    into a local directory. Can simulate latency and a failure rate.
+    """
+
+    def __init__(self, directory, latency=0.0, fail_rate=0.0):
+        self.directory = directory
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.uploads = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, file_path, folder_id=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ConnectionError("Simulated Drive outage")
+        target_dir = os.path.join(self.directory, folder_id or "")
+        os.makedirs(target_dir, exist_ok=True)
+        shutil.copy2(file_path, target_dir)
+        self.uploads += 1
+        return f"local-{uuid.uuid4().hex[:12]}"
+
+
+class UploadQueue:
+    """
+    Background upload queue backed by an on-disk spool.
+
+    enqueue() writes one small JSON job file into spool_dir and returns
+    immediately; a fixed pool of worker threads drains the queue through
+    `upload(file_path, folder_id)`. Failed uploads are retried with exponential
+    backoff and stay in the spool, so pending uploads survive restarts and
+    network outages. Jobs that exhaust max_attempts are moved to spool_dir/failed.
+    Without `upload`, files go to Google Drive (see load_backend()).
+    """
+
+    def __init__(self, spool_dir, upload=None, workers=2, max_attempts=8,
+                 backoff_base=2.0, backoff_max=300.0):
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.upload = upload
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.counters = {"queued": 0, "in_flight": 0, "uploaded": 0, "retries": 0, "failed": 0}
+        self._heap = []  # (next_attempt, job_id)
+        self._jobs = {}
+        self._paths = {}  # file path -> number of pending jobs
+        self._cond = threading.Condition()
+        self._backend_lock = threading.Lock()
+        self._stopping = False
+        self._threads = []
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        path = self._job_path(job["id"])
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp, path)
+
+    def _push(self, job):
+        # caller holds self._cond
+        if job["id"] not in self._jobs:
+            self._paths[job["file_path"]] = self._paths.get(job["file_path"], 0) + 1
+        self._jobs[job["id"]] = job
+        heapq.heappush(self._heap, (job["next_attempt"], job["id"]))
+        self.counters["queued"] = len(self._heap)
+        self._cond.notify()
+
+    def _pop(self, job):
+        # caller holds self._cond
+        if self._jobs.pop(job["id"], None) is not None:
+            left = self._paths.pop(job["file_path"]) - 1
+            if left:
+                self._paths[job["file_path"]] = left
+
+    def is_pending(self, file_path):
+        """True while an upload of the file is queued, in flight or waiting to be retried."""
+        with self._cond:
+            return os.path.abspath(file_path) in self._paths
+
+    def recover(self):
+        """Load jobs left in the spool by a previous run."""
+        recovered = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name)) as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable upload job {name}: {e}")
+                continue
+            with self._cond:
+                if job["id"] not in self._jobs:
+                    self._push(job)
+                    recovered += 1
+        if recovered:
+            print(f"[INFO] Recovered {recovered} pending upload(s) from {self.spool_dir}")
+        return recovered
+
+    def load_backend(self):
+        """
+        The upload function. Without one given, the Google Drive client is
+        imported here (it is slow to import), on first use or ahead of time
+        from a background thread.
+        """
+        with self._backend_lock:
+            if self.upload is None:
+                from gdrive_auth import upload_to_gdrive
+                self.upload = upload_to_gdrive
+        return self.upload
+
+    def start(self):
+        self.recover()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, daemon=True, name=f"upload-{i}")
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop the workers. Pending jobs stay in the spool for the next run."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def enqueue(self, file_path, folder_id=None):
+        """Persist an upload job and return its id; never blocks on the network."""
+        job = {
+            "id": f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+            "file_path": os.path.abspath(file_path),
+            "folder_id": folder_id,
+            "attempts": 0,
+            "next_attempt": time.time(),
+            "last_error": None,
+        }
+        self._save(job)
+        with self._cond:
+            self._push(job)
+        return job["id"]
+
+    def _next_job(self):
+        with self._cond:
+            while not self._stopping:
+                if self._heap:
+                    due, job_id = self._heap[0]
+                    delay = due - time.time()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        self.counters["queued"] = len(self._heap)
+                        self.counters["in_flight"] += 1
+                        return self._jobs[job_id]
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                if not os.path.exists(job["file_path"]):
+                    raise FileNotFoundError(job["file_path"])
+                with UPLOAD_SECONDS.time():
+                    self.load_backend()(job["file_path"], folder_id=job["folder_id"])
+            except FileNotFoundError as e:
+                self._fail(job, f"File missing: {e}")
+            except Exception as e:
+                self._retry(job, str(e))
+            else:
+                with self._cond:
+                    self._pop(job)
+                    self.counters["in_flight"] -= 1
+                    self.counters["uploaded"] += 1
+                try:
+                    os.remove(self._job_path(job["id"]))
+                except OSError:
+                    pass
+
+    def _retry(self, job, error):
+        job["attempts"] += 1
+        job["last_error"] = error
+        if job["attempts"] >= self.max_attempts:
+            self._fail(job, error)
+            return
+        delay = min(self.backoff_base ** job["attempts"], self.backoff_max)
+        job["next_attempt"] = time.time() + delay
+        self._save(job)
+        print(f"⚠️ Upload of {os.path.basename(job['file_path'])} failed "
+              f"(attempt {job['attempts']}), retrying in {delay:.0f}s: {error}")
+        with self._cond:
+            self.counters["in_flight"] -= 1
+            self.counters["retries"] += 1
+            self._push(job)
+
+    def _fail(self, job, error):
+        job["last_error"] = error
+        self._save(job)
+        try:
+            os.replace(self._job_path(job["id"]), os.path.join(self.failed_dir, f"{job['id']}.json"))
+        except OSError:
+            pass
+        print(f"❌ Giving up on upload of {job['file_path']}: {error}")
+        with self._cond:
+            self._pop(job)
+            self.counters["in_flight"] -= 1
+            self.counters["failed"] += 1
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters)
@@ -1,17 +1,25 @@
 from fastapi import FastAPI, Response
 from fastapi.responses import StreamingResponse, JSONResponse
-import cv2, threading, time
+import cv2, os, sys, time
 from datetime import datetime
 from ultralytics import YOLO
-import pytesseract, difflib
-#from cameraDb import log_to_supabase
 from gdrive_auth import upload_to_gdrive
 
+# The detection pipeline lives in YoloCamera/ at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[".."] * 5, "YoloCamera"))
+from ocr_engine import get_engine
+from plate_index import PlateIndex
+from plate_stages import plate_pipeline, camera_frames, annotate
+from image_store import ImageStore
+from upload_queue import UploadQueue
+from cameraDb import log_to_supabase
+
 app = FastAPI()
 model = YOLO(r"C:\xampp\htdocs\Kutip\src\app\(admin)\(others-pages)\camera\weights.pt")
 cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
 
 latest_plate = {"plate": None, "confidence": 0.0, "timestamp": None}
+latest_jpeg = None
 
 KNOWN_PLATES = [
     'BAM 9267', 'AAA 4444', 'WVX 3589', 'WXM 3268', 'WSN 5634',
@@ -19,65 +27,49 @@ KNOWN_PLATES = [
 ]
 
 MATCH_THRESHOLD = 0.7
+plate_index = PlateIndex(KNOWN_PLATES)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Drive uploads run on background workers; frames still waiting for theirs are never evicted
+uploader = UploadQueue(os.path.join(BASE_DIR, "upload_spool"), upload=upload_to_gdrive).start()
+images = ImageStore(os.path.join(BASE_DIR, "captures"), full_format="jpg", pinned=uploader.is_pending)
 
 def get_nearest_plate(ocr_text: str):
-    best_match = None
-    best_ratio = 0.0
-    for candidate in KNOWN_PLATES:
-        ratio = difflib.SequenceMatcher(None, ocr_text, candidate).ratio()
-        if ratio > best_ratio:
-            best_ratio, best_match = ratio, candidate
-    if best_ratio >= MATCH_THRESHOLD:
-        return best_match, best_ratio
-    return None, best_ratio
-
-def preprocess_image(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, th = cv2.threshold(gray, 0,255, cv2.THRESH_BINARY+cv2.THRESH_OTSU)
-    return cv2.GaussianBlur(th, (5,5), 0)
+    return plate_index.best(ocr_text, MATCH_THRESHOLD)
 
-def detection_loop():
+def save(job):
+    """Sink stage: save, upload and log matched plates off the detection threads"""
     global latest_plate
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        res = model.predict(source=frame, conf=0.5, save=False)[0]
-        if res.boxes:
-            x1, y1, x2, y2 = map(int, res.boxes.xyxy[0].cpu().numpy())
-            roi = frame[y1:y2, x1:x2]
-            prep = preprocess_image(roi)
-            raw = pytesseract.image_to_string(prep, config='--psm 8')
-            ocr_plate = clean_text(raw)
-            matched_plate, ratio = get_nearest_plate(ocr_plate)
-
-            if matched_plate:
-                ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-                cf = f"plate_{ts}.jpg"
-                label = f"{matched_plate} ({ratio:.2f})"
-                cv2.putText(frame, label, (x1, y1-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
-
-                # save and upload
-                cv2.imwrite(cf, frame)
-                upload_to_gdrive(cf, folder_id="your-folder-id")
-                log_to_supabase(bin_id=matched_plate, confidence=ratio, filename=cf)
-
-            latest_plate = {"plate": matched_plate, "confidence": ratio, "timestamp": ts}
-
-        time.sleep(0.03)  # ~30fps
-
-threading.Thread(target=detection_loop, daemon=True).start()
+    if any(plate["match"] for plate in job["plates"]):
+        annotate(job)
+    for plate in job["plates"]:
+        if plate["match"]:
+            # save and upload
+            def saved(paths, plate=plate):
+                if not paths["duplicate"]:
+                    uploader.enqueue(paths["full"], folder_id="your-folder-id")
+                    log_to_supabase(bin_id=plate["match"], confidence=plate["ratio"],
+                                    filename=os.path.basename(paths["full"]))
+            images.save(job["frame"].copy(), plate["roi"], key=plate["match"], callback=saved)
+
+        latest_plate = {"plate": plate["match"], "confidence": plate["ratio"],
+                        "timestamp": datetime.now().strftime('%Y%m%d_%H%M%S')}
+    return job
+
+def publish(job):
+    global latest_jpeg
+    _, jpg = cv2.imencode('.jpg', job["frame"])
+    latest_jpeg = jpg.tobytes()
+
+# capture -> YOLO -> ROI prep -> OCR -> match -> save, each stage on its own thread
+pipeline = plate_pipeline(model, get_engine(), get_nearest_plate, sink=save,
+                          source=camera_frames(cap), on_result=publish).start()
 
 def mjpeg_generator():
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        _, jpg = cv2.imencode('.jpg', frame)
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" + jpg.tobytes() + b"\r\n")
+        if latest_jpeg is not None:
+            yield (b"--frame\r\n"
+                   b"Content-Type: image/jpeg\r\n\r\n" + latest_jpeg + b"\r\n")
+        time.sleep(0.03)  # ~30fps
 
 @app.get("/stream")
 def stream_video():
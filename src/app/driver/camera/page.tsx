@@ -770,6 +770,7 @@ export default function DriverCameraPage() {
             <CameraViewer
               scheduleId={activeSchedule?.schedule_id?.toString()}
               routeId={activeRoute?.route_id}
+              schedulePlates={routeBins.map(bin => bin.bin_plate)}
               isCollectionMode={true}
               autoDetectSchedule={false}
               onBinCollected={handleBinCollected}
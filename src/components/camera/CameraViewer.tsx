@@ -1,16 +1,29 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 
 interface Plate {
   plate: string | null
   confidence: number
   timestamp: string | null
+  seq?: number
+  epoch?: string
+  camera?: string
+}
+
+const CAMERA_SERVER_URL = 'http://localhost:8000'
+
+// Id the camera server resumes the event stream after: "<epoch>-<seq>" (the epoch changes on every restart)
+const eventId = (plate: Plate, fallback = '0'): string => {
+  if (plate.seq === undefined) return fallback
+  return plate.epoch ? `${plate.epoch}-${plate.seq}` : `${plate.seq}`
 }
 
 interface CameraViewerProps {
   scheduleId?: string
   routeId?: number
+  // Bin plates of the active schedule; the camera server matches against these first
+  schedulePlates?: string[]
   onBinCollected?: (plate: string) => void
   isCollectionMode?: boolean
   autoDetectSchedule?: boolean
@@ -23,14 +36,18 @@ const LOCAL_SCHEDULES_KEY = 'local_active_schedules'
 export default function CameraViewer({ 
   scheduleId, 
   routeId, 
+  schedulePlates,
   onBinCollected, 
   isCollectionMode = false,
   autoDetectSchedule = false
 }: CameraViewerProps) {
   const [data, setData] = useState<Plate>({ plate: null, confidence: 0, timestamp: null })
-  const [lastProcessedPlate, setLastProcessedPlate] = useState<string | null>(null)
   const [processing, setProcessing] = useState(false)
   const [collectionStatus, setCollectionStatus] = useState<string>('')
+  // Id of the last detection event seen, used to resume the event stream
+  // (null: none yet, the stream then only sends new events)
+  const lastEventIdRef = useRef<string | null>(null)
+  const latestFetchedRef = useRef(false)
 
 
   // Local storage functions for simulating database
@@ -99,6 +116,9 @@ export default function CameraViewer({
           
           // Trigger callback to refresh parent components
           onBinCollected?.(`COMPLETED_${scheduleId}`);
+
+          // Route finished: the camera server matches against all plates again
+          fetch(`${CAMERA_SERVER_URL}/schedule`, { method: 'DELETE' }).catch(() => {});
         } else {
           console.error('Failed to update schedule status:', result.error);
           setCollectionStatus(`⚠️ Schedule completed locally but database update failed`);
@@ -132,6 +152,23 @@ export default function CameraViewer({
     console.log('Local collections and schedule statuses cleared');
   };
 
+  // Tell the camera server which bins this truck can meet, so it matches
+  // readings against the schedule first (it pulls the plates itself if none are given)
+  const schedulePlatesKey = schedulePlates?.join('|') ?? ''
+  useEffect(() => {
+    if (!isCollectionMode || !scheduleId) return
+    const plates = schedulePlatesKey ? schedulePlatesKey.split('|') : []
+    fetch(`${CAMERA_SERVER_URL}/schedule`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        schedule_id: scheduleId,
+        route_id: routeId,
+        ...(plates.length ? { plates } : {})
+      })
+    }).catch((error) => console.error('Could not send the active schedule to the camera server:', error))
+  }, [isCollectionMode, scheduleId, routeId, schedulePlatesKey])
+
   // Expose clear function globally for testing
   useEffect(() => {
     if (typeof window !== 'undefined') {
@@ -141,71 +178,124 @@ export default function CameraViewer({
 
 
 
+  // The event stream lives as long as the component: the handlers read the
+  // current props and processing state through refs, and detections that
+  // arrive while one is being processed wait in a queue instead of being dropped
+  const processingRef = useRef(false)
+  const lastProcessedPlateRef = useRef<string | null>(null)
+  const queueRef = useRef<Plate[]>([])
+  const propsRef = useRef({ isCollectionMode, scheduleId, routeId, onBinCollected })
   useEffect(() => {
-    const interval = setInterval(async () => {
-      try {
-        const res = await fetch('http://localhost:8000/latest')
-        if (res.ok) {
-          const newData = await res.json()
-          setData(newData)
-          
-          // If we're in collection mode and have a new plate detection
-          if (isCollectionMode && 
-              newData.plate && 
-              newData.plate !== lastProcessedPlate && 
-              newData.confidence > 0.7 && 
-              !processing) {
-            
-            setProcessing(true)
-            setCollectionStatus(`Processing ${newData.plate}...`)
-            
-            try {
-              // Use props for schedule/route
-              const currentScheduleId = scheduleId || 'local-schedule';
-              const currentRouteId = routeId;
-              
-              if (!currentScheduleId) {
-                setCollectionStatus('❌ No active schedule found');
-                setTimeout(() => setCollectionStatus(''), 3000);
-                setProcessing(false);
-                return;
-              }
-              
-              // Check if already collected locally
-              if (isPlateCollected(newData.plate, currentScheduleId, currentRouteId)) {
-                setCollectionStatus(`⚠️ ${newData.plate} already collected`);
-                setTimeout(() => setCollectionStatus(''), 3000);
-                setProcessing(false);
-                return;
-              }
-              
-              // Simulate processing delay
-              await new Promise(resolve => setTimeout(resolve, 1000));
-              
-              // Mark the bin as collected locally
-              setLocalCollection(newData.plate, currentScheduleId, currentRouteId);
-              
-              setCollectionStatus(`✅ ${newData.plate} collected successfully!`)
-              setLastProcessedPlate(newData.plate)
-              onBinCollected?.(newData.plate)
-              
-              // Clear status after 3 seconds
-              setTimeout(() => setCollectionStatus(''), 3000)
-              
-            } catch (error) {
-              setCollectionStatus(`❌ Processing error`)
-              setTimeout(() => setCollectionStatus(''), 3000)
-            } finally {
-              setProcessing(false)
-            }
-          }
+    propsRef.current = { isCollectionMode, scheduleId, routeId, onBinCollected }
+  }, [isCollectionMode, scheduleId, routeId, onBinCollected])
+
+  const processDetection = async (newData: Plate) => {
+    const plate = newData.plate!
+    if (plate === lastProcessedPlateRef.current) return
+    const { scheduleId, routeId, onBinCollected } = propsRef.current
+
+    setCollectionStatus(`Processing ${plate}...`)
+    try {
+      // Use props for schedule/route
+      const currentScheduleId = scheduleId || 'local-schedule';
+      const currentRouteId = routeId;
+
+      if (!currentScheduleId) {
+        setCollectionStatus('❌ No active schedule found');
+        setTimeout(() => setCollectionStatus(''), 3000);
+        return;
+      }
+
+      // Check if already collected locally
+      if (isPlateCollected(plate, currentScheduleId, currentRouteId)) {
+        setCollectionStatus(`⚠️ ${plate} already collected`);
+        setTimeout(() => setCollectionStatus(''), 3000);
+        return;
+      }
+
+      // Simulate processing delay
+      await new Promise(resolve => setTimeout(resolve, 1000));
+
+      // Mark the bin as collected locally
+      setLocalCollection(plate, currentScheduleId, currentRouteId);
+
+      setCollectionStatus(`✅ ${plate} collected successfully!`)
+      lastProcessedPlateRef.current = plate
+      onBinCollected?.(plate)
+
+      // Clear status after 3 seconds
+      setTimeout(() => setCollectionStatus(''), 3000)
+
+    } catch (error) {
+      setCollectionStatus(`❌ Processing error`)
+      setTimeout(() => setCollectionStatus(''), 3000)
+    }
+  }
+
+  const drainQueue = async () => {
+    if (processingRef.current) return
+    processingRef.current = true
+    setProcessing(true)
+    try {
+      while (queueRef.current.length > 0) {
+        await processDetection(queueRef.current.shift()!)
+      }
+    } finally {
+      processingRef.current = false
+      setProcessing(false)
+    }
+  }
+
+  const handleDetection = (newData: Plate) => {
+    setData(newData)
+    // If we're in collection mode and have a new plate detection
+    if (propsRef.current.isCollectionMode && newData.plate && newData.confidence > 0.7) {
+      queueRef.current.push(newData)
+      drainQueue()
+    }
+  }
+  const handleDetectionRef = useRef(handleDetection)
+  handleDetectionRef.current = handleDetection
+
+  useEffect(() => {
+    let source: EventSource | null = null
+    let cancelled = false
+
+    const connect = async () => {
+      // First mount: show the current detection and only stream newer ones
+      if (!latestFetchedRef.current) {
+        latestFetchedRef.current = true
+        try {
+          const res = await fetch(`${CAMERA_SERVER_URL}/latest`)
+          const latest: Plate = await res.json()
+          setData(latest)
+          if (latest.seq !== undefined) lastEventIdRef.current = eventId(latest)
+        } catch (error) {
+          // Without a starting id the server sends only new events; '0' would
+          // replay its whole buffer and mark every old plate as collected
+          console.error('Error fetching camera data:', error)
         }
-      } catch (error) {
-        console.error('Error fetching camera data:', error)
       }
-    }, 1000)
-    return () => clearInterval(interval)
-  }, [isCollectionMode, lastProcessedPlate, processing, scheduleId, routeId, onBinCollected])
+      if (cancelled) return
+
+      // Detections are pushed by the camera server; EventSource reconnects on its
+      // own and resumes after the last event id it received
+      const since = lastEventIdRef.current === null ? '' : `?since=${encodeURIComponent(lastEventIdRef.current)}`
+      source = new EventSource(`${CAMERA_SERVER_URL}/events${since}`)
+      source.addEventListener('detection', (event) => {
+        const newData: Plate = JSON.parse((event as MessageEvent).data)
+        lastEventIdRef.current = eventId(newData)
+        handleDetectionRef.current(newData)
+      })
+      source.onerror = () => console.error('Camera event stream interrupted, reconnecting…')
+    }
+
+    connect()
+    return () => {
+      cancelled = true
+      source?.close()
+    }
+  }, [])
 
   return (
     <div className="space-y-4">
@@ -213,7 +303,7 @@ export default function CameraViewer({
         {/* MJPEG stream */}
         <img
           className="w-full"
-          src="http://localhost:8000/stream"
+          src={`${CAMERA_SERVER_URL}/stream`}
           alt="Live camera feed"
         />
       </div>
@@ -7,6 +7,7 @@ import "mapbox-gl/dist/mapbox-gl.css";
 import Calendar from "@/components/ui/Calendar";
 
 mapboxgl.accessToken = process.env.NEXT_PUBLIC_MAPBOX_TOKEN!;
+const SCHEDULING_SERVER_URL = 'http://localhost:8001';
 
 type Bin = {
   bin_id: number;
@@ -618,6 +619,33 @@ export default function AutoSchedulingPage() {
     return clusters;
   };
 
+  // Cluster on the Python scheduling server; fall back to the in-browser k-means if it is unreachable
+  const clusterBins = async (bins: Bin[], trucks: Truck[]): Promise<Bin[][]> => {
+    if (bins.length === 0 || trucks.length === 0) return [];
+    try {
+      const res = await fetch(`${SCHEDULING_SERVER_URL}/clusters`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          bins: bins.map(bin => ({ bin_id: bin.bin_id, latitude: bin.latitude, longitude: bin.longitude })),
+          trucks: trucks.map(truck => ({ truck_id: truck.truck_id })),
+        }),
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data: { clusters: Array<{ truck_id: number; bin_ids: number[] }> } = await res.json();
+      const binById = new Map(bins.map(bin => [bin.bin_id, bin]));
+      const clusterByTruck = new Map(data.clusters.map(cluster => [cluster.truck_id, cluster.bin_ids]));
+      return trucks.map(truck =>
+        (clusterByTruck.get(truck.truck_id) ?? [])
+          .map(binId => binById.get(binId))
+          .filter((bin): bin is Bin => bin !== undefined)
+      );
+    } catch (error) {
+      console.warn('⚠️ Scheduling server unavailable, clustering in the browser:', error);
+      return kMeansClustering(bins, trucks.length);
+    }
+  };
+
   // Optimize route within a cluster using 2-opt algorithm
   const optimizeRoute2Opt = (bins: Bin[]): Bin[] => {
     if (bins.length <= 2) return bins;
@@ -699,6 +727,28 @@ export default function AutoSchedulingPage() {
     return optimizedBins.map(bin => bin.bin_id);
   };
 
+  // Order a truck's stops on the scheduling server (cached distances, nearest-neighbour + 2-opt)
+  const optimizeRouteOnServer = async (routeBins: Bin[]): Promise<number[]> => {
+    if (routeBins.length <= 1) return routeBins.map(bin => bin.bin_id);
+    try {
+      const res = await fetch(`${SCHEDULING_SERVER_URL}/route`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          bins: routeBins.map(bin => ({ bin_id: bin.bin_id, latitude: bin.latitude, longitude: bin.longitude })),
+          start: { lat: centerLat, lng: centerLng },
+          end: { lat: centerLat, lng: centerLng },
+        }),
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data: { bin_ids: number[] } = await res.json();
+      return data.bin_ids;
+    } catch (error) {
+      console.warn('⚠️ Scheduling server unavailable, ordering the route in the browser:', error);
+      return optimizeRoute(routeBins.map(bin => bin.bin_id));
+    }
+  };
+
   // Handle truck selection
   const handleTruckSelection = (truckId: number) => {
     setSelectedTrucks(prev => {
@@ -859,7 +909,7 @@ const performAutoScheduling = async (date: string) => {
     
     // Use K-Means clustering for better bin distribution
     const unassignedBinsArray = Array.from(unassignedBins);
-    const clusters = kMeansClustering(unassignedBinsArray, selectedTruckObjects.length);
+    const clusters = await clusterBins(unassignedBinsArray, selectedTruckObjects);
 
     // Prepare route data and assignments
     const routeCreationData: Array<{
@@ -935,7 +985,7 @@ const performAutoScheduling = async (date: string) => {
       }
 
       // Optimize route for this truck
-      const optimizedBinIds = optimizeRoute(truckBins.map(b => b.bin_id));
+      const optimizedBinIds = await optimizeRouteOnServer(truckBins);
       
       // Create assignments with both schedule_id and route_id
       const truckAssignments = optimizedBinIds.map((binId) => ({